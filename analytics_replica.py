@@ -0,0 +1,237 @@
+import argparse
+import threading
+import time
+
+import mysql.connector
+
+from change_capture import CAPTURED_TABLES, MAX_TRACKED_GAPS, committed_mark, fetch_deleted, latest_change
+from columnar import column_kind, read_frames
+from db_pool import DB_CONFIG
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# The replica is optional: without DuckDB installed the app only offers the MySQL backend
+REPLICA_AVAILABLE = duckdb is not None
+# Errors raised by replica queries
+ReplicaError = duckdb.Error if REPLICA_AVAILABLE else RuntimeError
+
+# Local DuckDB file holding the analytics snapshot
+DEFAULT_REPLICA_PATH = "zomato_analytics.duckdb"
+# Tables copied from MySQL (the six from dbsetup3.create_tables), parents first
+REPLICA_TABLES = ["Customers", "Restaurants", "DeliveryPersons", "Orders", "OrderItems", "Deliveries"]
+# Tables under change capture are copied incrementally: rows whose change_seq is past the replica's
+# high-water mark replace their old versions and tombstones delete rows. The others are re-copied whole
+# on every refresh. Bulk loads skip change capture, so refresh with full=True after one. The stored mark
+# stops short of change numbers that may still be in flight (see committed_mark), so rows past it are
+# read again on the next refresh; copying a row or a tombstone twice leaves the same result.
+# Rows per DataFrame handed to DuckDB while copying
+COPY_FRAME_ROWS = 100_000
+
+_DUCKDB_TYPES = {"datetime": "TIMESTAMP", "float": "DOUBLE", "int": "BIGINT", "text": "VARCHAR"}
+
+# The rollup tables the insight queries read, defined as views over the snapshot. DuckDB computes
+# them with columnar GROUP BY/JOIN scans at query time, so the same insight SQL runs on either backend.
+ROLLUP_VIEWS = {
+    "order_hour_rollup": """
+        SELECT HOUR(order_date) AS order_hour, COUNT(*) AS total_orders
+        FROM orders
+        WHERE order_date IS NOT NULL
+        GROUP BY HOUR(order_date)
+    """,
+    "restaurant_order_rollup": """
+        SELECT restaurant_id, COUNT(*) AS total_orders
+        FROM orders
+        WHERE restaurant_id IS NOT NULL
+        GROUP BY restaurant_id
+    """,
+    "customer_item_rollup": """
+        SELECT o.customer_id, oi.dish_name, COUNT(*) AS frequency
+        FROM orderitems oi
+        JOIN orders o ON o.order_id = oi.order_id
+        WHERE o.customer_id IS NOT NULL AND oi.dish_name IS NOT NULL
+        GROUP BY o.customer_id, oi.dish_name
+    """
+}
+
+
+# Function to list the (lower-case) table and view names the replica serves, for cache invalidation
+def replica_tables():
+    return [table.lower() for table in REPLICA_TABLES] + list(ROLLUP_VIEWS)
+
+
+# Function to rewrite a MySQL-style statement (%s placeholders) for DuckDB (? placeholders)
+def to_duckdb(query):
+    return query.replace("%s", "?")
+
+
+class AnalyticsReplica:
+    def __init__(self, path=DEFAULT_REPLICA_PATH):
+        if not REPLICA_AVAILABLE:
+            raise ImportError("The analytics replica needs the duckdb package (pip install duckdb)")
+        self.path = path
+        self._db = duckdb.connect(path)
+        self._refresh_lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS replica_watermarks (
+                table_name VARCHAR PRIMARY KEY,
+                high_water_mark BIGINT,
+                row_count BIGINT,
+                refreshed_at TIMESTAMP
+            )
+        """)
+
+    # Function to open a cursor for the calling thread; DuckDB cursors must not be shared between threads
+    def cursor(self):
+        return self._db.cursor()
+
+    # Function to run a query against the snapshot and return the result as a DataFrame
+    def query(self, query, params=None):
+        cursor = self.cursor()
+        try:
+            cursor.execute(to_duckdb(query), list(params or ()))
+            return cursor.df()
+        finally:
+            cursor.close()
+
+    # Function to run a query and hand the open cursor to consume(cursor), which reads it with fetchmany()
+    def stream(self, query, params, consume):
+        cursor = self.cursor()
+        try:
+            cursor.execute(to_duckdb(query), list(params or ()))
+            return consume(cursor)
+        finally:
+            cursor.close()
+
+    # Function to show when each table was last copied, and how many rows the snapshot holds
+    def status(self):
+        return self.query("SELECT table_name, row_count, high_water_mark, refreshed_at FROM replica_watermarks ORDER BY table_name")
+
+    # Function to find when the snapshot was last refreshed (None if it never was)
+    def last_refreshed(self):
+        cursor = self.cursor()
+        try:
+            return cursor.execute("SELECT MAX(refreshed_at) FROM replica_watermarks").fetchone()[0]
+        finally:
+            cursor.close()
+
+    # Function to bring the snapshot up to date from a MySQL connection; returns the rows copied per table.
+    # Every table is read in one consistent MySQL snapshot, up to the change mark taken in it, so once the
+    # refresh finishes the tables agree with each other as of that moment. Each table is swapped in as it
+    # is copied, so until then readers can see the tables copied so far at the new snapshot and the rest
+    # at the previous one.
+    def refresh(self, source, full=False):
+        with self._refresh_lock:
+            cursor = self.cursor()
+            source_cursor = source.cursor()
+            source_cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            try:
+                latest = latest_change(source)
+                counts = {table: self._copy_table(source, cursor, table, full, latest) for table in REPLICA_TABLES}
+                for name, definition in ROLLUP_VIEWS.items():
+                    cursor.execute(f"CREATE OR REPLACE VIEW {name} AS {definition}")
+                return counts
+            finally:
+                source.rollback()
+                source_cursor.close()
+                cursor.close()
+
+    # Function to read a table's high-water mark, or None when it has to be copied whole
+    @staticmethod
+    def _mark(cursor, name):
+        row = cursor.execute("SELECT high_water_mark FROM replica_watermarks WHERE table_name = ?", [name]).fetchone()
+        return None if row is None else row[0]
+
+    # Function to list a table's column names, in order
+    @staticmethod
+    def _columns(cursor, query):
+        cursor.execute(query)
+        cursor.fetchall()
+        return [column[0] for column in cursor.description]
+
+    # Function to copy one table: upserts changed rows and applies deletes for change-captured tables,
+    # otherwise (or when the MySQL table's columns have changed) rebuilds it under a staging name and
+    # swaps it in, so readers never see a half-copied table. latest is the change mark of the refresh's
+    # snapshot. Returns the rows copied or deleted.
+    def _copy_table(self, source, cursor, table, full, latest):
+        name = table.lower()
+        key = CAPTURED_TABLES[table][0] if table in CAPTURED_TABLES else None
+        mark = None if full or key is None else self._mark(cursor, name)
+        # Where the next refresh reads from: before any change number that may still commit (a full copy
+        # only looks back over the last MAX_TRACKED_GAPS numbers)
+        committed = None
+        if key is not None:
+            committed = committed_mark(source, mark if mark is not None else max(0, latest - MAX_TRACKED_GAPS), latest)
+        deleted = []
+        source_cursor = source.cursor(buffered=False)
+        try:
+            if mark is not None:
+                source_columns = self._columns(source_cursor, f"SELECT * FROM {table} LIMIT 0")
+                if source_columns != self._columns(cursor, f"SELECT * FROM {name} LIMIT 0"):
+                    mark = None
+            if mark is None:
+                source_cursor.execute(f"SELECT * FROM {table}")
+            else:
+                deleted = fetch_deleted(source, table, mark, latest)
+                source_cursor.execute(f"SELECT * FROM {table} WHERE change_seq > %s AND change_seq <= %s", (mark, latest))
+            target = name if mark is not None else f"{name}__staging"
+            cursor.execute("BEGIN TRANSACTION")
+            try:
+                if mark is None:
+                    columns = ", ".join(f'"{column[0]}" {_DUCKDB_TYPES[column_kind(column[1])]}' for column in source_cursor.description)
+                    cursor.execute(f"CREATE OR REPLACE TABLE {target} ({columns})")
+                elif deleted:
+                    cursor.execute(f"DELETE FROM {target} WHERE {key} IN (SELECT UNNEST(?))", [deleted])
+                rows = len(deleted)
+                for frame in read_frames(source_cursor, COPY_FRAME_ROWS):
+                    cursor.register("incoming", frame)
+                    if mark is not None:
+                        cursor.execute(f"DELETE FROM {target} WHERE {key} IN (SELECT {key} FROM incoming)")
+                    cursor.execute(f"INSERT INTO {target} SELECT * FROM incoming")
+                    cursor.unregister("incoming")
+                    rows += len(frame)
+                if mark is None:
+                    cursor.execute(f"DROP TABLE IF EXISTS {name}")
+                    cursor.execute(f"ALTER TABLE {target} RENAME TO {name}")
+                cursor.execute(f"""
+                    INSERT OR REPLACE INTO replica_watermarks (table_name, high_water_mark, row_count, refreshed_at)
+                    SELECT ?, ?, COUNT(*), now() FROM {name}
+                """, [name, committed])
+                cursor.execute("COMMIT")
+            except ReplicaError:
+                cursor.execute("ROLLBACK")
+                raise
+            return rows
+        finally:
+            source_cursor.close()
+
+    # Function to release the DuckDB file
+    def close(self):
+        self._db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy the MySQL tables into the local DuckDB analytics replica.")
+    parser.add_argument("--path", default=DEFAULT_REPLICA_PATH, help="DuckDB file (only one process may have it open)")
+    parser.add_argument("--full", action="store_true", help="re-copy every table instead of appending new rows")
+    parser.add_argument("--interval", type=float, default=0, help="keep refreshing every N seconds")
+    args = parser.parse_args()
+
+    replica = AnalyticsReplica(args.path)
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        full = args.full
+        while True:
+            started = time.perf_counter()
+            counts = replica.refresh(conn, full=full)
+            elapsed = time.perf_counter() - started
+            print(", ".join(f"{table}: +{rows:,}" for table, rows in counts.items()) + f" ({elapsed:.2f}s)")
+            if not args.interval:
+                break
+            full = False
+            time.sleep(args.interval)
+    finally:
+        conn.close()
+        replica.close()
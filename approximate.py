@@ -0,0 +1,332 @@
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from histograms import auto_bin_width
+
+# Key-space blocks an approximate scan reads, one at a time in random order. Row keys are UUID4s,
+# so a range of them (by the first two hex digits) is a uniform random sample of the rows, read
+# as one contiguous stretch of the primary key (or of an index on the key).
+KEY_BLOCKS = 256
+# z-score of the reported error bounds (95% confidence)
+Z_95 = 1.96
+# HyperLogLog registers are 2**precision bytes; relative error about 1.04 / sqrt(2**precision)
+DEFAULT_HLL_PRECISION = 12
+# Count-min sketch: estimates exceed the true count by at most epsilon * total with probability 1 - delta
+DEFAULT_CMS_EPSILON = 0.001
+DEFAULT_CMS_DELTA = 0.01
+# Values a reservoir keeps, however many it is offered
+DEFAULT_RESERVOIR_SIZE = 100_000
+
+
+# Function to hash values (strings, numbers, None) to uint64, vectorised
+def hash_values(values):
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+# Function to list the key ranges of the sample blocks in a random (seeded) order, as (low, high);
+# the last block's high is None
+def key_blocks(seed=0, blocks=KEY_BLOCKS):
+    order = np.random.default_rng(seed).permutation(blocks)
+    return [(f"{i:02x}", f"{i + 1:02x}" if i + 1 < blocks else None) for i in order.tolist()]
+
+
+# Function to build the condition selecting one key block of a column
+def key_block_condition(column, block):
+    low, high = block
+    if high is None:
+        return f"{column} >= %s", (low,)
+    return f"{column} >= %s AND {column} < %s", (low, high)
+
+
+# Distinct count sketch: 2**precision registers each holding the longest run of leading zero bits seen
+class HyperLogLog:
+    def __init__(self, precision=DEFAULT_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    # Function to add values (or pre-computed uint64 hashes)
+    def add(self, values, hashed=False):
+        hashes = np.asarray(values, dtype=np.uint64) if hashed else hash_values(values)
+        if not len(hashes):
+            return
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Position of the first 1 bit in the remaining bits (frexp is exact below 2**53)
+        _, length = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, bits + 1, bits - length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    # Function to fold another sketch of the same precision into this one
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    # Function to estimate the number of distinct values added (linear counting while many registers are empty)
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty:
+            return m * math.log(m / empty)
+        return float(raw)
+
+
+# Frequency sketch: depth rows of width counters; a value's estimate is its smallest counter
+class CountMinSketch:
+    def __init__(self, epsilon=DEFAULT_CMS_EPSILON, delta=DEFAULT_CMS_DELTA):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    # Function to get each value's counter in every row (double hashing: h1 + i * h2)
+    def _columns(self, values):
+        hashes = hash_values(values)
+        first = hashes & np.uint64(0xFFFFFFFF)
+        second = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((first[None, :] + rows * second[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    # Function to count values (each once, or by counts)
+    def add(self, values, counts=None):
+        if not len(values):
+            return
+        counts = np.ones(len(values), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        for row, columns in enumerate(self._columns(values)):
+            np.add.at(self.table[row], columns, counts)
+        self.total += int(counts.sum())
+
+    # Function to estimate the counts of values (never below the true count)
+    def estimate(self, values):
+        if not len(values):
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(values)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    # Function to get the most an estimate can exceed the true count (with probability 1 - delta)
+    def error_bound(self):
+        return self.epsilon * self.total
+
+
+# Uniform sample of at most size values from a stream of unknown length (Algorithm R, a batch at a time)
+class Reservoir:
+    def __init__(self, size=DEFAULT_RESERVOIR_SIZE, seed=0):
+        self.size = size
+        self.seen = 0
+        self.values = np.zeros(0, dtype=np.float64)
+        self._rng = np.random.default_rng(seed)
+
+    # Function to offer a batch of values
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        free = max(0, self.size - len(self.values))
+        if free:
+            self.values = np.concatenate([self.values, values[:free]])
+        rest = values[free:]
+        if len(rest):
+            # The i-th value offered overall replaces a random slot with probability size / i
+            positions = self.seen + free + np.arange(1, len(rest) + 1)
+            slots = (self._rng.random(len(rest)) * positions).astype(np.int64)
+            keep = slots < self.size
+            self.values[slots[keep]] = rest[keep]
+        self.seen += len(values)
+
+
+# Per-group mean with a confidence interval, from (group, n, sum, sum of squares) rows of sampled blocks
+class GroupMeanEstimator:
+    def __init__(self):
+        self.totals = None
+
+    # Function to fold in one block's per-group counts and sums
+    def add(self, frame):
+        frame = frame.groupby("group", dropna=False)[["n", "total", "total_sq"]].sum()
+        self.totals = frame if self.totals is None else self.totals.add(frame, fill_value=0)
+
+    # Function to get each group's estimated mean and its error bound
+    def result(self, coverage):
+        if self.totals is None or self.totals.empty:
+            return pd.DataFrame(columns=["group", "n", "mean", "error"])
+        totals = self.totals[self.totals["n"] > 0].astype(float)
+        mean = totals["total"] / totals["n"]
+        variance = (totals["total_sq"] / totals["n"] - mean ** 2).clip(lower=0)
+        # Sample variance of the mean, with the finite population correction for the share not read yet
+        error = Z_95 * np.sqrt(variance / totals["n"] * (1 - coverage))
+        return pd.DataFrame({"group": totals.index, "n": totals["n"].astype(np.int64), "mean": mean, "error": error}).reset_index(drop=True)
+
+
+# Distinct members per group from sampled blocks of the member key: the members sampled are a fraction
+# coverage of all of them, so each group's distinct count in the sample is scaled up by 1 / coverage
+class DistinctCountEstimator:
+    def __init__(self, precision=DEFAULT_HLL_PRECISION):
+        self.precision = precision
+        self.sketches = {}
+
+    # Function to fold in one block's (group, member) rows
+    def add(self, groups, members):
+        frame = pd.DataFrame({"group": groups, "hash": hash_values(members)})
+        for group, hashes in frame.groupby("group", dropna=False)["hash"]:
+            sketch = self.sketches.get(group)
+            if sketch is None:
+                sketch = self.sketches[group] = HyperLogLog(self.precision)
+            sketch.add(hashes.to_numpy(), hashed=True)
+
+    # Function to get each group's estimated distinct count and its error bound (sampling and sketch error)
+    def result(self, coverage):
+        rows = []
+        for group, sketch in self.sketches.items():
+            estimate = sketch.estimate() / coverage if coverage else 0.0
+            variance = estimate * (1 - coverage) / coverage + (sketch.relative_error * estimate) ** 2 if coverage else 0.0
+            rows.append((group, estimate, Z_95 * math.sqrt(variance)))
+        return pd.DataFrame(rows, columns=["group", "estimate", "error"])
+
+
+# Value frequencies from sampled blocks: a count-min sketch holds the counts and a bounded set of
+# candidates tracks the values that may be among the most frequent
+class FrequencyEstimator:
+    def __init__(self, capacity=1000, epsilon=DEFAULT_CMS_EPSILON, delta=DEFAULT_CMS_DELTA):
+        self.capacity = capacity
+        self.sketch = CountMinSketch(epsilon, delta)
+        self.candidates = np.zeros(0, dtype=object)
+
+    # Function to fold in one block's values (each once, or already counted, by counts)
+    def add(self, values, counts=None):
+        if counts is None:
+            counts = pd.Series(values, dtype=object).value_counts(dropna=True)
+        else:
+            counts = pd.Series(np.asarray(counts, dtype=np.int64), index=pd.Index(values, dtype=object))
+            counts = counts[counts.index.notna()].groupby(level=0).sum().sort_values(ascending=False)
+        self.sketch.add(counts.index.to_numpy(dtype=object), counts.to_numpy())
+        candidates = pd.unique(np.concatenate([self.candidates, counts.index[:self.capacity].to_numpy(dtype=object)]))
+        if len(candidates) > self.capacity:
+            candidates = candidates[np.argsort(-self.sketch.estimate(candidates), kind="stable")[:self.capacity]]
+        self.candidates = candidates
+
+    # Function to get the top values' estimated counts and error bounds (sampling and sketch error)
+    def result(self, coverage, top_k):
+        if not len(self.candidates) or not coverage:
+            return pd.DataFrame(columns=["value", "estimate", "error"])
+        sampled = self.sketch.estimate(self.candidates).astype(float)
+        order = np.argsort(-sampled, kind="stable")[:top_k]
+        sampled = sampled[order]
+        error = (Z_95 * np.sqrt(sampled * (1 - coverage)) + self.sketch.error_bound()) / coverage
+        return pd.DataFrame({"value": self.candidates[order], "estimate": sampled / coverage, "error": error})
+
+
+# Histogram of a numeric column from sampled blocks, holding at most a reservoir of values
+class HistogramEstimator:
+    def __init__(self, reservoir_size=DEFAULT_RESERVOIR_SIZE, seed=0):
+        self.reservoir = Reservoir(reservoir_size, seed)
+
+    # Function to fold in one block's values
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.reservoir.add(values[~np.isnan(values)])
+
+    # Function to get estimated bin counts (bin_start, bin_end, count, error) for the whole table;
+    # without a width, one is picked from the values kept
+    def result(self, coverage, width=None):
+        values = self.reservoir.values
+        if not len(values) or not coverage:
+            return pd.DataFrame(columns=["bin_start", "bin_end", "count", "error"])
+        width = width or auto_bin_width(float(values.min()), float(values.max()), len(values))
+        starts, counts = np.unique(np.floor(values / width) * width, return_counts=True)
+        # Each kept value stands for seen / kept values read, each read value for 1 / coverage rows
+        scale = self.reservoir.seen / len(values) / coverage
+        return pd.DataFrame({
+            "bin_start": starts,
+            "bin_end": starts + width,
+            "count": counts * scale,
+            "error": Z_95 * np.sqrt(counts) * scale
+        })
+
+
+# A scan over the key blocks that keeps an estimator current, run on a background thread: the first
+# blocks give a quick answer and every further block narrows its error bounds. fetch_block(block)
+# reads one block and returns the arguments for estimator.add().
+class ProgressiveScan:
+    def __init__(self, estimator, fetch_block, seed=0, blocks=KEY_BLOCKS):
+        self.estimator = estimator
+        self.fetch_block = fetch_block
+        self.blocks = key_blocks(seed, blocks)
+        self.blocks_read = 0
+        self.error = None
+        self.started_at = time.monotonic()
+        self.last_read = self.started_at
+        self.finished_at = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    @property
+    def coverage(self):
+        return self.blocks_read / len(self.blocks)
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    # Function to read every block (meant for an executor thread); stops early on cancel() or an error
+    def run(self):
+        try:
+            for block in self.blocks:
+                if self.cancelled:
+                    break
+                data = self.fetch_block(block)
+                with self._lock:
+                    self.estimator.add(*data)
+                    self.blocks_read += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.monotonic()
+
+    # Function to stop the scan after the block in progress
+    def cancel(self):
+        self.cancelled = True
+
+    # Function to get the current estimate (estimator.result(coverage, *args)) and the coverage it is from
+    def result(self, *args):
+        self.last_read = time.monotonic()
+        with self._lock:
+            coverage = self.coverage
+            return self.estimator.result(coverage, *args), coverage
+
+
+# Scans shared by every session, keyed by the insight and its filters; a scan older than ttl
+# seconds (or one that failed or was cancelled) is started again, so answers do not go stale.
+# Unfinished scans nobody has read for idle seconds are cancelled when another one starts, so
+# scans for filters a user has moved on from do not hold up the executor.
+class ScanRegistry:
+    def __init__(self, ttl=300, idle=10):
+        self.ttl = ttl
+        self.idle = idle
+        self._scans = {}
+        self._lock = threading.Lock()
+
+    # Function to get the scan for key, submitting a new one built by factory() to the executor if needed
+    def get_or_start(self, key, factory, executor):
+        now = time.monotonic()
+        with self._lock:
+            scan = self._scans.get(key)
+            if scan is not None and scan.error is None and not scan.cancelled and now - scan.started_at <= self.ttl:
+                return scan
+            for other_key, other in list(self._scans.items()):
+                if other.done and now - other.started_at > self.ttl:
+                    del self._scans[other_key]
+                elif not other.done and now - other.last_read > self.idle:
+                    other.cancel()
+            if scan is not None:
+                scan.cancel()
+            scan = self._scans[key] = factory()
+        executor.submit(scan.run)
+        return scan
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import mysql.connector
+import numpy as np
+
+import dbsetup3
+from db_pool import DB_CONFIG, ConnectionPool
+from encapsulated_streamlit_app import ZomatoApp
+from query_cache import QueryCache
+from query_stats import QueryStats
+from rollups import rebuild_rollups
+
+DEFAULT_SCALES = [10_000, 1_000_000, 10_000_000]
+DEFAULT_ITERATIONS = 20
+# A p95 this much above the baseline's is reported as a regression
+DEFAULT_TOLERANCE = 0.20
+
+
+# Function to read this process's peak resident set size in MB since it started (ru_maxrss is KB on
+# Linux, bytes on macOS). It only grows, so it is reported as the process peak, not per operation.
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Function to read this process's current resident set size in MB, or None where /proc is not available
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Function to drop, recreate and fill the benchmark database with a generated dataset of the given size
+def load_dataset(config, orders, seed, use_infile):
+    database = config["database"]
+    if not re.fullmatch(r"\w+", database):
+        raise ValueError(f"Refusing to recreate database with unsafe name {database!r}")
+    server = mysql.connector.connect(**{k: v for k, v in config.items() if k != "database"})
+    cursor = server.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+    cursor.execute(f"CREATE DATABASE {database}")
+    cursor.close()
+    server.close()
+
+    conn = mysql.connector.connect(**config)
+    dbsetup3.create_tables(conn)
+    dbsetup3.apply_migrations(conn)
+    conn.close()
+
+    scale = orders / dbsetup3.BASE_ROW_COUNTS['Orders']
+    # Load in a child process so the generator's memory does not count towards the measured peak RSS
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        load_stats = executor.submit(dbsetup3.bulk_load, seed, scale, dbsetup3.DEFAULT_CHUNK_SIZE,
+                                     dbsetup3.DEFAULT_BATCH_SIZE, use_infile, 3, config).result()
+
+    conn = mysql.connector.connect(**config)
+    started = time.perf_counter()
+    rebuild_rollups(conn)
+    load_stats['rollup_rebuild_seconds'] = time.perf_counter() - started
+    conn.close()
+    return load_stats
+
+
+# Function to time one operation over several iterations and summarise it. With setup, each iteration
+# first calls setup() untimed and passes what it returns to the operation (e.g. a fresh row to delete).
+# rss_delta_mb is the change in current RSS across the iterations (None where it cannot be read).
+def measure(name, operation, iterations, setup=None):
+    latencies = []
+    total = 0.0
+    rss_before = current_rss_mb()
+    for _ in range(iterations):
+        if setup is None:
+            op_started = time.perf_counter()
+            operation()
+        else:
+            argument = setup()
+            op_started = time.perf_counter()
+            operation(argument)
+        latencies.append((time.perf_counter() - op_started) * 1000)
+        total += latencies[-1] / 1000
+    rss_after = current_rss_mb()
+    latencies = np.array(latencies)
+    return {
+        "operation": name,
+        "iterations": iterations,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "ops_per_sec": iterations / total if total else float("inf"),
+        "rss_delta_mb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "process_peak_rss_mb": peak_rss_mb()
+    }
+
+
+# Function to build the View Records, Add, Update and Delete operations the app performs, on customers and
+# on orders (whose writes also run the change capture triggers, the rollup sync and cache invalidation).
+# Returns ([(name, operation, setup)], cleanup): update and delete get a fresh row from setup on every
+# iteration, and cleanup deletes every row the benchmark added that is still there.
+def crud_operations(app):
+    key_columns = app.fetch_primary_key("orders")
+    restaurants = app.fetch_data("SELECT restaurant_id FROM restaurants LIMIT 1") or [{"restaurant_id": None}]
+    restaurant_id = restaurants[0]["restaurant_id"]
+    state = {"anchor": None}
+    customers = []
+    orders = []
+
+    def view_records():
+        page = app.fetch_page("orders", key_columns, 50, state["anchor"])
+        # Walk forward through the table, wrapping at the end
+        state["anchor"] = page["last_key"] if page and page["has_more"] else None
+
+    def add_record():
+        customer_id = str(uuid.uuid4())
+        customers.append(customer_id)
+        app.execute_query(
+            "INSERT INTO customers (customer_id, name, email, total_orders) VALUES (%s, %s, %s, %s)",
+            (customer_id, "Benchmark Customer", "bench@example.com", 0),
+            prepared=True
+        )
+        return customer_id
+
+    def update_record(customer_id):
+        app.execute_query("UPDATE customers SET total_orders = %s WHERE customer_id = %s", (1, customer_id), prepared=True)
+
+    def delete_record(customer_id):
+        app.execute_query("DELETE FROM customers WHERE customer_id = %s", (customer_id,), prepared=True)
+        customers.remove(customer_id)
+
+    def add_order():
+        if not customers:
+            add_record()
+        order_id = str(uuid.uuid4())
+        orders.append(order_id)
+        app.execute_query(
+            "INSERT INTO orders (order_id, customer_id, restaurant_id, order_date, status, total_amount, payment_mode) "
+            "VALUES (%s, %s, %s, NOW(), %s, %s, %s)",
+            (order_id, customers[0], restaurant_id, "Pending", 250.0, "UPI"),
+            prepared=True
+        )
+        return order_id
+
+    def update_order(order_id):
+        app.execute_query("UPDATE orders SET status = %s WHERE order_id = %s", ("Delivered", order_id), prepared=True)
+
+    def cleanup():
+        for order_id in orders:
+            app.execute_query("DELETE FROM orders WHERE order_id = %s", (order_id,), prepared=True)
+        for customer_id in customers:
+            app.execute_query("DELETE FROM customers WHERE customer_id = %s", (customer_id,), prepared=True)
+        orders.clear()
+        customers.clear()
+
+    return [("view_records", view_records, None), ("add_record", add_record, None),
+            ("update_record", update_record, add_record), ("delete_record", delete_record, add_record),
+            ("add_order", add_order, None), ("update_order", update_order, add_order)], cleanup
+
+
+# Function to run every insight method and CRUD path against the loaded database
+def run_suite(config, iterations):
+    pool = ConnectionPool(size=4, **config)
+    # max_bytes=0 keeps the result cache empty, so every call reaches the database
+    app = ZomatoApp(pool=pool, cache=QueryCache(max_bytes=0),
+                    stats=QueryStats(slow_threshold_ms=float("inf"), slow_log_path=os.devnull))
+    results = []
+    for method_name in app.INSIGHT_METHODS:
+        results.append(measure(method_name, getattr(app, method_name), iterations))
+    operations, cleanup = crud_operations(app)
+    try:
+        for name, operation, setup in operations:
+            results.append(measure(name, operation, iterations, setup))
+    finally:
+        cleanup()
+        pool.close_all()
+    return results
+
+
+# Function to format an RSS change in MB for the results table ("n/a" when it could not be read)
+def _format_mb(value):
+    return "n/a" if value is None else f"{value:+.1f} MB"
+
+
+# Function to compare a run against a baseline file; returns the regressions found
+def compare(results, baseline, tolerance):
+    previous = {(row["scale"], row["operation"]): row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        before = previous.get((row["scale"], row["operation"]))
+        if before is None or not before["p95_ms"]:
+            continue
+        change = row["p95_ms"] / before["p95_ms"] - 1
+        if change > tolerance:
+            regressions.append({"scale": row["scale"], "operation": row["operation"],
+                                "baseline_p95_ms": before["p95_ms"], "p95_ms": row["p95_ms"], "change": change})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the insight queries and CRUD paths at several data scales.")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES), help="comma-separated order counts")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", default="zomato_bench", help="scratch database, dropped and recreated per scale")
+    parser.add_argument("--host", default=DB_CONFIG["host"])
+    parser.add_argument("--user", default=DB_CONFIG["user"])
+    parser.add_argument("--password", default=DB_CONFIG["password"])
+    parser.add_argument("--skip-load", action="store_true", help="reuse the data already in --database (single scale)")
+    parser.add_argument("--infile", action="store_true", help="load through LOAD DATA LOCAL INFILE")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    config = {"host": args.host, "user": args.user, "password": args.password, "database": args.database}
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    report = {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "seed": args.seed
+        },
+        "loads": {},
+        "results": []
+    }
+    for orders in scales:
+        print(f"=== {orders:,} orders ===")
+        if not args.skip_load:
+            report["loads"][str(orders)] = load_dataset(config, orders, args.seed, args.infile)
+        for row in run_suite(config, args.iterations):
+            row["scale"] = orders
+            report["results"].append(row)
+            print(f"{row['operation']:<28} p50 {row['p50_ms']:9.1f} ms  p95 {row['p95_ms']:9.1f} ms  "
+                  f"{row['ops_per_sec']:9.1f} ops/s  rss {_format_mb(row['rss_delta_mb'])} "
+                  f"(process peak {row['process_peak_rss_mb']:.0f} MB)")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report["results"], json.load(baseline_file), args.tolerance)
+        report["regressions"] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['operation']} @ {regression['scale']:,}: p95 "
+                  f"{regression['baseline_p95_ms']:.1f} -> {regression['p95_ms']:.1f} ms (+{regression['change']:.0%})")
+        exit_code = 1 if regressions else 0
+
+    with open(args.output, "w") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Results written to {args.output}")
+    sys.exit(exit_code)
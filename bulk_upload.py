@@ -0,0 +1,155 @@
+import time
+
+import mysql.connector
+import pandas as pd
+
+from columnar import python_value
+from statements import build_insert, resolve_columns, resolve_table
+
+# Rows per multi-row statement
+DEFAULT_STATEMENT_ROWS = 1000
+# Rows per transaction (commit)
+DEFAULT_TRANSACTION_ROWS = 10000
+# Operations an upload can apply
+OPERATIONS = ("upsert", "delete")
+
+
+# Function to read an uploaded CSV or Parquet file into a DataFrame. CSV values are kept as text
+# (empty cells become NULL) and converted by MySQL on the way in, like the single-record forms.
+def read_upload(file, file_name):
+    if file_name.lower().endswith(".parquet"):
+        return pd.read_parquet(file)
+    return pd.read_csv(file, dtype=str, keep_default_na=False, na_values=[""])
+
+
+# Function to check an upload's columns against the target table; returns a list of problems (empty if valid).
+# Upserts may use any of the table's columns but must include the whole primary key; deletes match on
+# the primary key and ignore other columns.
+def validate_columns(columns, table_columns, key_columns, operation):
+    problems = []
+    if operation not in OPERATIONS:
+        problems.append(f"Unknown operation: {operation}")
+    if not key_columns:
+        problems.append("The table has no primary key, so rows cannot be matched for update or delete.")
+    duplicates = sorted({column for column in columns if list(columns).count(column) > 1})
+    if duplicates:
+        problems.append(f"Duplicate columns: {', '.join(duplicates)}")
+    unknown = [column for column in columns if column not in table_columns]
+    if unknown and operation == "upsert":
+        problems.append(f"Columns not in the table: {', '.join(unknown)}")
+    missing = [column for column in key_columns if column not in columns]
+    if missing:
+        problems.append(f"Missing primary key columns: {', '.join(missing)}")
+    return problems
+
+
+# Function to turn DataFrame rows into tuples the MySQL driver can bind (NaN/NaT become NULL)
+def frame_rows(frame):
+    values = frame.astype(object).where(frame.notna(), None)
+    return [tuple(python_value(value) for value in row) for row in values.itertuples(index=False, name=None)]
+
+
+# Function to build the multi-row upsert for a set of columns, with names checked against the schema
+# catalog and quoted; key columns are matched, the rest updated from the new row (the row alias form,
+# MySQL 8.0.19+, which replaces the deprecated VALUES(column))
+def upsert_statement(catalog, table_name, columns, key_columns):
+    statement, _ = build_insert(catalog, table_name, dict.fromkeys(columns))
+    quoted = dict(zip(columns, resolve_columns(catalog, table_name, columns)))
+    updates = [quoted[column] for column in columns if column not in key_columns]
+    if updates:
+        return statement + " AS new ON DUPLICATE KEY UPDATE " + ", ".join(f"{column} = new.{column}" for column in updates)
+    # Only key columns: existing rows are left as they are
+    key = quoted[key_columns[0]]
+    return statement + f" AS new ON DUPLICATE KEY UPDATE {key} = {key}"
+
+
+# Function to build a DELETE matching count rows by primary key, with names checked and quoted
+def delete_statement(catalog, table_name, key_columns, count):
+    table = resolve_table(catalog, table_name)
+    keys = resolve_columns(catalog, table_name, list(key_columns))
+    if len(keys) == 1:
+        return f"DELETE FROM {table} WHERE {keys[0]} IN ({', '.join(['%s'] * count)})"
+    row = "(" + ", ".join(["%s"] * len(keys)) + ")"
+    return f"DELETE FROM {table} WHERE ({', '.join(keys)}) IN ({', '.join([row] * count)})"
+
+
+# Function to build the statement an upload runs (for a delete, its one-row form)
+def upload_statement(catalog, table_name, columns, key_columns, operation="upsert"):
+    if operation == "delete":
+        return delete_statement(catalog, table_name, key_columns, 1)
+    return upsert_statement(catalog, table_name, columns, key_columns)
+
+
+# Function to run one batch under a savepoint; if the batch fails, its rows are retried one at a time so
+# only the bad rows are skipped. run(rows) returns the rows it applied. Returns (rows applied,
+# [(row number, error)]).
+def _apply_batch(cursor, run, rows, first_row):
+    cursor.execute("SAVEPOINT bulk_batch")
+    try:
+        return run(rows), []
+    except mysql.connector.Error:
+        cursor.execute("ROLLBACK TO SAVEPOINT bulk_batch")
+    applied = 0
+    errors = []
+    for offset, row in enumerate(rows):
+        cursor.execute("SAVEPOINT bulk_row")
+        try:
+            applied += run([row])
+        except mysql.connector.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+            errors.append((first_row + offset, str(e)))
+    return applied, errors
+
+
+# Function to apply an upload to a table (its names resolved through the schema catalog): upserts run as
+# chunked multi-row INSERT ... ON DUPLICATE KEY UPDATE, deletes as batched DELETE ... IN (...),
+# statement_rows rows per statement and transaction_rows per commit. Bad rows are reported and skipped rather than failing the upload. progress(done, total)
+# is called after each commit. Returns a summary with the statement used, rows applied (for deletes, the
+# rows actually deleted), per-row errors (1-based row numbers) and rows/sec.
+def apply_upload(connection, catalog, table, frame, key_columns, operation="upsert",
+                 statement_rows=DEFAULT_STATEMENT_ROWS, transaction_rows=DEFAULT_TRANSACTION_ROWS, progress=None):
+    columns = list(key_columns) if operation == "delete" else list(frame.columns)
+    statement = upload_statement(catalog, table, columns, key_columns, operation)
+    rows = frame_rows(frame[columns])
+    statement_rows = max(1, int(statement_rows))
+    transaction_rows = max(statement_rows, int(transaction_rows))
+
+    cursor = connection.cursor()
+
+    def run(batch):
+        if operation == "delete":
+            cursor.execute(delete_statement(catalog, table, key_columns, len(batch)), [value for row in batch for value in row])
+            # Keys that match no row delete nothing
+            return max(cursor.rowcount, 0)
+        # mysql.connector rewrites executemany on INSERT ... VALUES into one multi-row statement (its
+        # rowcount counts an updated row twice, so the rows sent are counted instead)
+        cursor.executemany(statement, batch)
+        return len(batch)
+
+    applied = 0
+    errors = []
+    started = time.perf_counter()
+    try:
+        for tx_start in range(0, len(rows), transaction_rows):
+            tx_rows = rows[tx_start:tx_start + transaction_rows]
+            for start in range(0, len(tx_rows), statement_rows):
+                batch_applied, batch_errors = _apply_batch(cursor, run, tx_rows[start:start + statement_rows], tx_start + start + 1)
+                applied += batch_applied
+                errors.extend(batch_errors)
+            connection.commit()
+            if progress is not None:
+                progress(tx_start + len(tx_rows), len(rows))
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    seconds = time.perf_counter() - started
+    return {
+        "statement": statement,
+        "rows": len(rows),
+        "applied": applied,
+        "errors": errors,
+        "seconds": seconds,
+        "rows_per_sec": len(rows) / seconds if seconds else float("inf")
+    }
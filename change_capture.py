@@ -0,0 +1,221 @@
+import argparse
+import json
+import time
+
+import mysql.connector
+
+from db_pool import DB_CONFIG
+
+# Tables under change capture: their key column, and the columns whose previous values the
+# triggers keep in change_log on UPDATE and DELETE (what the live aggregates and order cube are built from)
+CAPTURED_TABLES = {
+    "Orders": ("order_id", ["customer_id", "restaurant_id", "order_date", "payment_mode", "status", "total_amount"]),
+    "OrderItems": ("order_item_id", ["order_id", "dish_name"]),
+    "Deliveries": ("delivery_id", ["order_id", "delivery_time", "estimated_time"])
+}
+# Change log entries older than this are purged by `python change_capture.py --purge`
+CHANGE_LOG_RETENTION_DAYS = 7
+# change_seq is allocated when a change is written but only becomes visible when its transaction commits,
+# so a consumer's mark can pass a sequence number that is still in flight. Such gaps are re-checked on
+# each poll for this long (longer than any write transaction, bulk upload batches included); a gap still
+# missing after that is taken for a rolled-back transaction, and a later commit of it is missed until
+# the consumer reloads.
+IN_FLIGHT_TIMEOUT_SECONDS = 600
+# Gaps a consumer tracks at most (the oldest are dropped first), and how far below its mark a fresh load
+# looks for them
+MAX_TRACKED_GAPS = 1000
+
+
+# Function to read the newest change sequence number (0 when nothing has been captured yet)
+def latest_change(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT COALESCE(MAX(change_seq), 0) FROM change_log")
+    latest = cursor.fetchone()[0]
+    cursor.close()
+    return latest
+
+
+# Function to read the auto-increment step change_seq advances by (1 unless auto_increment_increment is
+# raised, as on multi-primary setups)
+def sequence_step(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT @@auto_increment_increment")
+    step = cursor.fetchone()[0]
+    cursor.close()
+    return step
+
+
+# Function to list the change sequence numbers visible in (mark, latest] and among gaps, in order
+def visible_changes(connection, mark, latest, gaps=()):
+    condition, params = _sequence_condition(mark, latest, gaps)
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT change_seq FROM change_log WHERE {condition} ORDER BY change_seq", params)
+    seen = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return seen
+
+
+# Function to build the condition matching change_seq in (mark, latest] or in gaps
+def _sequence_condition(mark, latest, gaps=()):
+    condition = "(change_seq > %s AND change_seq <= %s)"
+    params = (mark, latest)
+    if gaps:
+        condition += f" OR change_seq IN ({', '.join(['%s'] * len(gaps))})"
+        params += tuple(gaps)
+    return f"({condition})", params
+
+
+# Function to find the highest mark at or below latest that no change after mark can still commit under:
+# the last sequence number before the first gap that is followed by a change made within the in-flight
+# timeout. For consumers that re-read from their mark idempotently (the analytics replica); ones that
+# apply deltas track their gaps with ChangeGaps instead.
+def committed_mark(connection, mark, latest, timeout=IN_FLIGHT_TIMEOUT_SECONDS):
+    step = sequence_step(connection)
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT change_seq, changed_at < NOW(6) - INTERVAL %s SECOND
+        FROM change_log
+        WHERE change_seq > %s AND change_seq <= %s
+        ORDER BY change_seq
+    """, (timeout, mark, latest))
+    expected = mark + step
+    safe = latest
+    for seq, settled in cursor.fetchall():
+        if seq > expected and not settled:
+            safe = expected - step
+            break
+        expected = seq + step
+    cursor.close()
+    return safe
+
+
+# Sequence numbers a delta-applying consumer (live aggregates, order cube) has passed without seeing.
+# Each poll fetches them along with the new range (fetch_changes' gaps) and update() records what was
+# seen: a gap that shows up is applied once, and one missing for longer than the timeout is dropped.
+# A gap's rows cannot have been changed again by a change the consumer already applied (the row lock
+# is held until the gap commits), so applying it late gives the same totals.
+class ChangeGaps:
+    def __init__(self, step=1, timeout=IN_FLIGHT_TIMEOUT_SECONDS, limit=MAX_TRACKED_GAPS):
+        self.step = step
+        self.timeout = timeout
+        self.limit = limit
+        self._first_missed = {}
+
+    # Function to start tracking at a freshly loaded mark, read in the load's snapshot: numbers missing
+    # just below it may belong to transactions that were still open
+    @classmethod
+    def at_load(cls, connection, mark, **options):
+        gaps = cls(step=sequence_step(connection), **options)
+        low = max(0, mark - gaps.limit * gaps.step)
+        gaps.update(low, mark, visible_changes(connection, low, mark))
+        return gaps
+
+    # Function to list the gaps to fetch on the next poll
+    def pending(self):
+        return sorted(self._first_missed)
+
+    # Function to record the sequence numbers seen in (mark, latest] and among the gaps: seen gaps are
+    # resolved, missing numbers in the range become gaps (only the newest limit of them are looked at),
+    # and gaps past the timeout are dropped
+    def update(self, mark, latest, seen):
+        now = time.monotonic()
+        step = self.step
+        seen = set(seen)
+        for seq in seen:
+            self._first_missed.pop(seq, None)
+        floor = latest - self.limit * step
+        expected = mark + step
+        for seq in sorted(seq for seq in seen if mark < seq <= latest) + [latest + step]:
+            if expected < floor:
+                expected += -(-(floor - expected) // step) * step
+            for missing in range(expected, seq, step):
+                self._first_missed.setdefault(missing, now)
+            expected = seq + step
+        for seq, first_missed in list(self._first_missed.items()):
+            if now - first_missed > self.timeout:
+                del self._first_missed[seq]
+        for seq in sorted(self._first_missed)[:max(0, len(self._first_missed) - self.limit)]:
+            del self._first_missed[seq]
+
+
+# Function to fetch what changed in the captured tables after mark, up to and including latest.
+# Returns {table: {row_id: (old_values, new_row)}}: old_values are the captured columns as they were
+# before the first change past mark (None if the row was inserted since; an upsert that hit an existing
+# row logs only its update, see migration 6 in dbsetup3.py), new_row is the row as it is now (None if
+# it has been deleted since). Subtracting the old and adding the new gives the net effect of every
+# change in between, however many there were. gaps are earlier sequence numbers that were still in
+# flight at the last poll (see ChangeGaps). Run it inside a consistent snapshot so the log and the
+# tables agree.
+def fetch_changes(connection, mark, latest, tables=None, gaps=()):
+    condition, params = _sequence_condition(mark, latest, gaps)
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        SELECT table_name, row_id, operation, old_values
+        FROM change_log
+        WHERE {condition}
+        ORDER BY change_seq
+    """, params)
+    touched = {}
+    for table_name, row_id, operation, old_values in cursor.fetchall():
+        rows = touched.setdefault(table_name, {})
+        if row_id not in rows:
+            rows[row_id] = None if operation == "I" else json.loads(old_values)
+    cursor.close()
+
+    changes = {}
+    for table, (key, columns) in CAPTURED_TABLES.items():
+        name = table.lower()
+        if name not in touched or (tables is not None and table not in tables):
+            continue
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT {key}, {", ".join(columns)}
+            FROM {table}
+            WHERE {condition}
+        """, params)
+        current = {row[key]: row for row in cursor.fetchall()}
+        cursor.close()
+        changes[table] = {row_id: (old_values, current.get(row_id)) for row_id, old_values in touched[name].items()}
+    return changes
+
+
+# Function to list the rows deleted from a table after mark, up to and including latest
+def fetch_deleted(connection, table, mark, latest):
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT row_id FROM change_log
+        WHERE table_name = %s AND operation = 'D' AND change_seq > %s AND change_seq <= %s
+    """, (table.lower(), mark, latest))
+    deleted = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return deleted
+
+
+# Function to delete change log entries older than the retention period, in small batches.
+# Consumers that fall further behind than that must resync from the tables.
+def purge_change_log(connection, retention_days=CHANGE_LOG_RETENTION_DAYS, batch_size=10000):
+    cursor = connection.cursor()
+    purged = 0
+    while True:
+        cursor.execute("DELETE FROM change_log WHERE changed_at < NOW() - INTERVAL %s DAY LIMIT %s", (retention_days, batch_size))
+        connection.commit()
+        purged += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            break
+    cursor.close()
+    return purged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or purge the change log.")
+    parser.add_argument("--purge", action="store_true", help="delete entries older than --retention-days")
+    parser.add_argument("--retention-days", type=int, default=CHANGE_LOG_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        if args.purge:
+            print(f"Purged {purge_change_log(conn, args.retention_days):,} change log entries.")
+        print(f"Latest change: {latest_change(conn):,}")
+    finally:
+        conn.close()
@@ -0,0 +1,144 @@
+import math
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from histograms import bins_frame
+
+# Categories a bar chart draws; the rest are summed into one "Other" bar
+DEFAULT_MAX_CATEGORIES = 30
+# Points a line chart draws; longer series are downsampled with LTTB
+DEFAULT_MAX_POINTS = 2000
+# Line charts with more points than this are drawn with WebGL (scattergl) instead of SVG
+WEBGL_POINT_THRESHOLD = 1000
+# Bars a histogram draws; beyond this, neighbouring bins are merged
+MAX_HISTOGRAM_BARS = 200
+# Upper bound on a figure's JSON; charts over it are reduced further until they fit
+MAX_PAYLOAD_BYTES = 1024 * 1024
+# Label of the bar holding everything outside the top categories
+OTHER_LABEL = "Other"
+
+
+# Function to measure the JSON a figure sends to the browser
+def payload_bytes(fig):
+    return len(fig.to_json())
+
+
+# Function to build a figure with build(limit), halving the limit until its payload is under max_bytes
+# (or the limit reaches minimum)
+def fit_payload(build, limit, minimum, max_bytes=MAX_PAYLOAD_BYTES):
+    while True:
+        fig = build(limit)
+        if limit <= minimum or payload_bytes(fig) <= max_bytes:
+            return fig
+        limit = max(minimum, limit // 2)
+
+
+# Function to keep the n largest categories of a frame and sum the rest into one "Other" row
+def top_n_with_other(frame, category, value, n=DEFAULT_MAX_CATEGORIES):
+    if len(frame) <= n:
+        return frame
+    ranked = frame.sort_values(value, ascending=False, kind="stable")
+    top = ranked.head(n - 1)
+    other = pd.DataFrame({category: [OTHER_LABEL], value: [ranked[value].iloc[n - 1:].sum()]})
+    return pd.concat([top[[category, value]], other], ignore_index=True)
+
+
+# Function to turn x values (numbers or datetimes) into floats for the LTTB areas
+def _numeric(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+    return values.to_numpy(dtype=float)
+
+
+# Function to pick which points of a series to keep with Largest-Triangle-Three-Buckets: the first and
+# last point, plus from each of threshold - 2 equal buckets the point forming the largest triangle with
+# the previous pick and the next bucket's average. Peaks and troughs survive, unlike with striding.
+def lttb_indices(x, y, threshold):
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    x = _numeric(x)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0] = 0
+    picked[-1] = count - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_start, next_stop = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (count - 1, count)
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        areas = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous]) - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        picked[bucket + 1] = previous
+    return picked
+
+
+# Function to downsample a frame's series to at most max_points rows with LTTB (sorted by x)
+def downsample_series(frame, x, y, max_points=DEFAULT_MAX_POINTS):
+    frame = frame.sort_values(x, kind="stable", ignore_index=True)
+    if len(frame) <= max_points:
+        return frame
+    return frame.iloc[lttb_indices(frame[x], frame[y], max_points)].reset_index(drop=True)
+
+
+# Function to merge neighbouring histogram bins until there are at most max_bars; returns (bins, width)
+def merge_bins(bins, bin_width, max_bars=MAX_HISTOGRAM_BARS):
+    if len(bins) <= max_bars:
+        return bins, bin_width
+    span = (bins["bin_end"].max() - bins["bin_start"].min()) / bin_width
+    width = bin_width * math.ceil(span / max_bars)
+    starts = np.floor(bins["bin_start"].to_numpy() / width) * width
+    merged = pd.DataFrame({"bin_start": starts, "count": bins["count"].to_numpy()}).groupby("bin_start", as_index=False)["count"].sum()
+    return bins_frame(merged["bin_start"], merged["count"], width), width
+
+
+# Function to draw a bar chart of a category and a value, keeping the payload small: at most
+# max_categories bars, the rest summed into "Other"
+def bar_chart(frame, x, y, title, labels=None, max_categories=DEFAULT_MAX_CATEGORIES):
+    def build(limit):
+        shown = top_n_with_other(frame, x, y, limit)
+        suffix = f" (top {limit - 1} of {len(frame):,} + {OTHER_LABEL})" if len(shown) < len(frame) else ""
+        return px.bar(shown, x=x, y=y, title=title + suffix, labels=labels)
+
+    return fit_payload(build, max_categories, minimum=5)
+
+
+# Function to draw the largest values of a category as bars, optionally with error bars. There is no
+# "Other" bar, since averages and error bounds do not add up.
+def ranked_bar_chart(frame, x, y, title, labels=None, error=None, max_categories=DEFAULT_MAX_CATEGORIES):
+    shown = frame.sort_values(y, ascending=False, kind="stable").head(max_categories)
+    suffix = f" (top {len(shown)} of {len(frame):,})" if len(shown) < len(frame) else ""
+    return px.bar(shown, x=x, y=y, error_y=error, title=title + suffix, labels=labels)
+
+
+# Function to draw a line chart of a series, keeping the payload small: downsampled to max_points with
+# LTTB, and drawn with WebGL when there are still many points
+def line_chart(frame, x, y, title, labels=None, max_points=DEFAULT_MAX_POINTS):
+    def build(limit):
+        shown = downsample_series(frame, x, y, limit)
+        suffix = f" ({len(shown):,} of {len(frame):,} points)" if len(shown) < len(frame) else ""
+        render_mode = "webgl" if len(shown) > WEBGL_POINT_THRESHOLD else "svg"
+        return px.line(shown, x=x, y=y, title=title + suffix, labels=labels, render_mode=render_mode)
+
+    return fit_payload(build, max_points, minimum=100)
+
+
+# Function to draw a histogram from bin counts, merging neighbouring bins beyond max_bars,
+# with a dashed line per percentile
+def histogram_chart(bins, bin_width, percentiles, title, labels=None, max_bars=MAX_HISTOGRAM_BARS):
+    def build(limit):
+        shown, width = merge_bins(bins, bin_width, limit)
+        df = shown.assign(bin_center=(shown["bin_start"] + shown["bin_end"]) / 2)
+        fig = px.bar(df, x="bin_center", y="count", title=title, labels=labels)
+        fig.update_traces(width=width)
+        fig.update_layout(bargap=0)
+        for percentile, value in percentiles.items():
+            fig.add_vline(x=value, line_dash="dash", annotation_text=f"p{percentile}: {value:.1f}")
+        return fig
+
+    return fit_payload(build, max_bars, minimum=10)
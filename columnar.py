@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from mysql.connector.constants import FieldType
+
+# Rows pulled off the socket per fetchmany() call
+FETCH_BATCH_SIZE = 10000
+# Text columns with at most this share of distinct values become pandas categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+_DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP, FieldType.DATE, FieldType.NEWDATE}
+_FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE, FieldType.DECIMAL, FieldType.NEWDECIMAL}
+_INT_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG, FieldType.INT24, FieldType.YEAR}
+_TEXT_TYPES = {FieldType.VARCHAR, FieldType.VAR_STRING, FieldType.STRING, FieldType.ENUM}
+
+
+# Function to turn one batch of a column (a tuple of Python values) into a typed NumPy chunk
+def _column_chunk(values, type_code):
+    if type_code in _DATETIME_TYPES:
+        return np.array(values, dtype="datetime64[us]")
+    if type_code in _FLOAT_TYPES:
+        return np.array(values, dtype=np.float64)
+    if type_code in _INT_TYPES:
+        # NULLs force a float column, the same way pandas would represent them
+        if None in values:
+            return np.array(values, dtype=np.float64)
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=object)
+
+
+# Function to name the kind of value a result column holds: "datetime", "float", "int" or "text"
+def column_kind(type_code):
+    if type_code in _DATETIME_TYPES:
+        return "datetime"
+    if type_code in _FLOAT_TYPES:
+        return "float"
+    if type_code in _INT_TYPES:
+        return "int"
+    return "text"
+
+
+# Function to glue the per-batch chunks of one column into a typed pandas column
+def _finish_column(chunks, type_code, categories=True):
+    if not chunks:
+        return np.array([], dtype=object)
+    values = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+    if categories and type_code in _TEXT_TYPES and len(values):
+        column = pd.Series(values, dtype=object)
+        if column.nunique(dropna=True) <= CATEGORY_MAX_UNIQUE_RATIO * len(column):
+            return column.astype("category")
+        return column
+    return values
+
+
+# Function to pull up to max_rows rows off a (tuple) cursor as per-column NumPy chunks; returns (chunks, rows)
+def _read_chunks(cursor, type_codes, batch_size, max_rows=None):
+    chunks = [[] for _ in type_codes]
+    rows = 0
+    while max_rows is None or rows < max_rows:
+        batch = cursor.fetchmany(batch_size if max_rows is None else min(batch_size, max_rows - rows))
+        if not batch:
+            break
+        for i, values in enumerate(zip(*batch)):
+            chunks[i].append(_column_chunk(values, type_codes[i]))
+        rows += len(batch)
+    return chunks, rows
+
+
+# Function to read the rest of a (tuple) cursor straight into a typed DataFrame.
+# Rows are fetched in batches and transposed into per-column NumPy chunks, so no per-row dicts are built.
+def read_frame(cursor, batch_size=FETCH_BATCH_SIZE):
+    description = cursor.description or []
+    names = [column[0] for column in description]
+    type_codes = [column[1] for column in description]
+    chunks, _ = _read_chunks(cursor, type_codes, batch_size)
+    return pd.DataFrame({
+        name: _finish_column(column_chunks, type_code)
+        for name, column_chunks, type_code in zip(names, chunks, type_codes)
+    }, columns=names)
+
+
+# Function to read the rest of a (tuple) cursor as a series of DataFrames of at most frame_rows rows,
+# so a large result can be copied elsewhere without holding all of it. Text stays object-typed,
+# since categories built per frame would not line up between frames.
+def read_frames(cursor, frame_rows=10 * FETCH_BATCH_SIZE, batch_size=FETCH_BATCH_SIZE):
+    description = cursor.description or []
+    names = [column[0] for column in description]
+    type_codes = [column[1] for column in description]
+    while True:
+        chunks, rows = _read_chunks(cursor, type_codes, batch_size, frame_rows)
+        if not rows:
+            return
+        yield pd.DataFrame({
+            name: _finish_column(column_chunks, type_code, categories=False)
+            for name, column_chunks, type_code in zip(names, chunks, type_codes)
+        }, columns=names)
+
+
+# Function to convert a value read back out of a DataFrame into something the MySQL driver can bind
+def python_value(value):
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
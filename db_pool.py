@@ -0,0 +1,130 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+from statements import DEFAULT_STATEMENT_CACHE_SIZE, PreparedStatementCache
+
+# Connection settings shared by the Streamlit apps
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "mysql",
+    "database": "zomato1"
+}
+
+
+class PoolExhaustedError(Error):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, size=10, timeout=30, statement_cache_size=DEFAULT_STATEMENT_CACHE_SIZE, **config):
+        self.size = size
+        self.timeout = timeout
+        self.statement_cache_size = statement_cache_size
+        self.config = config or dict(DB_CONFIG)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._open = 0
+        # Prepared statements live on their connection, so each pooled connection keeps its own cache
+        self._statement_caches = {}
+
+    # Function to open a brand new connection with the pool's settings
+    def _new_connection(self):
+        connection = mysql.connector.connect(**self.config)
+        with self._lock:
+            self._open += 1
+        return connection
+
+    # Function to drop a connection that is broken or no longer wanted
+    def _discard(self, connection):
+        with self._lock:
+            self._open -= 1
+            self._statement_caches.pop(id(connection), None)
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    # Function to check that an idle connection is still usable before lending it out
+    def _is_healthy(self, connection):
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    # Function to borrow a connection, waiting for a free slot up to the pool timeout
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhaustedError(msg=f"No free database connection after {self.timeout}s (pool size {self.size})")
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._new_connection()
+                if self._is_healthy(connection):
+                    return connection
+                self._discard(connection)
+        except Exception:
+            self._slots.release()
+            raise
+
+    # Function to hand a borrowed connection back to the pool
+    def release(self, connection):
+        try:
+            if connection.is_connected():
+                # Never leave an open transaction behind for the next borrower
+                if connection.in_transaction:
+                    connection.rollback()
+                self._idle.put(connection)
+            else:
+                self._discard(connection)
+        except Error:
+            self._discard(connection)
+        finally:
+            self._slots.release()
+
+    # Borrow/return a connection around a block of work
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    # Function to get the prepared-statement cache of a borrowed connection
+    def statement_cache(self, connection):
+        with self._lock:
+            cache = self._statement_caches.get(id(connection))
+            if cache is None:
+                cache = self._statement_caches[id(connection)] = PreparedStatementCache(connection, self.statement_cache_size)
+            return cache
+
+    # Function to report how many connections the pool currently holds, and prepared statement reuse
+    def stats(self):
+        with self._lock:
+            caches = [cache.stats() for cache in self._statement_caches.values()]
+            return {
+                "size": self.size,
+                "open": self._open,
+                "idle": self._idle.qsize(),
+                "prepared": sum(cache["statements"] for cache in caches),
+                "prepared_hits": sum(cache["hits"] for cache in caches),
+                "prepared_misses": sum(cache["misses"] for cache in caches)
+            }
+
+    # Function to close every idle connection (borrowed ones are closed on return)
+    def close_all(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
@@ -2,6 +2,37 @@ import mysql.connector
 from faker import Faker
 import random
 import uuid
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from db_pool import DB_CONFIG
+from partitions import partition_clause
+from rollups import rebuild_rollups
+
+# Row counts at scale 1.0 (the sizes generate_fake_data uses); other tables derive from Orders
+BASE_ROW_COUNTS = {'Customers': 100, 'Restaurants': 50, 'Orders': 200, 'DeliveryPersons': 30}
+DELIVERIES_PER_ORDER = 0.5
+MAX_ITEMS_PER_ORDER = 5
+DEFAULT_CHUNK_SIZE = 100_000
+# Faker only fills vocabularies of this size; rows sample from them
+VOCABULARY_SIZE = 1000
+
+CUISINES = ['Indian', 'Chinese', 'Italian', 'Mexican']
+ORDER_STATUSES = ['Pending', 'Delivered', 'Cancelled']
+PAYMENT_MODES = ['Credit Card', 'Cash', 'UPI']
+VEHICLE_TYPES = ['Bike', 'Car', 'Scooter']
+DELIVERY_STATUSES = ['On the way', 'Delivered', 'Pending']
+
+# Per-table salt so the same row index gives different IDs in different tables
+_TABLE_SALTS = {'Customers': 1, 'Restaurants': 2, 'Orders': 3, 'OrderItems': 4, 'DeliveryPersons': 5, 'Deliveries': 6}
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
 
 def create_connection():
     try:
@@ -18,9 +49,32 @@ def create_connection():
         print(f"Error: {err}")
         return None
 
-def create_tables(connection):
+# Function to create the tables. With partitioned=True, Orders, OrderItems and Deliveries are range
+# partitioned by month of order_date (see partitions.py): partitioned tables can have no foreign keys
+# (verify_foreign_keys checks them after loads instead), every unique key must include order_date,
+# and the two child tables get a copy of their order's order_date, filled in by a trigger on insert and
+# moved along with it by a trigger on Orders when an order's date changes.
+def create_tables(connection, partitioned=False):
     cursor = connection.cursor()
     print("Creating tables in the database...")
+    if partitioned:
+        partitioning = " " + partition_clause()
+        order_date = "order_date DATETIME NOT NULL"
+        order_keys = "PRIMARY KEY (order_id, order_date)"
+        # The trigger overwrites the default with the order's date; it only stays for orders not loaded yet
+        item_keys = "order_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,\n        PRIMARY KEY (order_item_id, order_date)"
+        delivery_keys = "order_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,\n        PRIMARY KEY (delivery_id, order_date)"
+    else:
+        partitioning = ""
+        order_date = "order_date DATETIME"
+        order_keys = """PRIMARY KEY (order_id),
+        FOREIGN KEY (customer_id) REFERENCES Customers(customer_id),
+        FOREIGN KEY (restaurant_id) REFERENCES Restaurants(restaurant_id)"""
+        item_keys = """PRIMARY KEY (order_item_id),
+        FOREIGN KEY (order_id) REFERENCES Orders(order_id)"""
+        delivery_keys = """PRIMARY KEY (delivery_id),
+        FOREIGN KEY (order_id) REFERENCES Orders(order_id),
+        FOREIGN KEY (delivery_person_id) REFERENCES DeliveryPersons(delivery_person_id)"""
 
     # Create Customers Table
     cursor.execute("""
@@ -55,33 +109,32 @@ def create_tables(connection):
     """)
 
     # Create Orders Table
-    cursor.execute("""
+    cursor.execute(f"""
     CREATE TABLE IF NOT EXISTS Orders (
-        order_id VARCHAR(36) PRIMARY KEY,
+        order_id VARCHAR(36),
         customer_id VARCHAR(36),
         restaurant_id VARCHAR(36),
-        order_date DATETIME,
+        {order_date},
         delivery_time DATETIME,
         status VARCHAR(50),
         total_amount FLOAT,
         payment_mode VARCHAR(50),
         discount_applied FLOAT,
         feedback_rating FLOAT,
-        FOREIGN KEY (customer_id) REFERENCES Customers(customer_id),
-        FOREIGN KEY (restaurant_id) REFERENCES Restaurants(restaurant_id)
-    );
+        {order_keys}
+    ){partitioning};
     """)
 
     # Create OrderItems Table
-    cursor.execute("""
+    cursor.execute(f"""
     CREATE TABLE IF NOT EXISTS OrderItems (
-        order_item_id VARCHAR(36) PRIMARY KEY,
+        order_item_id VARCHAR(36),
         order_id VARCHAR(36),
         dish_name VARCHAR(255),
         quantity INT,
         price FLOAT,
-        FOREIGN KEY (order_id) REFERENCES Orders(order_id)
-    );
+        {item_keys}
+    ){partitioning};
     """)
 
     # Create DeliveryPersons Table
@@ -98,9 +151,9 @@ def create_tables(connection):
     """)
 
     # Create Deliveries Table
-    cursor.execute("""
+    cursor.execute(f"""
     CREATE TABLE IF NOT EXISTS Deliveries (
-        delivery_id VARCHAR(36) PRIMARY KEY,
+        delivery_id VARCHAR(36),
         order_id VARCHAR(36),
         delivery_person_id VARCHAR(36),
         delivery_status VARCHAR(50),
@@ -109,14 +162,183 @@ def create_tables(connection):
         estimated_time INT,
         delivery_fee FLOAT,
         vehicle_type VARCHAR(50),
-        FOREIGN KEY (order_id) REFERENCES Orders(order_id),
-        FOREIGN KEY (delivery_person_id) REFERENCES DeliveryPersons(delivery_person_id)
-    );
+        {delivery_keys}
+    ){partitioning};
     """)
 
+    if partitioned:
+        for table in ("OrderItems", "Deliveries"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table.lower()}_order_date")
+            cursor.execute(f"""
+            CREATE TRIGGER {table.lower()}_order_date BEFORE INSERT ON {table} FOR EACH ROW
+            SET NEW.order_date = COALESCE((SELECT o.order_date FROM Orders o WHERE o.order_id = NEW.order_id LIMIT 1), NEW.order_date)
+            """)
+        # Keeps the copies current (the child rows move to the new month's partition)
+        cursor.execute("DROP TRIGGER IF EXISTS orders_order_date_copy")
+        cursor.execute("""
+        CREATE TRIGGER orders_order_date_copy AFTER UPDATE ON Orders FOR EACH ROW
+        BEGIN
+            IF NOT (NEW.order_date <=> OLD.order_date) THEN
+                UPDATE OrderItems SET order_date = NEW.order_date WHERE order_id = NEW.order_id;
+                UPDATE Deliveries SET order_date = NEW.order_date WHERE order_id = NEW.order_id;
+            END IF;
+        END
+        """)
+
     connection.commit()
     print("Tables created successfully!")
 
+# Function to build the change capture DDL for one table: updated_at and change_seq columns, and triggers
+# that draw change_seq from change_log (recording the captured columns' old values on UPDATE and DELETE).
+# Sessions that set @skip_change_capture (the bulk loader) write rows with change_seq 0 and no log entry.
+def _change_capture_statements(table, key, columns):
+    name = table.lower()
+    return [
+        f"""ALTER TABLE {table}
+           ADD COLUMN updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+           ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0,
+           ADD KEY idx_{name}_change_seq (change_seq)""",
+        f"""CREATE TRIGGER {name}_capture_insert BEFORE INSERT ON {table} FOR EACH ROW
+        BEGIN
+            IF @skip_change_capture IS NULL THEN
+                INSERT INTO change_log (table_name, row_id, operation) VALUES ('{name}', NEW.{key}, 'I');
+                SET NEW.change_seq = LAST_INSERT_ID();
+            END IF;
+        END"""
+    ] + _old_values_triggers(table, key, columns)
+
+# Function to build the UPDATE and DELETE change capture triggers, which log the captured columns' old values
+def _old_values_triggers(table, key, columns):
+    name = table.lower()
+    old_values = "JSON_OBJECT(" + ", ".join(f"'{column}', OLD.{column}" for column in columns) + ")"
+    return [
+        f"""CREATE TRIGGER {name}_capture_update BEFORE UPDATE ON {table} FOR EACH ROW
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, operation, old_values) VALUES ('{name}', NEW.{key}, 'U', {old_values});
+            SET NEW.change_seq = LAST_INSERT_ID();
+        END""",
+        f"""CREATE TRIGGER {name}_capture_delete AFTER DELETE ON {table} FOR EACH ROW
+        INSERT INTO change_log (table_name, row_id, operation, old_values) VALUES ('{name}', OLD.{key}, 'D', {old_values})"""
+    ]
+
+# Function to build an INSERT change capture trigger that first checks whether the key already exists:
+# INSERT ... ON DUPLICATE KEY UPDATE fires BEFORE INSERT and then BEFORE UPDATE on an existing row, and
+# logging 'I' for it would make change consumers treat the row as new (no old values, counted twice)
+def _insert_trigger(table, key):
+    name = table.lower()
+    return f"""CREATE TRIGGER {name}_capture_insert BEFORE INSERT ON {table} FOR EACH ROW
+        BEGIN
+            IF @skip_change_capture IS NULL AND NOT EXISTS (SELECT 1 FROM {table} WHERE {key} = NEW.{key}) THEN
+                INSERT INTO change_log (table_name, row_id, operation) VALUES ('{name}', NEW.{key}, 'I');
+                SET NEW.change_seq = LAST_INSERT_ID();
+            END IF;
+        END"""
+
+# Versioned schema changes applied on top of create_tables, oldest first.
+# Each version runs once and is recorded in schema_migrations; never edit a shipped version, add a new one.
+MIGRATIONS = [
+    (1, "Secondary indexes for the insight access paths", [
+        # Peak ordering times scan order_date only; restaurant/customer ids make it cover date-filtered rollups too
+        "CREATE INDEX idx_orders_date ON Orders (order_date, restaurant_id, customer_id)",
+        "CREATE INDEX idx_orders_restaurant_date ON Orders (restaurant_id, order_date)",
+        "CREATE INDEX idx_orders_customer_date ON Orders (customer_id, order_date)",
+        # delivery_time > estimated_time compares two columns, which no index can serve;
+        # a stored generated column turns it into an indexable range on delay_minutes
+        """ALTER TABLE Deliveries
+           ADD COLUMN delay_minutes INT AS (delivery_time - estimated_time) STORED,
+           ADD INDEX idx_deliveries_delay (delay_minutes, delivery_time, estimated_time)""",
+        "CREATE INDEX idx_deliveries_order ON Deliveries (order_id, delivery_time, estimated_time)",
+        "CREATE INDEX idx_orderitems_order_dish ON OrderItems (order_id, dish_name, quantity)",
+        # Top customers reads the first rows of this index backwards instead of sorting the table
+        "CREATE INDEX idx_customers_total_orders ON Customers (total_orders, name)"
+    ]),
+    (2, "Rollup tables for the dashboard aggregates", [
+        # Arrival order for new rows, used as the rollups' high-water mark (a plain KEY so it
+        # stays valid on partitioned tables, where unique keys must include the partition column)
+        "ALTER TABLE Orders ADD COLUMN ingest_seq BIGINT NOT NULL AUTO_INCREMENT, ADD KEY idx_orders_ingest_seq (ingest_seq)",
+        "ALTER TABLE OrderItems ADD COLUMN ingest_seq BIGINT NOT NULL AUTO_INCREMENT, ADD KEY idx_orderitems_ingest_seq (ingest_seq)",
+        """CREATE TABLE IF NOT EXISTS order_hour_rollup (
+            order_hour TINYINT PRIMARY KEY,
+            total_orders BIGINT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS restaurant_order_rollup (
+            restaurant_id VARCHAR(36) PRIMARY KEY,
+            total_orders BIGINT NOT NULL,
+            KEY idx_restaurant_rollup_orders (total_orders)
+        )""",
+        """CREATE TABLE IF NOT EXISTS customer_item_rollup (
+            customer_id VARCHAR(36),
+            dish_name VARCHAR(255),
+            frequency BIGINT NOT NULL,
+            PRIMARY KEY (customer_id, dish_name),
+            KEY idx_customer_rollup_frequency (frequency)
+        )""",
+        """CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            rollup_name VARCHAR(64) PRIMARY KEY,
+            high_water_mark BIGINT NOT NULL
+        )"""
+    ]),
+    (3, "Change capture on Orders, OrderItems and Deliveries", [
+        # One entry per row change; its change_seq is copied onto the row, and deletes leave a tombstone
+        """CREATE TABLE IF NOT EXISTS change_log (
+            change_seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+            table_name VARCHAR(64) NOT NULL,
+            row_id VARCHAR(36) NOT NULL,
+            operation CHAR(1) NOT NULL,
+            old_values JSON,
+            changed_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            KEY idx_change_log_table (table_name, change_seq),
+            KEY idx_change_log_changed_at (changed_at)
+        )"""
+    ] + [statement for table, key, columns in [
+        # The captured columns as shipped, spelled out so a later change to change_capture.CAPTURED_TABLES
+        # cannot alter this version; widening them takes a new version (like 4)
+        ("Orders", "order_id", ["customer_id", "restaurant_id", "order_date"]),
+        ("OrderItems", "order_item_id", ["order_id", "dish_name"]),
+        ("Deliveries", "delivery_id", ["order_id", "delivery_time", "estimated_time"])
+    ] for statement in _change_capture_statements(table, key, columns)]),
+    (4, "Capture payment mode, status and amount changes on Orders", [
+        # The order cube needs these old values to take an updated or deleted order out of its cell
+        "DROP TRIGGER IF EXISTS orders_capture_update",
+        "DROP TRIGGER IF EXISTS orders_capture_delete"
+    ] + _old_values_triggers("Orders", "order_id", ["customer_id", "restaurant_id", "order_date", "payment_mode", "status", "total_amount"])),
+    (5, "Dirty marks for rollups changed by updates and deletes", [
+        # Bumped by every update or delete on a table a rollup reads; the background refresher rebuilds
+        # the marked rollups and takes off the marks it saw
+        """CREATE TABLE IF NOT EXISTS rollup_dirty (
+            rollup_name VARCHAR(64) PRIMARY KEY,
+            pending_writes BIGINT NOT NULL DEFAULT 0
+        )"""
+    ]),
+    (6, "Log upserts that hit an existing row as updates only", [
+        statement for table, key in [("Orders", "order_id"), ("OrderItems", "order_item_id"), ("Deliveries", "delivery_id")]
+        for statement in (f"DROP TRIGGER IF EXISTS {table.lower()}_capture_insert", _insert_trigger(table, key))
+    ])
+]
+
+# Function to bring the schema up to the latest (or a given) migration version
+def apply_migrations(connection, target_version=None):
+    cursor = connection.cursor()
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255),
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    applied = {row[0] for row in cursor.fetchall()}
+    for version, description, statements in MIGRATIONS:
+        if version in applied or (target_version is not None and version > target_version):
+            continue
+        print(f"Applying migration {version}: {description}...")
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (version, description))
+        connection.commit()
+    cursor.close()
+    print("Schema is up to date.")
+
 def generate_fake_data(connection):
     print("Generating fake data...")
     fake = Faker()
@@ -216,6 +438,191 @@ def generate_fake_data(connection):
 
     return customers, restaurants, orders, order_items, delivery_persons, deliveries
 
+# Function to compute scaled row counts for the chunked generator
+def scaled_row_counts(scale=1.0):
+    counts = {table: max(1, int(round(rows * scale))) for table, rows in BASE_ROW_COUNTS.items()}
+    counts['Deliveries'] = max(1, int(round(counts['Orders'] * DELIVERIES_PER_ORDER)))
+    return counts
+
+# SplitMix64 finaliser: a bijection on uint64, so distinct row indexes never collide
+def _mix64(values):
+    with np.errstate(over='ignore'):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+# Function to derive UUID4-formatted IDs from (seed, table, row index) without any per-row Python.
+# Any chunk can rebuild the ID of any row, which keeps foreign keys consistent across chunks.
+def make_ids(table, indices, seed):
+    indices = np.asarray(indices, dtype=np.uint64)
+    key = np.uint64((seed * 64 + _TABLE_SALTS[table]) & 0xFFFFFFFFFFFFFFFF)
+    high = _mix64(indices ^ _mix64(np.array([key], dtype=np.uint64))[0])
+    low = _mix64(high ^ key)
+    high = (high & np.uint64(0xFFFFFFFFFFFF0FFF)) | np.uint64(0x4000)  # version 4
+    low = (low & np.uint64(0x3FFFFFFFFFFFFFFF)) | np.uint64(0x8000000000000000)  # RFC 4122 variant
+
+    count = len(indices)
+    raw = np.empty((count, 2), dtype='>u8')
+    raw[:, 0] = high
+    raw[:, 1] = low
+    nibbles = raw.view(np.uint8).reshape(count, 16)
+    digits = np.empty((count, 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[nibbles >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[nibbles & 0x0F]
+    text = np.full((count, 36), ord('-'), dtype=np.uint8)
+    text[:, 0:8] = digits[:, 0:8]
+    text[:, 9:13] = digits[:, 8:12]
+    text[:, 14:18] = digits[:, 12:16]
+    text[:, 19:23] = digits[:, 16:20]
+    text[:, 24:36] = digits[:, 20:32]
+    return text.view('S36').ravel().astype(str)
+
+# Function to build the small Faker vocabularies that the chunked generator samples from
+@lru_cache(maxsize=4)
+def build_vocabularies(seed, size=VOCABULARY_SIZE):
+    fake = Faker()
+    fake.seed_instance(seed)
+    return {
+        'name': np.array([fake.name() for _ in range(size)], dtype=object),
+        'email': np.array([fake.email() for _ in range(size)], dtype=object),
+        'phone': np.array([fake.phone_number()[:15] for _ in range(size)], dtype=object),
+        'address': np.array([fake.address() for _ in range(size)], dtype=object),
+        'company': np.array([fake.company() for _ in range(size)], dtype=object),
+        'dish': np.array([fake.word() for _ in range(max(1, size // 5))], dtype=object)
+    }
+
+def _sample(rng, vocabulary, count):
+    return vocabulary[rng.integers(0, len(vocabulary), count)]
+
+def _rounded(rng, low, high, count, decimals):
+    return np.round(rng.uniform(low, high, count), decimals)
+
+# One independent random stream per (table, chunk) so chunks can be produced in any order
+def _chunk_rng(seed, table, chunk_index):
+    return np.random.default_rng([seed, _TABLE_SALTS[table], chunk_index])
+
+def _customers_chunk(rng, start, stop, seed, vocab, counts, end_date):
+    count = stop - start
+    return pd.DataFrame({
+        'customer_id': make_ids('Customers', np.arange(start, stop), seed),
+        'name': _sample(rng, vocab['name'], count),
+        'email': _sample(rng, vocab['email'], count),
+        'phone': _sample(rng, vocab['phone'], count),
+        'location': _sample(rng, vocab['address'], count),
+        'signup_date': end_date.astype('datetime64[D]') - rng.integers(0, 5 * 365, count).astype('timedelta64[D]'),
+        'is_premium': rng.random(count) < 0.5,
+        'preferred_cuisine': _sample(rng, np.array(CUISINES, dtype=object), count),
+        'total_orders': rng.integers(1, 51, count),
+        'average_rating': _rounded(rng, 1, 5, count, 1)
+    })
+
+def _restaurants_chunk(rng, start, stop, seed, vocab, counts, end_date):
+    count = stop - start
+    return pd.DataFrame({
+        'restaurant_id': make_ids('Restaurants', np.arange(start, stop), seed),
+        'name': _sample(rng, vocab['company'], count),
+        'cuisine_type': _sample(rng, np.array(CUISINES, dtype=object), count),
+        'location': _sample(rng, vocab['address'], count),
+        'owner_name': _sample(rng, vocab['name'], count),
+        'average_delivery_time': rng.integers(20, 61, count),
+        'contact_number': _sample(rng, vocab['phone'], count),
+        'rating': _rounded(rng, 1, 5, count, 1),
+        'total_orders': rng.integers(10, 201, count),
+        'is_active': rng.random(count) < 0.5
+    })
+
+def _orders_chunk(rng, start, stop, seed, vocab, counts, end_date):
+    count = stop - start
+    year_seconds = 365 * 24 * 3600
+    order_date = end_date - rng.integers(1, year_seconds, count).astype('timedelta64[s]')
+    return pd.DataFrame({
+        'order_id': make_ids('Orders', np.arange(start, stop), seed),
+        'customer_id': make_ids('Customers', rng.integers(0, counts['Customers'], count), seed),
+        'restaurant_id': make_ids('Restaurants', rng.integers(0, counts['Restaurants'], count), seed),
+        'order_date': order_date,
+        'delivery_time': order_date + rng.integers(10 * 60, 90 * 60, count).astype('timedelta64[s]'),
+        'status': _sample(rng, np.array(ORDER_STATUSES, dtype=object), count),
+        'total_amount': _rounded(rng, 100, 1000, count, 2),
+        'payment_mode': _sample(rng, np.array(PAYMENT_MODES, dtype=object), count),
+        'discount_applied': _rounded(rng, 0, 100, count, 2),
+        'feedback_rating': _rounded(rng, 1, 5, count, 1)
+    })
+
+# Items are generated per chunk of orders; item IDs come from (order index, position) so they stay unique
+def _order_items_chunk(rng, start, stop, seed, vocab, counts, end_date):
+    order_indexes = np.arange(start, stop)
+    per_order = rng.integers(1, MAX_ITEMS_PER_ORDER + 1, len(order_indexes))
+    item_orders = np.repeat(order_indexes, per_order)
+    positions = np.arange(len(item_orders)) - np.repeat(np.cumsum(per_order) - per_order, per_order)
+    count = len(item_orders)
+    return pd.DataFrame({
+        'order_item_id': make_ids('OrderItems', item_orders * MAX_ITEMS_PER_ORDER + positions, seed),
+        'order_id': make_ids('Orders', item_orders, seed),
+        'dish_name': _sample(rng, vocab['dish'], count),
+        'quantity': rng.integers(1, 6, count),
+        'price': _rounded(rng, 50, 500, count, 2)
+    })
+
+def _delivery_persons_chunk(rng, start, stop, seed, vocab, counts, end_date):
+    count = stop - start
+    return pd.DataFrame({
+        'delivery_person_id': make_ids('DeliveryPersons', np.arange(start, stop), seed),
+        'name': _sample(rng, vocab['name'], count),
+        'contact_number': _sample(rng, vocab['phone'], count),
+        'vehicle_type': _sample(rng, np.array(VEHICLE_TYPES, dtype=object), count),
+        'total_deliveries': rng.integers(20, 201, count),
+        'average_rating': _rounded(rng, 1, 5, count, 1),
+        'location': _sample(rng, vocab['address'], count)
+    })
+
+def _deliveries_chunk(rng, start, stop, seed, vocab, counts, end_date):
+    count = stop - start
+    return pd.DataFrame({
+        'delivery_id': make_ids('Deliveries', np.arange(start, stop), seed),
+        'order_id': make_ids('Orders', rng.integers(0, counts['Orders'], count), seed),
+        'delivery_person_id': make_ids('DeliveryPersons', rng.integers(0, counts['DeliveryPersons'], count), seed),
+        'delivery_status': _sample(rng, np.array(DELIVERY_STATUSES, dtype=object), count),
+        'distance': _rounded(rng, 1, 20, count, 2),
+        'delivery_time': rng.integers(10, 61, count),
+        'estimated_time': rng.integers(10, 61, count),
+        'delivery_fee': _rounded(rng, 20, 200, count, 2),
+        'vehicle_type': _sample(rng, np.array(VEHICLE_TYPES, dtype=object), count)
+    })
+
+# Chunk builder for each table, and the table whose row count drives its chunking
+_CHUNK_BUILDERS = {
+    'Customers': (_customers_chunk, 'Customers'),
+    'Restaurants': (_restaurants_chunk, 'Restaurants'),
+    'Orders': (_orders_chunk, 'Orders'),
+    'OrderItems': (_order_items_chunk, 'Orders'),
+    'DeliveryPersons': (_delivery_persons_chunk, 'DeliveryPersons'),
+    'Deliveries': (_deliveries_chunk, 'Deliveries')
+}
+
+# Tables in foreign-key dependency order
+TABLE_LOAD_ORDER = ['Customers', 'Restaurants', 'DeliveryPersons', 'Orders', 'OrderItems', 'Deliveries']
+
+# Function to stream one table as NumPy-backed DataFrame chunks.
+# The same seed, scale, chunk_size and end_date always produce the same rows, and every
+# table can be generated on its own: foreign keys are rebuilt from row indexes, not looked up.
+def generate_table_chunks(table, seed=42, scale=1.0, chunk_size=DEFAULT_CHUNK_SIZE, end_date=None):
+    builder, driver = _CHUNK_BUILDERS[table]
+    counts = scaled_row_counts(scale)
+    vocab = build_vocabularies(seed)
+    if end_date is None:
+        end_date = np.datetime64('today', 's')
+    end_date = np.datetime64(end_date, 's')
+    for chunk_index, start in enumerate(range(0, counts[driver], chunk_size)):
+        stop = min(start + chunk_size, counts[driver])
+        yield builder(_chunk_rng(seed, table, chunk_index), start, stop, seed, vocab, counts, end_date)
+
+# Function to stream every table, in FK order, as (table, chunk) pairs
+def generate_scaled_data(seed=42, scale=1.0, chunk_size=DEFAULT_CHUNK_SIZE, end_date=None):
+    for table in TABLE_LOAD_ORDER:
+        for chunk in generate_table_chunks(table, seed, scale, chunk_size, end_date):
+            yield table, chunk
+
 def insert_data(connection, table, data):
     try:
         cursor = connection.cursor()
@@ -235,8 +642,11 @@ def insert_data(connection, table, data):
             INSERT INTO Orders (order_id, customer_id, restaurant_id, order_date, delivery_time, status, total_amount, payment_mode, discount_applied, feedback_rating)
             VALUES (%(order_id)s, %(customer_id)s, %(restaurant_id)s, %(order_date)s, %(delivery_time)s, %(status)s, %(total_amount)s, %(payment_mode)s, %(discount_applied)s, %(feedback_rating)s)
             """, data)
-        
-        
+        elif table == 'OrderItems':
+            cursor.executemany("""
+            INSERT INTO OrderItems (order_item_id, order_id, dish_name, quantity, price)
+            VALUES (%(order_item_id)s, %(order_id)s, %(dish_name)s, %(quantity)s, %(price)s)
+            """, data)
         elif table == 'DeliveryPersons':
             cursor.executemany("""
             INSERT INTO DeliveryPersons (delivery_person_id, name, contact_number, vehicle_type, total_deliveries, average_rating, location)
@@ -253,16 +663,230 @@ def insert_data(connection, table, data):
     except mysql.connector.Error as err:
         print(f"Error inserting data into {table}: {err}")
 
+# Rows per multi-row INSERT statement (and per commit) in the bulk loader
+DEFAULT_BATCH_SIZE = 5000
+# Tables in the same group have no FKs between them and are loaded in parallel
+LOAD_GROUPS = [['Customers', 'Restaurants', 'DeliveryPersons'], ['Orders'], ['OrderItems', 'Deliveries']]
+# (child table, column, parent table, parent column) for post-load verification
+FOREIGN_KEYS = [
+    ('Orders', 'customer_id', 'Customers', 'customer_id'),
+    ('Orders', 'restaurant_id', 'Restaurants', 'restaurant_id'),
+    ('OrderItems', 'order_id', 'Orders', 'order_id'),
+    ('Deliveries', 'order_id', 'Orders', 'order_id'),
+    ('Deliveries', 'delivery_person_id', 'DeliveryPersons', 'delivery_person_id')
+]
+
+# Function to open a loader connection with FK and unique checks relaxed for this session only
+def create_loader_connection(config=None, use_infile=False):
+    conn = mysql.connector.connect(**(config or DB_CONFIG), allow_local_infile=use_infile, autocommit=False)
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    cursor.execute("SET SESSION unique_checks = 0")
+    # Bulk loads skip the per-row change log; refresh consumers in full afterwards
+    cursor.execute("SET @skip_change_capture = 1")
+    cursor.close()
+    return conn
+
+# Function to turn a generated chunk into plain Python tuples the MySQL driver can bind
+def chunk_to_rows(chunk):
+    columns = []
+    for name in chunk.columns:
+        values = chunk[name]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            columns.append(np.datetime_as_string(values.to_numpy(dtype='datetime64[s]'), unit='s').tolist())
+        elif pd.api.types.is_bool_dtype(values):
+            columns.append(values.astype(int).tolist())
+        else:
+            columns.append(values.tolist())
+    return list(zip(*columns))
+
+# Function to load one chunk with batched multi-row INSERTs
+# (mysql.connector rewrites executemany on INSERT ... VALUES into a single multi-row statement)
+def _insert_chunk(conn, table, chunk, batch_size):
+    column_list = ", ".join(chunk.columns)
+    placeholders = ", ".join(["%s"] * len(chunk.columns))
+    query = f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})"
+    rows = chunk_to_rows(chunk)
+    cursor = conn.cursor()
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(query, rows[start:start + batch_size])
+        conn.commit()
+    cursor.close()
+
+# Function to load one chunk with LOAD DATA LOCAL INFILE from a temporary CSV file
+def _infile_chunk(conn, table, chunk):
+    chunk = chunk.copy()
+    for name in chunk.columns:
+        if pd.api.types.is_bool_dtype(chunk[name]):
+            chunk[name] = chunk[name].astype(int)
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(handle, 'w', newline='') as csv_file:
+            chunk.to_csv(csv_file, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S',
+                         quoting=csv.QUOTE_MINIMAL, doublequote=False, escapechar='\\')
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY '\\\\'
+        LINES TERMINATED BY '\\n'
+        ({", ".join(chunk.columns)})
+        """, (path,))
+        conn.commit()
+        cursor.close()
+    finally:
+        os.remove(path)
+
+# Function to generate and load one table chunk by chunk; returns its load statistics
+def load_table(table, seed=42, scale=1.0, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+               use_infile=False, config=None, end_date=None):
+    conn = create_loader_connection(config, use_infile)
+    rows = 0
+    started = time.perf_counter()
+    try:
+        for chunk in generate_table_chunks(table, seed, scale, chunk_size, end_date):
+            # LOAD DATA takes a whole chunk per statement; batch_size only splits the INSERTs
+            if use_infile:
+                _infile_chunk(conn, table, chunk)
+            else:
+                _insert_chunk(conn, table, chunk, batch_size)
+            rows += len(chunk)
+    finally:
+        conn.close()
+    seconds = time.perf_counter() - started
+    rows_per_sec = rows / seconds if seconds else float('inf')
+    print(f"Loaded {rows:,} rows into {table} in {seconds:.1f}s ({rows_per_sec:,.0f} rows/sec)")
+    return {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows_per_sec}
+
+class ForeignKeyCheckError(Exception):
+    pass
+
+# Function to check every foreign key once the relaxed-check load is done; returns orphan counts and
+# raises ForeignKeyCheckError if any rows are orphaned
+def verify_foreign_keys(connection):
+    cursor = connection.cursor()
+    orphans = {}
+    for child, column, parent, parent_column in FOREIGN_KEYS:
+        cursor.execute(f"""
+        SELECT COUNT(*) FROM {child} c
+        LEFT JOIN {parent} p ON c.{column} = p.{parent_column}
+        WHERE c.{column} IS NOT NULL AND p.{parent_column} IS NULL
+        """)
+        count = cursor.fetchone()[0]
+        orphans[f"{child}.{column}"] = count
+        if count:
+            print(f"FK check failed: {count:,} rows in {child}.{column} have no matching {parent}.{parent_column}")
+    cursor.close()
+    failed = {key: count for key, count in orphans.items() if count}
+    if failed:
+        raise ForeignKeyCheckError("Orphaned rows after the load: " + ", ".join(f"{key} ({count:,})" for key, count in failed.items()))
+    print("All foreign keys verified.")
+    return orphans
+
+class UniqueKeyCheckError(Exception):
+    pass
+
+# Function to list the secondary UNIQUE indexes of a table as {index name: [columns]} (InnoDB enforces
+# the primary key even with unique_checks off, so it is left out)
+def unique_indexes(connection, table):
+    cursor = connection.cursor()
+    cursor.execute("""
+    SELECT INDEX_NAME, COLUMN_NAME
+    FROM information_schema.STATISTICS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'
+    ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    indexes = {}
+    for index_name, column in cursor.fetchall():
+        indexes.setdefault(index_name, []).append(column)
+    cursor.close()
+    return indexes
+
+# Function to check every secondary UNIQUE index of the loaded tables once the relaxed-check load is done
+# (unique_checks = 0 lets duplicates in); returns duplicate key counts and raises UniqueKeyCheckError if any
+def verify_unique_keys(connection):
+    cursor = connection.cursor()
+    duplicates = {}
+    for table in [table for group in LOAD_GROUPS for table in group]:
+        for index_name, columns in unique_indexes(connection, table).items():
+            column_list = ", ".join(columns)
+            # Rows with a NULL in the key never collide
+            not_null = " AND ".join(f"{column} IS NOT NULL" for column in columns)
+            cursor.execute(f"""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM {table} WHERE {not_null}
+                GROUP BY {column_list} HAVING COUNT(*) > 1
+            ) duplicated
+            """)
+            count = cursor.fetchone()[0]
+            duplicates[f"{table}.{index_name}"] = count
+            if count:
+                print(f"Unique check failed: {count:,} keys of {table}.{index_name} ({column_list}) appear more than once")
+    cursor.close()
+    failed = {key: count for key, count in duplicates.items() if count}
+    if failed:
+        raise UniqueKeyCheckError("Duplicate keys after the load: " + ", ".join(f"{key} ({count:,})" for key, count in failed.items()))
+    print("All unique keys verified.")
+    return duplicates
+
+# Function to bulk load a generated dataset: tables with no FKs between them load in parallel,
+# groups run in FK dependency order, and the relaxed checks are verified at the end
+def bulk_load(seed=42, scale=1.0, chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+              use_infile=False, workers=3, config=None, end_date=None):
+    if end_date is None:
+        # Pin the date so every table sees the same one, even across midnight
+        end_date = np.datetime64('today', 's')
+    stats = {}
+    for group in LOAD_GROUPS:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(group)))) as executor:
+            futures = {
+                table: executor.submit(load_table, table, seed, scale, chunk_size, batch_size, use_infile, config, end_date)
+                for table in group
+            }
+            for table, future in futures.items():
+                stats[table] = future.result()
+    conn = mysql.connector.connect(**(config or DB_CONFIG))
+    try:
+        verify_foreign_keys(conn)
+        verify_unique_keys(conn)
+    finally:
+        conn.close()
+    return stats
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the Zomato tables and load generated data.")
+    parser.add_argument("--bulk", action="store_true", help="use the chunked generator and bulk loader")
+    parser.add_argument("--scale", type=float, default=1.0, help="scale factor (1.0 = 200 orders)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per INSERT (not used with --infile)")
+    parser.add_argument("--infile", action="store_true", help="load through LOAD DATA LOCAL INFILE")
+    parser.add_argument("--workers", type=int, default=3, help="tables loaded in parallel")
+    parser.add_argument("--partition", action="store_true", help="partition Orders, OrderItems and Deliveries by month of order_date")
+    args = parser.parse_args()
+
     conn = create_connection()
     if conn:
-        create_tables(conn)
-        customers, restaurants, orders, order_items, delivery_persons, deliveries = generate_fake_data(conn)
-        insert_data(conn, 'Customers', customers)
-        insert_data(conn, 'Restaurants', restaurants)
-        insert_data(conn, 'Orders', orders)
-        insert_data(conn, 'OrderItems', order_items)
-        insert_data(conn, 'DeliveryPersons', delivery_persons)
-        insert_data(conn, 'Deliveries', deliveries)
-        conn.close()
+        create_tables(conn, args.partition)
+        apply_migrations(conn)
+        if args.bulk:
+            conn.close()
+            try:
+                bulk_load(args.seed, args.scale, args.chunk_size, args.batch_size, args.infile, args.workers)
+            except (ForeignKeyCheckError, UniqueKeyCheckError) as e:
+                print(f"Bulk load failed: {e}")
+                sys.exit(1)
+        else:
+            customers, restaurants, orders, order_items, delivery_persons, deliveries = generate_fake_data(conn)
+            insert_data(conn, 'Customers', customers)
+            insert_data(conn, 'Restaurants', restaurants)
+            insert_data(conn, 'Orders', orders)
+            insert_data(conn, 'OrderItems', order_items)
+            insert_data(conn, 'DeliveryPersons', delivery_persons)
+            insert_data(conn, 'Deliveries', deliveries)
+            conn.close()
+        conn = create_connection()
+        if conn:
+            print("Rebuilding rollup tables...")
+            rebuild_rollups(conn)
+            conn.close()
         print("Database setup and data insertion completed!")
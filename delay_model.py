@@ -0,0 +1,284 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import time
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+from columnar import read_frame, read_frames
+from db_pool import DB_CONFIG
+
+# Directory holding the trained model artifacts, one versioned .npz file per training run
+MODEL_DIR = "models"
+# Bumped whenever the features change; artifacts built for another feature version are not loaded
+FEATURE_VERSION = 1
+# Ridge penalty on the standardised feature weights (the intercept is not penalised)
+RIDGE_ALPHA = 1.0
+# Deliveries a delivery person or restaurant needs before its own mean delay outweighs the overall mean
+ENCODING_SMOOTHING = 20
+# Folds for the out-of-fold delay encodings, so a row's own delay never leaks into its features
+ENCODING_FOLDS = 5
+# Deliveries read for training. Delivery ids are UUID4s, so the first rows in delivery_id order (the training
+# query sorts by it) are a uniform sample.
+MAX_TRAINING_ROWS = 2_000_000
+# Deliveries still on their way, scored by the batch job
+PENDING_STATUSES = ("Pending", "On the way")
+# Predicted delay (in minutes) above which a pending delivery is reported as likely late
+DEFAULT_LATE_THRESHOLD = 10
+
+# Columns of a batch scoring result
+SCORED_COLUMNS = ["delivery_id", "delivery_status", "restaurant_name", "delivery_person_id", "vehicle_type", "distance",
+                  "estimated_time", "predicted_delay", "late"]
+
+# Numeric features, read as they are (missing values take the training mean)
+NUMERIC_FEATURES = ("distance", "estimated_time", "person_rating", "person_deliveries", "restaurant_delivery_time", "restaurant_rating")
+# Delay encodings: the smoothed mean delay of each delivery person and restaurant in the training data
+ENCODED_FEATURES = {"person_delay": "delivery_person_id", "restaurant_delay": "restaurant_id"}
+
+# Delivery features joined from the delivery person, the order and its restaurant
+FEATURES_QUERY = """
+    SELECT d.delivery_id, d.distance, d.estimated_time, d.vehicle_type, d.delivery_person_id, o.restaurant_id,
+           dp.average_rating AS person_rating, dp.total_deliveries AS person_deliveries,
+           r.average_delivery_time AS restaurant_delivery_time, r.rating AS restaurant_rating, r.name AS restaurant_name{target}
+    FROM deliveries d
+    LEFT JOIN orders o ON o.order_id = d.order_id
+    LEFT JOIN deliverypersons dp ON dp.delivery_person_id = d.delivery_person_id
+    LEFT JOIN restaurants r ON r.restaurant_id = o.restaurant_id
+    WHERE {where}
+"""
+
+
+class ModelVersionError(ValueError):
+    pass
+
+
+# Function to assign each row to an encoding fold from its key, so folds do not depend on row order
+def _folds(keys, folds):
+    return (pd.util.hash_array(np.asarray(keys, dtype=object)) % np.uint64(folds)).astype(np.int64)
+
+
+# Function to encode a key column as the smoothed mean target per key: (sum + prior * m) / (count + m).
+# With folds, each row's encoding leaves out the rows of its own fold. Returns (encoded rows, table).
+def _target_encoding(keys, target, prior, folds=None, smoothing=ENCODING_SMOOTHING):
+    keys = pd.Series(np.asarray(keys, dtype=object)).fillna("")
+    frame = pd.DataFrame({"key": keys, "target": target})
+    totals = frame.groupby("key")["target"].agg(["sum", "count"])
+    table = (totals["sum"] + prior * smoothing) / (totals["count"] + smoothing)
+    if folds is None:
+        return keys.map(table).to_numpy(dtype=float), table
+    frame["fold"] = folds
+    in_fold = frame.groupby(["key", "fold"])["target"].agg(["sum", "count"])
+    rows = pd.MultiIndex.from_arrays([frame["key"], frame["fold"]])
+    other_sum = totals["sum"].reindex(frame["key"]).to_numpy() - in_fold["sum"].reindex(rows).to_numpy()
+    other_count = totals["count"].reindex(frame["key"]).to_numpy() - in_fold["count"].reindex(rows).to_numpy()
+    return (other_sum + prior * smoothing) / (other_count + smoothing), table
+
+
+# Ridge regression of delivery delay (delivery_time - estimated_time, in minutes) on distance, estimated
+# time, vehicle type, the delivery person and the restaurant. People and restaurants enter through their
+# smoothed mean delays, so the feature count stays small however many there are, and training is one
+# solve of the normal equations. Models are saved as versioned .npz artifacts and loaded with load().
+class DelayModel:
+    def __init__(self, weights, intercept, means, scales, vehicle_types, encodings, prior, metadata):
+        self.weights = weights
+        self.intercept = intercept
+        self.means = means
+        self.scales = scales
+        self.vehicle_types = list(vehicle_types)
+        # {feature: pd.Series of mean delay by key}, keys the model has not seen get prior
+        self.encodings = encodings
+        self.prior = prior
+        self.metadata = metadata
+
+    @property
+    def version(self):
+        return self.metadata["version"]
+
+    @property
+    def feature_names(self):
+        return list(NUMERIC_FEATURES) + list(ENCODED_FEATURES) + [f"vehicle_{vehicle}" for vehicle in self.vehicle_types]
+
+    # Function to build the raw feature matrix; encoded gives the delay encodings (else looked up)
+    @staticmethod
+    def _matrix(frame, vehicle_types, encoded):
+        numeric = [pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=float) for column in NUMERIC_FEATURES]
+        vehicles = np.asarray(frame["vehicle_type"], dtype=object)
+        dummies = [(vehicles == vehicle).astype(float) for vehicle in vehicle_types]
+        return np.column_stack(numeric + [encoded[name] for name in ENCODED_FEATURES] + dummies)
+
+    # Function to fill missing values with the training means, then standardise
+    @staticmethod
+    def _standardise(matrix, means, scales):
+        matrix = np.where(np.isnan(matrix), means, matrix)
+        return (matrix - means) / scales
+
+    # Function to fit a model on every row of a frame: out-of-fold delay encodings, standardisation and the
+    # ridge solve. Returns the model (without metadata) and its residuals on the encoded training rows.
+    @classmethod
+    def _fit(cls, frame, target, row_folds, vehicle_types, alpha):
+        prior = float(target.mean())
+        encoded = {}
+        encodings = {}
+        for name, column in ENCODED_FEATURES.items():
+            encoded[name], encodings[name] = _target_encoding(frame[column], target, prior, row_folds)
+        raw = cls._matrix(frame, vehicle_types, encoded)
+        present = (~np.isnan(raw)).sum(axis=0)
+        means = np.where(present > 0, np.nansum(raw, axis=0) / np.maximum(present, 1), 0.0)
+        filled = np.where(np.isnan(raw), means, raw)
+        scales = filled.std(axis=0)
+        scales = np.where(scales > 0, scales, 1.0)
+        matrix = (filled - means) / scales
+        intercept = target.mean()
+        weights = np.linalg.solve(matrix.T @ matrix + alpha * np.eye(matrix.shape[1]), matrix.T @ (target - intercept))
+        residuals = matrix @ weights + intercept - target
+        return cls(weights, float(intercept), means, scales, vehicle_types, encodings, prior, {}), residuals
+
+    # Function to train on a frame of delivered deliveries (the FEATURES_QUERY columns plus delay_minutes).
+    # One fold of the rows is held out to report the error against always predicting the mean: a model fitted
+    # on the other folds alone (encodings included) predicts it, then the final model is fitted on every row.
+    @classmethod
+    def train(cls, frame, alpha=RIDGE_ALPHA, folds=ENCODING_FOLDS):
+        frame = frame[frame["delay_minutes"].notna()].reset_index(drop=True)
+        if len(frame) < 2 * folds:
+            raise ValueError(f"Not enough delivered deliveries to train on ({len(frame)})")
+        started = time.perf_counter()
+        target = pd.to_numeric(frame["delay_minutes"]).to_numpy(dtype=float)
+        row_folds = _folds(frame["delivery_id"], folds)
+        vehicle_types = sorted(str(vehicle) for vehicle in pd.unique(frame["vehicle_type"].dropna()))
+
+        holdout = row_folds == 0
+        trained, _ = cls._fit(frame[~holdout].reset_index(drop=True), target[~holdout], row_folds[~holdout], vehicle_types, alpha)
+        errors = trained.predict(frame[holdout].reset_index(drop=True)) - target[holdout]
+        baseline = target[holdout] - target[~holdout].mean()
+        model, residuals = cls._fit(frame, target, row_folds, vehicle_types, alpha)
+        trained_at = datetime.datetime.now()
+        model.metadata = {
+            "version": f"{FEATURE_VERSION}.{trained_at:%Y%m%d%H%M%S}",
+            "feature_version": FEATURE_VERSION,
+            "trained_at": trained_at.isoformat(timespec="seconds"),
+            "rows": len(frame),
+            "alpha": alpha,
+            "holdout_mae": float(np.abs(errors).mean()),
+            "holdout_rmse": float(np.sqrt((errors ** 2).mean())),
+            "baseline_mae": float(np.abs(baseline).mean()),
+            "residual_std": float(residuals.std()),
+            "train_seconds": round(time.perf_counter() - started, 3)
+        }
+        return model
+
+    # Function to predict the delay in minutes of every row of a frame of FEATURES_QUERY columns, in one pass
+    def predict(self, frame):
+        if frame.empty:
+            return np.zeros(0, dtype=float)
+        encoded = {}
+        for name, column in ENCODED_FEATURES.items():
+            keys = pd.Series(np.asarray(frame[column], dtype=object)).fillna("")
+            encoded[name] = keys.map(self.encodings[name]).fillna(self.prior).to_numpy(dtype=float)
+        matrix = self._standardise(self._matrix(frame, self.vehicle_types, encoded), self.means, self.scales)
+        return matrix @ self.weights + self.intercept
+
+    # Function to list the features by the size of their (standardised) weight
+    def importances(self):
+        return pd.DataFrame({"feature": self.feature_names, "weight": self.weights}).sort_values(
+            "weight", key=np.abs, ascending=False, ignore_index=True)
+
+    # Function to save the model as a new artifact in directory; returns its path
+    def save(self, directory=MODEL_DIR):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"delay_model_v{self.version}.npz")
+        arrays = {
+            "weights": self.weights,
+            "intercept": np.array(self.intercept),
+            "means": self.means,
+            "scales": self.scales,
+            "vehicle_types": np.array(self.vehicle_types, dtype=str),
+            "prior": np.array(self.prior),
+            "metadata": np.array(json.dumps(self.metadata))
+        }
+        for name, table in self.encodings.items():
+            arrays[f"{name}_keys"] = np.array(table.index.astype(str), dtype=str)
+            arrays[f"{name}_values"] = table.to_numpy(dtype=float)
+        # Written under a temporary name first, so a reader never loads half a file
+        partial = path + ".partial"
+        with open(partial, "wb") as handle:
+            np.savez(handle, **arrays)
+        os.replace(partial, path)
+        return path
+
+    # Function to load a saved artifact
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            metadata = json.loads(str(arrays["metadata"]))
+            if metadata.get("feature_version") != FEATURE_VERSION:
+                raise ModelVersionError(f"{path} was built for feature version {metadata.get('feature_version')}, not {FEATURE_VERSION}; retrain it")
+            encodings = {
+                name: pd.Series(arrays[f"{name}_values"], index=pd.Index(arrays[f"{name}_keys"].astype(object)))
+                for name in ENCODED_FEATURES
+            }
+            return cls(arrays["weights"], float(arrays["intercept"]), arrays["means"], arrays["scales"],
+                       arrays["vehicle_types"].tolist(), encodings, float(arrays["prior"]), metadata)
+
+
+# Function to find the newest artifact for the current feature version (None if there is none)
+def latest_model_path(directory=MODEL_DIR):
+    paths = glob.glob(os.path.join(directory, f"delay_model_v{FEATURE_VERSION}.*.npz"))
+    return max(paths) if paths else None
+
+
+# Function to read the training rows: delivered deliveries with a known delay, at most max_rows
+def load_training_frame(connection, max_rows=MAX_TRAINING_ROWS):
+    query = FEATURES_QUERY.format(target=", d.delay_minutes", where="d.delivery_status = 'Delivered' AND d.delay_minutes IS NOT NULL")
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(query + " ORDER BY d.delivery_id LIMIT %s", (int(max_rows),))
+    frame = read_frame(cursor)
+    cursor.close()
+    return frame
+
+
+# Function to score every pending delivery in one pass over an unbuffered cursor, a chunk of rows at a
+# time; conditions (on d, o, dp or r) and params narrow the deliveries scored. Returns the SCORED_COLUMNS,
+# most delayed first.
+def score_pending(connection, model, threshold=DEFAULT_LATE_THRESHOLD, conditions=(), params=()):
+    placeholders = ", ".join(["%s"] * len(PENDING_STATUSES))
+    where = " AND ".join([f"d.delivery_status IN ({placeholders})"] + list(conditions))
+    cursor = connection.cursor(buffered=False)
+    cursor.execute(FEATURES_QUERY.format(target=", d.delivery_status", where=where), PENDING_STATUSES + tuple(params))
+    scored = []
+    for frame in read_frames(cursor):
+        scored.append(frame[SCORED_COLUMNS[:-2]].assign(predicted_delay=model.predict(frame)))
+    cursor.close()
+    if not scored:
+        return pd.DataFrame(columns=SCORED_COLUMNS)
+    scored = pd.concat(scored, ignore_index=True)
+    scored["late"] = scored["predicted_delay"] > threshold
+    return scored.sort_values("predicted_delay", ascending=False, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the delivery delay model and save it as a new artifact.")
+    parser.add_argument("--max-rows", type=int, default=MAX_TRAINING_ROWS, help="delivered deliveries to train on")
+    parser.add_argument("--alpha", type=float, default=RIDGE_ALPHA, help="ridge penalty")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--score", action="store_true", help="also score the pending deliveries with the new model")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        started = time.perf_counter()
+        training = load_training_frame(conn, args.max_rows)
+        print(f"Read {len(training):,} delivered deliveries in {time.perf_counter() - started:.1f}s")
+        model = DelayModel.train(training, args.alpha)
+        print(f"Saved model {model.version} to {model.save(args.model_dir)}")
+        print(f"Holdout MAE {model.metadata['holdout_mae']:.2f} min (always predicting the mean: {model.metadata['baseline_mae']:.2f}), "
+              f"RMSE {model.metadata['holdout_rmse']:.2f}")
+        print(model.importances().to_string(index=False))
+        if args.score:
+            scored = score_pending(conn, model)
+            print(f"Scored {len(scored):,} pending deliveries, {int(scored['late'].sum()):,} predicted late")
+    finally:
+        conn.close()
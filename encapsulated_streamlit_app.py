@@ -1,129 +1,1390 @@
+import datetime
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
 import mysql.connector
 from mysql.connector import Error
 import pandas as pd
-import plotly.express as px
+from analytics_replica import REPLICA_AVAILABLE, AnalyticsReplica, ReplicaError, replica_tables
+from approximate import DistinctCountEstimator, FrequencyEstimator, GroupMeanEstimator, HistogramEstimator, ProgressiveScan, ScanRegistry, key_block_condition
+from bulk_upload import DEFAULT_STATEMENT_ROWS, DEFAULT_TRANSACTION_ROWS, apply_upload, read_upload, upload_statement, validate_columns
+from charts import bar_chart, histogram_chart, line_chart, ranked_bar_chart
+from columnar import python_value, read_frame
+from db_pool import DB_CONFIG, ConnectionPool
+from delay_model import DEFAULT_LATE_THRESHOLD, FEATURES_QUERY, MODEL_DIR, DelayModel, latest_model_path, load_training_frame, score_pending
+from histograms import auto_bin_width, bins_frame, percentiles_from_bins, stream_histogram
+from live_aggregates import LiveAggregates
+from order_cube import DIMENSIONS as CUBE_DIMENSIONS, MEASURES as CUBE_MEASURES, MAX_CUBE_CELLS, WEEKDAY_NAMES, CubeTooLargeError, OrderCube
+from partitions import date_range_condition
+from query_cache import QueryCache, estimate_size
+from query_catalog import QUERY_FILE, QueryCatalog, QueryCatalogError
+from query_stats import QueryStats
+from rollups import RollupRefresher, sync_after_write
+from schema_catalog import SchemaCatalog, enum_values, input_kind, is_server_filled
+from statements import InvalidIdentifierError, build_delete, build_insert, build_update, quote_identifier, resolve_table
+from topk import stream_rows, top_n_per_group
+
+# Upper bound on MySQL connections held by this process across all sessions
+POOL_SIZE = 10
+
+# One pool per process, shared by every Streamlit session and rerun
+@st.cache_resource
+def get_connection_pool():
+    return ConnectionPool(size=POOL_SIZE, **DB_CONFIG)
+
+# The schema catalog is reloaded after this many seconds, or when this app creates a table or adds a column
+SCHEMA_CATALOG_TTL_SECONDS = 600
+
+# One schema catalog per process, on the shared pool
+@st.cache_resource
+def get_schema_catalog():
+    return SchemaCatalog(get_connection_pool(), ttl=SCHEMA_CATALOG_TTL_SECONDS, stats=get_query_stats())
+
+# The in-app rollup refresher folds in new rows and rebuilds rollups marked dirty this often
+ROLLUP_REFRESH_SECONDS = 30
+# Rollups not refreshed for this long are flagged as stale in the diagnostics panel
+ROLLUP_STALE_SECONDS = 3 * ROLLUP_REFRESH_SECONDS
+
+# Insight results are kept for at most this many seconds, even without writes
+CACHE_TTL_SECONDS = 300
+# Memory bound for cached insight results
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Statements slower than this are written to the slow-query log
+SLOW_QUERY_THRESHOLD_MS = 500
+SLOW_QUERY_LOG = "slow_queries.log"
+
+# Default number of rows shown per page in View Records
+DEFAULT_PAGE_SIZE = 50
+
+# Items shown in the Customer Preferences chart, and per customer when drilling in
+DEFAULT_TOP_K = 15
+DEFAULT_TOP_N = 3
+# Upper bound on (customer, item) rows returned for a segment drill-down
+MAX_DRILLDOWN_ROWS = 5000
+# Customer columns a preferences segment may filter on
+SEGMENT_COLUMNS = ("preferred_cuisine", "is_premium")
+
+# Order periods the insights can be limited to, in days back from today (None = all time)
+ORDER_PERIODS = {"All time": None, "Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last 12 months": 365}
+# Order columns the filter bar can match exactly
+ORDER_FILTER_COLUMNS = ("restaurant_id", "payment_mode", "status")
+# Restaurants offered in the filter bar (busiest first)
+MAX_RESTAURANT_CHOICES = 200
+
+# Overview queries run concurrently on at most this many threads (each borrows its own pooled connection)
+OVERVIEW_WORKERS = 5
+# Most-delayed deliveries listed on the overview
+OVERVIEW_DELAYED_ROWS = 10
+# Restaurants need this many deliveries to be ranked by average delay
+MIN_RESTAURANT_DELIVERIES = 20
+
+# Approximate scans read key blocks on their own small thread pool, so they never hold up the overview
+APPROXIMATE_WORKERS = 2
+# While a scan is still reading blocks, its view redraws the estimate this often
+APPROXIMATE_REFRESH_SECONDS = 1
+
+# Local DuckDB snapshot the insights can run against instead of MySQL (see analytics_replica.py)
+ANALYTICS_REPLICA_PATH = "zomato_analytics.duckdb"
+
+# One replica per process (DuckDB allows a single writer per file); None when DuckDB is not installed
+@st.cache_resource
+def get_analytics_replica():
+    return AnalyticsReplica(ANALYTICS_REPLICA_PATH) if REPLICA_AVAILABLE else None
+
+# Live aggregates poll the change log at most this often
+LIVE_POLL_SECONDS = 2
+
+# One set of live aggregates per process, kept current from the change log (see live_aggregates.py)
+@st.cache_resource
+def get_live_aggregates():
+    return LiveAggregates(min_interval=LIVE_POLL_SECONDS)
+
+# Cell limit of the order cube (16 bytes a cell); datasets past it are answered from MySQL instead
+ORDER_CUBE_MAX_CELLS = MAX_CUBE_CELLS
+
+# One order cube per process, kept current from the change log (see order_cube.py)
+@st.cache_resource
+def get_order_cube():
+    return OrderCube(min_interval=LIVE_POLL_SECONDS, max_cells=ORDER_CUBE_MAX_CELLS)
+
+# One result cache per process, so every session benefits from the others' queries
+@st.cache_resource
+def get_query_cache():
+    return QueryCache(ttl=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES)
+
+# One rollup refresher thread per process; each rebuild drops the cached results read from the rollups
+# it changed (see rollups.py)
+@st.cache_resource
+def get_rollup_refresher():
+    cache = get_query_cache()
+    return RollupRefresher(get_connection_pool(), interval=ROLLUP_REFRESH_SECONDS,
+                           on_change=cache.invalidate_tables).start()
+
+# One set of query timings per process, shown in the sidebar diagnostics panel
+@st.cache_resource
+def get_query_stats():
+    return QueryStats(slow_threshold_ms=SLOW_QUERY_THRESHOLD_MS, slow_log_path=SLOW_QUERY_LOG)
+
+# One bounded thread pool per process for the overview, so many open overviews cannot exhaust the connection pool
+@st.cache_resource
+def get_overview_executor():
+    return ThreadPoolExecutor(max_workers=OVERVIEW_WORKERS, thread_name_prefix="overview")
+
+# One set of approximate scans per process, shared by every session asking the same question (see approximate.py)
+@st.cache_resource
+def get_approximate_scans():
+    return ScanRegistry(ttl=CACHE_TTL_SECONDS)
+
+# One bounded thread pool per process for the approximate scans
+@st.cache_resource
+def get_approximate_executor():
+    return ThreadPoolExecutor(max_workers=APPROXIMATE_WORKERS, thread_name_prefix="approximate")
+
+# One query catalog per process, loaded from QUERY_FILE and sharing the result cache and timings
+# (see query_catalog.py); the first session validates it against the live schema
+@st.cache_resource
+def get_query_catalog():
+    return QueryCatalog.load(QUERY_FILE, cache=get_query_cache(), stats=get_query_stats())
+
+# One loaded delay model per artifact and process (see delay_model.py); a newly trained artifact has a
+# new path, so it is picked up on the next run
+@st.cache_resource
+def get_delay_model(path):
+    return DelayModel.load(path)
 
 class ZomatoApp:
-    def __init__(self):
-        self.connection = None
+    # Methods behind the Data Insights views (used by tooling such as index_advisor.py)
+    INSIGHT_METHODS = (
+        "get_peak_order_times",
+        "get_orders_over_time",
+        "get_delayed_deliveries",
+        "get_top_customers",
+        "get_customer_preferences",
+        "get_delivery_delay_histogram",
+        "get_restaurant_delays",
+        "get_item_reach",
+        "get_popular_restaurants"
+    )
+
+    def __init__(self, pool=None, cache=None, stats=None, replica=None, live=None, catalog=None, backend="mysql", filters=None, cube=None, approximate=False, query_catalog=None, refresher=None):
+        self.pool = pool
+        self.catalog = catalog
+        self.cache = cache if cache is not None else get_query_cache()
+        self.stats = stats if stats is not None else get_query_stats()
+        self.replica = replica
+        self.live = live
+        self.cube = cube
+        # "mysql" runs the insight queries on the database, "replica" on the DuckDB snapshot, and
+        # "live" and "cube" answer the ones they can from the in-memory aggregates or order cube
+        # (the rest go to MySQL)
+        self.backend = backend
+        # Sidebar filters on the orders every insight covers: "period" ((start, end) of order_date, end
+        # exclusive), "restaurant_id", "cuisine", "payment_mode" and "status"; None or missing means any.
+        # With any set, the insights read the raw tables instead of the all-time rollups.
+        self.filters = filters or {}
+        # With approximate set, the views that support it show estimates with error bounds from sampled
+        # key blocks, refined in the background, instead of waiting for a full scan
+        self.approximate = approximate
+        # Named queries from zomatosqlqueries.txt, validated at startup (see load_query_catalog)
+        self.query_catalog = query_catalog
+        # Background thread keeping the rollup tables current (see rollups.py); None when run by tooling
+        self.refresher = refresher
+        # Per-thread flag set while an overview panel loads on a worker thread (see report_error)
+        self._worker = threading.local()
 
-    # Function to connect to the MySQL database
+    # Function to attach to the shared MySQL connection pool
     def create_connection(self):
         try:
-            self.connection = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="mysql",
-                database="zomato1"
-            )
-            if self.connection.is_connected():
-                return self.connection
+            if self.pool is None:
+                self.pool = get_connection_pool()
+                if self.catalog is None:
+                    self.catalog = get_schema_catalog()
+            # Borrowing once runs the pool's health check against the server
+            with self.pool.connection():
+                pass
+            return self.pool
         except Error as e:
             st.error(f"Error: {e}")
             return None
 
-    # Function to execute a query
-    def execute_query(self, query, params=None):
+    # Function to load the query catalog and, once per process, check every query against the live schema
+    # with EXPLAIN, so a mismatch is reported at startup rather than when the query is first run
+    def load_query_catalog(self):
         try:
-            cursor = self.connection.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            self.connection.commit()
+            if self.query_catalog is None:
+                self.query_catalog = get_query_catalog()
+            if self.query_catalog.errors is None:
+                self.query_catalog.validate(self.pool)
+        except (OSError, QueryCatalogError, Error) as e:
+            st.sidebar.warning(f"The query catalog is unavailable: {e}")
+            self.query_catalog = None
+            return None
+        if self.query_catalog.errors:
+            st.sidebar.warning(f"{len(self.query_catalog.errors)} catalog queries do not match the schema: {', '.join(self.query_catalog.errors)}")
+        return self.query_catalog
+
+    # Function to execute a query. With prepared=True it runs as a server-side prepared statement from the
+    # connection's statement cache (binary protocol, no re-parse for a shape seen before); with many=True,
+    # params is a list of parameter sets run against that one statement in a single transaction.
+    def execute_query(self, query, params=None, prepared=False, many=False):
+        started = time.perf_counter()
+        affected = 0
+        ok = False
+        try:
+            with self.pool.connection() as connection:
+                if prepared or many:
+                    statements = self.pool.statement_cache(connection)
+                    if many:
+                        affected = statements.execute_batch(query, params or [])
+                    else:
+                        affected = statements.execute(query, params or ())
+                else:
+                    cursor = connection.cursor()
+                    if params:
+                        cursor.execute(query, params)
+                    else:
+                        cursor.execute(query)
+                    affected = max(cursor.rowcount, 0)
+                    cursor.close()
+                connection.commit()
+                # Drop cached results that read the table this statement changed
+                self.cache.invalidate_for_write(query)
+                try:
+                    # Fold the change into the rollup tables the insights read from
+                    self.cache.invalidate_tables(sync_after_write(connection, query))
+                except Error as e:
+                    st.warning(f"Saved, but the dashboard rollups could not be refreshed: {e}")
+            ok = True
             return True
         except Error as e:
             st.error(f"Error: {e}")
             return False
+        finally:
+            # Bytes sent: the statement text plus its bound parameters
+            sent = len(query) + (len(repr(params)) if params else 0)
+            self.stats.record(query, time.perf_counter() - started, affected, sent, kind="write", ok=ok)
+
+    # Function to apply an uploaded file to a table in chunked statements and transactions (see bulk_upload.py),
+    # then invalidate cached results and rollups the same way a single write does, also when the upload fails
+    # part way (the transactions committed before the failure stay). Returns the upload summary.
+    def bulk_apply(self, table_name, frame, key_columns, operation, statement_rows, transaction_rows, progress=None):
+        started = time.perf_counter()
+        result = None
+        try:
+            catalog = self.schema_catalog()
+            statement = upload_statement(catalog, table_name, list(frame.columns), key_columns, operation)
+            with self.pool.connection() as connection:
+                try:
+                    result = apply_upload(connection, catalog, table_name, frame, key_columns, operation,
+                                          statement_rows, transaction_rows, progress)
+                finally:
+                    self.cache.invalidate_for_write(statement)
+                    try:
+                        self.cache.invalidate_tables(sync_after_write(connection, statement))
+                    except Error as e:
+                        st.warning(f"The dashboard rollups could not be refreshed: {e}")
+            return result
+        except (Error, InvalidIdentifierError) as e:
+            st.error(f"Error: {e}")
+            return None
+        finally:
+            statement = result["statement"] if result else f"-- bulk {operation} {table_name}"
+            applied = result["applied"] if result else 0
+            self.stats.record(statement, time.perf_counter() - started, applied, estimate_size(frame), kind="write", ok=result is not None)
+
+    # Function to report a failed read. On the script thread it is drawn with st.error and the caller returns
+    # None; on an overview worker thread, which has no script context to draw in, it is raised instead, so
+    # render_overview can show it in the panel from the script thread.
+    def report_error(self, error):
+        if getattr(self._worker, "raise_errors", False):
+            raise error
+        st.error(f"Error: {error}")
+
+    # Function to run an overview panel's loader on a worker thread, with read errors raised (see report_error)
+    def load_on_worker(self, load):
+        self._worker.raise_errors = True
+        try:
+            return load()
+        finally:
+            self._worker.raise_errors = False
 
     # Function to fetch data from the database
-    def fetch_data(self, query):
+    def fetch_data(self, query, params=None):
+        started = time.perf_counter()
+        records = None
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                records = cursor.fetchall()
+                cursor.close()
+            return records
+        except Error as e:
+            self.report_error(e)
+            return None
+        finally:
+            received = estimate_size(records) if records else 0
+            self.stats.record(query, time.perf_counter() - started, len(records or ()), received, ok=records is not None)
+
+    # Function to fetch a result as a typed DataFrame, built column by column from tuple rows
+    def fetch_frame(self, query, params=None):
+        started = time.perf_counter()
+        frame = None
+        try:
+            with self.pool.connection() as connection:
+                # Unbuffered cursor: rows come off the socket batch by batch
+                cursor = connection.cursor(buffered=False)
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                frame = read_frame(cursor)
+                cursor.close()
+            return frame
+        except Error as e:
+            self.report_error(e)
+            return None
+        finally:
+            # Bytes received are approximated by the size of the decoded result
+            received = estimate_size(frame) if frame is not None else 0
+            rows = len(frame) if frame is not None else 0
+            self.stats.record(query, time.perf_counter() - started, rows, received, ok=frame is not None)
+
+    # Function to run a query against the analytics replica instead of MySQL
+    def fetch_replica(self, query, params=None):
+        started = time.perf_counter()
+        frame = None
+        try:
+            frame = self.replica.query(query, params)
+            return frame
+        except ReplicaError as e:
+            self.report_error(e)
+            return None
+        finally:
+            received = estimate_size(frame) if frame is not None else 0
+            rows = len(frame) if frame is not None else 0
+            self.stats.record(query, time.perf_counter() - started, rows, received, kind="replica", ok=frame is not None)
+
+    # Function to key cached insight results by backend as well, since the replica can lag MySQL
+    def cache_params(self, params):
+        return (self.backend, params) if self.backend == "replica" else params
+
+    # Function to reduce a streamed result client-side: consume(cursor) reads an unbuffered cursor and
+    # returns a small DataFrame, which is cached under the query, its params and cache_tag
+    def fetch_streamed(self, query, params, cache_tag, consume):
+        cache_params = self.cache_params((params, cache_tag))
+        hit, frame = self.cache.get(query, cache_params)
+        if hit:
+            return frame
+        started = time.perf_counter()
+        frame = None
+        try:
+            if self.backend == "replica":
+                frame = self.replica.stream(query, params, consume)
+            else:
+                with self.pool.connection() as connection:
+                    cursor = connection.cursor(buffered=False)
+                    if params:
+                        cursor.execute(query, params)
+                    else:
+                        cursor.execute(query)
+                    frame = consume(cursor)
+                    cursor.close()
+            self.cache.put(query, cache_params, frame)
+            return frame
+        except (Error, ReplicaError) as e:
+            self.cache.abandon(query, cache_params)
+            self.report_error(e)
+            return None
+        finally:
+            received = estimate_size(frame) if frame is not None else 0
+            rows = len(frame) if frame is not None else 0
+            self.stats.record(query, time.perf_counter() - started, rows, received, ok=frame is not None)
+
+    # Function to fetch a DataFrame through the result cache (used by the insight queries),
+    # from MySQL or the analytics replica depending on the selected backend
+    def fetch_cached(self, query, params=None):
+        cache_params = self.cache_params(params)
+        hit, frame = self.cache.get(query, cache_params)
+        if hit:
+            return frame
+        frame = None
+        try:
+            if self.backend == "replica":
+                frame = self.fetch_replica(query, params)
+            else:
+                frame = self.fetch_frame(query, params)
+        finally:
+            if frame is None:
+                self.cache.abandon(query, cache_params)
+        if frame is not None:
+            self.cache.put(query, cache_params, frame)
+        return frame
+
+    # Function to fold rows changed since the last poll into the live aggregates (loading them on first use)
+    def sync_live_aggregates(self):
+        started = time.perf_counter()
+        changed = None
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query)
-            return cursor.fetchall()
+            with self.pool.connection() as connection:
+                changed = self.live.refresh(connection)
+            return changed
         except Error as e:
+            self.report_error(e)
+            return None
+        finally:
+            self.stats.record("-- live aggregates refresh", time.perf_counter() - started, changed or 0, kind="poll", ok=changed is not None)
+
+    # Function to fold orders changed since the last poll into the order cube (building it on first use)
+    def sync_order_cube(self):
+        started = time.perf_counter()
+        changed = None
+        try:
+            with self.pool.connection() as connection:
+                changed = self.cube.refresh(connection)
+            return changed
+        except CubeTooLargeError:
+            # Not an error: the dataset is past ORDER_CUBE_MAX_CELLS, so callers fall back to MySQL
+            return None
+        except Error as e:
+            self.report_error(e)
+            return None
+        finally:
+            self.stats.record("-- order cube refresh", time.perf_counter() - started, changed or 0, kind="poll", ok=changed is not None)
+
+    # Function to copy new MySQL rows into the analytics replica and drop results cached from the old snapshot
+    def refresh_replica(self, full=False):
+        try:
+            with self.pool.connection() as connection:
+                counts = self.replica.refresh(connection, full=full)
+            self.cache.invalidate_tables(replica_tables())
+            return counts
+        except (Error, ReplicaError) as e:
             st.error(f"Error: {e}")
             return None
 
-    # Function to fetch table names dynamically
+    # Function to get the schema catalog (the shared one, or one for a pool passed in by tooling)
+    def schema_catalog(self):
+        if self.catalog is None:
+            self.catalog = SchemaCatalog(self.pool, ttl=SCHEMA_CATALOG_TTL_SECONDS, stats=self.stats)
+        return self.catalog
+
+    # Function to fetch table names dynamically (from the cached schema catalog)
     def fetch_table_names(self):
-        query = "SHOW TABLES"
-        result = self.fetch_data(query)
-        if result:
-            return [list(table.values())[0] for table in result]
-        return []
+        try:
+            return self.schema_catalog().tables()
+        except Error as e:
+            st.error(f"Error: {e}")
+            return []
+
+    # Function to fetch a table's column details (name, data_type, column_type, nullable, default, extra)
+    def fetch_column_details(self, table_name):
+        try:
+            return self.schema_catalog().columns(table_name)
+        except Error as e:
+            st.error(f"Error: {e}")
+            return []
 
     # Function to fetch table columns
     def fetch_table_columns(self, table_name):
-        query = f"SHOW COLUMNS FROM {table_name}"
-        result = self.fetch_data(query)
-        if result:
-            return [col['Field'] for col in result]
-        return []
+        return [column["name"] for column in self.fetch_column_details(table_name)]
+
+    # Function to find a table's primary key columns, in index order
+    def fetch_primary_key(self, table_name):
+        try:
+            return self.schema_catalog().primary_key(table_name)
+        except Error as e:
+            st.error(f"Error: {e}")
+            return []
+
+    # Function to draw a form input that matches a column's type; returns the value entered,
+    # or None when a non-text input is left empty (a condition input must check for that before use)
+    @staticmethod
+    def column_input(column, label):
+        kind = input_kind(column)
+        if kind == "int":
+            return st.number_input(label, value=None, step=1)
+        if kind == "float":
+            return st.number_input(label, value=None)
+        if kind == "bool":
+            choice = st.selectbox(label, ["", "True", "False"])
+            return None if not choice else choice == "True"
+        if kind == "date":
+            return st.date_input(label, value=None)
+        if kind == "choice":
+            return st.selectbox(label, [""] + enum_values(column)) or None
+        if kind == "datetime":
+            return st.text_input(label, placeholder="YYYY-MM-DD HH:MM:SS") or None
+        return st.text_input(label)
+
+
+    # Function to read a table's approximate row count from table statistics (no COUNT(*) scan)
+    def fetch_estimated_row_count(self, table_name):
+        query = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+        result = self.fetch_data(query, (table_name,))
+        if result and result[0]['TABLE_ROWS'] is not None:
+            return int(result[0]['TABLE_ROWS'])
+        return None
+
+    # Function to stream one page of a table using keyset pagination on its primary key.
+    # Pages after (or, going backward, before) the anchor key; returns None on error.
+    def fetch_page(self, table_name, key_columns, page_size, anchor=None, backward=False):
+        where = ""
+        params = None
+        if key_columns and anchor is not None:
+            keys = ", ".join(key_columns)
+            placeholders = ", ".join(["%s"] * len(key_columns))
+            where = f" WHERE ({keys}) {'<' if backward else '>'} ({placeholders})"
+            params = tuple(anchor)
+        order = ""
+        if key_columns:
+            order = " ORDER BY " + ", ".join(f"{col} {'DESC' if backward else 'ASC'}" for col in key_columns)
+        # One extra row tells us whether another page exists in this direction
+        query = f"SELECT * FROM {table_name}{where}{order} LIMIT {int(page_size) + 1}"
+        frame = self.fetch_frame(query, params)
+        if frame is None:
+            return None
 
-    # Function to generate peak order times
+        has_more = len(frame) > page_size
+        frame = frame.iloc[:page_size]
+        if backward:
+            frame = frame.iloc[::-1]
+        frame = frame.reset_index(drop=True)
+        empty = frame.empty
+        return {
+            "frame": frame,
+            "first_key": None if empty else tuple(python_value(frame.at[0, col]) for col in key_columns),
+            "last_key": None if empty else tuple(python_value(frame.at[len(frame) - 1, col]) for col in key_columns),
+            "has_more": has_more
+        }
+
+    # Button callback for View Records navigation; runs before the rerun fetches the new page
+    @staticmethod
+    def move_page(state, anchor, backward, step):
+        state["anchor"] = anchor
+        state["backward"] = backward
+        state["page"] += step
+
+    # Function to tell whether any sidebar filter is set
+    @property
+    def filtered(self):
+        return any(value is not None for value in self.filters.values())
+
+    # Function to build the conditions the sidebar filters put on orders (alias o), with bound parameters.
+    # order_date is compared as a bare range, so its indexes and partitions narrow the scan.
+    def order_filter(self):
+        conditions = []
+        params = []
+        if self.filters.get("period") is not None:
+            condition, range_params = date_range_condition("o.order_date", *self.filters["period"])
+            conditions.append(condition)
+            params.extend(range_params)
+        for column in ORDER_FILTER_COLUMNS:
+            if self.filters.get(column) is not None:
+                conditions.append(f"o.{column} = %s")
+                params.append(self.filters[column])
+        if self.filters.get("cuisine") is not None:
+            conditions.append("o.restaurant_id IN (SELECT restaurant_id FROM restaurants WHERE cuisine_type = %s)")
+            params.append(self.filters["cuisine"])
+        return conditions, params
+
+    # Function to map the filter bar onto order cube dimensions. The cube has no order dates, so with an
+    # order period set this returns None (the cube cannot answer), unless ignore_period is passed.
+    def cube_filters(self, ignore_period=False):
+        if self.filters.get("period") is not None and not ignore_period:
+            return None
+        dimensions = {"restaurant_id": "restaurant", "cuisine": "cuisine", "payment_mode": "payment_mode", "status": "status"}
+        return {dimensions[key]: value for key, value in self.filters.items() if key in dimensions and value is not None}
+
+    # Function to generate peak order times (from the hourly rollup, kept current by rollups.py, the live
+    # aggregates or the order cube; with filters set, from the matching orders)
     def get_peak_order_times(self):
-        query = "SELECT HOUR(order_time) AS order_hour, COUNT(*) AS total_orders FROM orders GROUP BY order_hour ORDER BY order_hour;"
-        return self.fetch_data(query)
+        if self.backend == "cube" and self.cube_filters() is not None:
+            return self.cube.peak_order_times(self.cube_filters())
+        if self.filtered:
+            conditions, params = self.order_filter()
+            query = f"""
+                SELECT HOUR(o.order_date) AS order_hour, COUNT(*) AS total_orders
+                FROM orders o
+                WHERE {" AND ".join(["o.order_date IS NOT NULL"] + conditions)}
+                GROUP BY HOUR(o.order_date)
+                ORDER BY order_hour;
+            """
+            return self.fetch_cached(query, tuple(params))
+        if self.backend == "live":
+            return self.live.peak_order_times()
+        query = "SELECT order_hour, total_orders FROM order_hour_rollup ORDER BY order_hour;"
+        return self.fetch_cached(query)
+
+    # Function to count orders per hour (or per day) of their order date, for the filtered orders
+    def get_orders_over_time(self, granularity="hour"):
+        conditions, params = self.order_filter()
+        where = " AND ".join(["o.order_date IS NOT NULL"] + conditions)
+        # CAST(... AS DATE) and HOUR() read the same on MySQL and DuckDB
+        if granularity == "day":
+            query = f"""
+                SELECT CAST(o.order_date AS DATE) AS order_day, COUNT(*) AS total_orders
+                FROM orders o
+                WHERE {where}
+                GROUP BY CAST(o.order_date AS DATE);
+            """
+        else:
+            query = f"""
+                SELECT CAST(o.order_date AS DATE) AS order_day, HOUR(o.order_date) AS order_hour, COUNT(*) AS total_orders
+                FROM orders o
+                WHERE {where}
+                GROUP BY CAST(o.order_date AS DATE), HOUR(o.order_date);
+            """
+        frame = self.fetch_cached(query, tuple(params))
+        if frame is None or frame.empty:
+            return frame
+        order_time = pd.to_datetime(frame["order_day"])
+        if granularity != "day":
+            order_time = order_time + pd.to_timedelta(frame["order_hour"].astype("int64"), unit="h")
+        return pd.DataFrame({"order_time": order_time, "total_orders": frame["total_orders"]}).sort_values("order_time", ignore_index=True)
+
+    # Function to fetch delayed deliveries (with a limit, the most delayed first, read off the delay index)
+    def get_delayed_deliveries(self, limit=None):
+        # delay_minutes is the indexed generated column for delivery_time - estimated_time
+        source, conditions, params = self.delivery_scope()
+        where = " AND ".join(["d.delay_minutes > 0"] + conditions)
+        if limit is not None:
+            query = f"SELECT d.* FROM {source} WHERE {where} ORDER BY d.delay_minutes DESC LIMIT %s;"
+            return self.fetch_cached(query, tuple(params) + (int(limit),))
+        query = f"SELECT d.* FROM {source} WHERE {where};"
+        return self.fetch_cached(query, tuple(params))
 
-    # Function to fetch delayed deliveries
-    def get_delayed_deliveries(self):
-        query = "SELECT * FROM deliveries WHERE delivery_time > estimated_time;"
-        return self.fetch_data(query)
+    # Function to tell whether a child table carries its order's order_date (the partitioned schema, see
+    # dbsetup3.create_tables), so the order period can be put on it as well and prune its partitions too
+    def carries_order_date(self, table_name):
+        return "order_date" in self.fetch_table_columns(table_name)
 
-    # Function to fetch top customers
+    # Function to build the join of a child table (alias) to the filtered orders, and the conditions and
+    # params on both; with the copied order_date, the join and the period also cover the child's partitions
+    def child_order_filter(self, table_name, alias):
+        conditions, params = self.order_filter()
+        join = f"o.order_id = {alias}.order_id"
+        if self.carries_order_date(table_name):
+            join += f" AND o.order_date = {alias}.order_date"
+            if self.filters.get("period") is not None:
+                condition, range_params = date_range_condition(f"{alias}.order_date", *self.filters["period"])
+                conditions.append(condition)
+                params.extend(range_params)
+        return join, conditions, params
+
+    # Function to build the FROM clause and conditions limiting deliveries (alias d) to the filtered orders
+    def delivery_scope(self):
+        if not self.filtered:
+            return "deliveries d", [], []
+        join, conditions, params = self.child_order_filter("Deliveries", "d")
+        return f"deliveries d JOIN orders o ON {join}", conditions, params
+
+    # Function to fetch top customers (by their order totals, or with filters set, by matching orders)
     def get_top_customers(self):
+        if self.filtered:
+            conditions, params = self.order_filter()
+            query = f"""
+                SELECT c.name, COUNT(*) AS total_orders
+                FROM orders o
+                JOIN customers c ON c.customer_id = o.customer_id
+                WHERE {" AND ".join(conditions)}
+                GROUP BY o.customer_id, c.name
+                ORDER BY total_orders DESC
+                LIMIT 5;
+            """
+            return self.fetch_cached(query, tuple(params))
         query = "SELECT name, total_orders FROM customers ORDER BY total_orders DESC LIMIT 5;"
-        return self.fetch_data(query)
+        return self.fetch_cached(query)
 
-    # Function to get customer preferences (Customer Analytics)
-    def get_customer_preferences(self):
-        query = """
-            SELECT customer_id, item_name, COUNT(*) AS frequency
-            FROM orders
-            JOIN order_items ON orders.order_id = order_items.order_id
-            GROUP BY customer_id, item_name
-            ORDER BY frequency DESC;
+    # Function to get the (customer_id, dish_name, frequency) source the preferences queries read: the
+    # rollup, or with filters set, the same counts over the matching orders
+    def customer_items_source(self):
+        if not self.filtered:
+            return "customer_item_rollup", []
+        join, conditions, params = self.child_order_filter("OrderItems", "oi")
+        source = f"""(
+                SELECT o.customer_id, oi.dish_name, COUNT(*) AS frequency
+                FROM orderitems oi
+                JOIN orders o ON {join}
+                WHERE {" AND ".join(["o.customer_id IS NOT NULL", "oi.dish_name IS NOT NULL"] + conditions)}
+                GROUP BY o.customer_id, oi.dish_name
+            )"""
+        return source, params
+
+    # Function to build the customers join and conditions for a preferences segment ({column: value})
+    @staticmethod
+    def segment_filter(segment):
+        conditions = []
+        params = []
+        for column, value in (segment or {}).items():
+            if column not in SEGMENT_COLUMNS:
+                raise ValueError(f"Unsupported segment column: {column}")
+            conditions.append(f"c.{column} = %s")
+            params.append(value)
+        join = " JOIN customers c ON c.customer_id = cir.customer_id" if conditions else ""
+        return join, conditions, params
+
+    # Function to check whether the server has window functions (MySQL 8.0+, MariaDB 10.2+)
+    def supports_window_functions(self):
+        if self.backend == "replica":
+            # DuckDB has them; its VERSION() string would not parse as a MySQL version
+            return True
+        result = self.fetch_cached("SELECT VERSION() AS version;")
+        if result is None or result.empty:
+            return False
+        version = str(result.at[0, "version"])
+        match = re.match(r"(\d+)\.(\d+)", version)
+        if not match:
+            return False
+        major, minor = int(match.group(1)), int(match.group(2))
+        if "mariadb" in version.lower():
+            return (major, minor) >= (10, 2)
+        return major >= 8
+
+    # Function to get customer preferences (Customer Analytics): the top_k items across all
+    # customers, or a segment of them, with the LIMIT applied in the database
+    def get_customer_preferences(self, top_k=DEFAULT_TOP_K, segment=None):
+        if self.backend == "live" and not segment and not self.filtered:
+            return self.live.top_items(int(top_k))
+        source, source_params = self.customer_items_source()
+        join, conditions, params = self.segment_filter(segment)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT cir.dish_name AS item_name, SUM(cir.frequency) AS frequency
+            FROM {source} cir{join}
+            {where}
+            GROUP BY cir.dish_name
+            ORDER BY frequency DESC
+            LIMIT %s;
         """
-        return self.fetch_data(query)
+        return self.fetch_cached(query, tuple(source_params) + tuple(params) + (int(top_k),))
+
+    # Function to get each customer's top_n items, for one customer or a segment, capped at limit rows.
+    # Uses ROW_NUMBER() where available, otherwise a streamed heap over the rollup in key order.
+    def get_customer_top_items(self, top_n=DEFAULT_TOP_N, customer_id=None, segment=None, limit=MAX_DRILLDOWN_ROWS):
+        source, source_params = self.customer_items_source()
+        join, conditions, params = self.segment_filter(segment)
+        params = list(source_params) + params
+        if customer_id is not None:
+            conditions.append("cir.customer_id = %s")
+            params.append(customer_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if self.supports_window_functions():
+            query = f"""
+                SELECT customer_id, item_name, frequency, item_rank
+                FROM (
+                    SELECT cir.customer_id, cir.dish_name AS item_name, cir.frequency,
+                           ROW_NUMBER() OVER (PARTITION BY cir.customer_id ORDER BY cir.frequency DESC, cir.dish_name) AS item_rank
+                    FROM {source} cir{join}
+                    {where}
+                ) ranked
+                WHERE item_rank <= %s
+                ORDER BY frequency DESC
+                LIMIT %s;
+            """
+            return self.fetch_cached(query, tuple(params) + (int(top_n), int(limit)))
+
+        query = f"""
+            SELECT cir.customer_id, cir.dish_name, cir.frequency
+            FROM {source} cir{join}
+            {where}
+            ORDER BY cir.customer_id;
+        """
+
+        def consume(cursor):
+            rows = top_n_per_group(stream_rows(cursor), int(top_n), int(limit))
+            return pd.DataFrame(rows, columns=["customer_id", "item_name", "frequency", "item_rank"])
+
+        return self.fetch_streamed(query, tuple(params), ("top_n_heap", int(top_n), int(limit)), consume)
+
+    # Function to list the customers offered for a preferences drill-down (busiest first)
+    def get_customer_choices(self, limit=100):
+        return self.fetch_cached("SELECT customer_id, name FROM customers ORDER BY total_orders DESC LIMIT %s;", (int(limit),))
+
+    # Function to list the restaurants offered in the filter bar (busiest first)
+    def get_restaurant_choices(self, limit=MAX_RESTAURANT_CHOICES):
+        return self.fetch_cached("SELECT restaurant_id, name FROM restaurants ORDER BY total_orders DESC LIMIT %s;", (int(limit),))
+
+    # Function to list the restaurant cuisines offered in the filter bar
+    def get_restaurant_cuisine_choices(self):
+        return self.fetch_cached("SELECT DISTINCT cuisine_type FROM restaurants WHERE cuisine_type IS NOT NULL ORDER BY cuisine_type;")
+
+    # Function to list the values of an order column offered in the filter bar
+    def get_order_choices(self, column):
+        if column not in ORDER_FILTER_COLUMNS:
+            raise ValueError(f"Unsupported filter column: {column}")
+        return self.fetch_cached(f"SELECT DISTINCT {column} FROM orders WHERE {column} IS NOT NULL ORDER BY {column};")
+
+    # Function to list the preferred cuisines offered as a preferences segment
+    def get_cuisine_choices(self):
+        return self.fetch_cached("SELECT DISTINCT preferred_cuisine FROM customers WHERE preferred_cuisine IS NOT NULL ORDER BY preferred_cuisine;")
 
     # Function to get delivery times and delays (Delivery Optimization)
     def get_delivery_times(self):
         query = """
-        SELECT delivery_time, estimated_time, 
-               (delivery_time - estimated_time) AS delay
+        SELECT delivery_time, estimated_time, delay_minutes AS delay
         FROM deliveries;
     """
-        return self.fetch_data(query)
+        return self.fetch_cached(query)
+
+    # Function to bin delivery delays for the Delivery Times and Delays histogram.
+    # "sql" mode has the database return one row per bin; "stream" mode (also the fallback when
+    # SQL binning fails) bins streamed chunks with NumPy. Returns (bins, percentiles, bin_width) or None.
+    def get_delivery_delay_histogram(self, bin_width=None, mode="sql"):
+        if self.backend == "live" and not self.filtered:
+            low, high, total = self.live.delay_bounds()
+            if not total:
+                return None
+            bin_width = bin_width or auto_bin_width(low, high, total)
+            bins = self.live.delay_bins(bin_width)
+            return bins, percentiles_from_bins(bins), bin_width
 
-    # Function to get most popular restaurants (Restaurant Insights)
+        source, conditions, params = self.delivery_scope()
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        bounds = self.fetch_cached(f"SELECT MIN(d.delay_minutes) AS low, MAX(d.delay_minutes) AS high, COUNT(d.delay_minutes) AS total FROM {source}{where};", tuple(params))
+        if bounds is None or bounds.empty or not bounds.at[0, "total"]:
+            return None
+        if not bin_width:
+            bin_width = auto_bin_width(python_value(bounds.at[0, "low"]), python_value(bounds.at[0, "high"]), int(bounds.at[0, "total"]))
+
+        bins = None
+        if mode == "sql":
+            query = f"""
+                SELECT FLOOR(d.delay_minutes / %s) * %s AS bin_start, COUNT(*) AS total
+                FROM {source}
+                WHERE {" AND ".join(["d.delay_minutes IS NOT NULL"] + conditions)}
+                GROUP BY bin_start
+                ORDER BY bin_start;
+            """
+            try:
+                frame = self.fetch_cached(query, (bin_width, bin_width) + tuple(params))
+            except (Error, ReplicaError):
+                # Raised on overview worker threads; fall back to streaming there too
+                frame = None
+            if frame is not None:
+                bins = bins_frame(frame["bin_start"], frame["total"], bin_width)
+        if bins is None:
+            bins = self.stream_delay_histogram(bin_width)
+        if bins is None:
+            return None
+        return bins, percentiles_from_bins(bins), bin_width
+
+    # Function to bin delivery delays client-side from an unbuffered cursor, keeping only bin counts in memory
+    def stream_delay_histogram(self, bin_width):
+        source, conditions, params = self.delivery_scope()
+        query = f"SELECT d.delay_minutes FROM {source} WHERE {' AND '.join(['d.delay_minutes IS NOT NULL'] + conditions)};"
+        return self.fetch_streamed(query, tuple(params), ("histogram", bin_width), lambda cursor: stream_histogram(cursor, bin_width))
+
+    # Function to get most popular restaurants (Restaurant Insights), from the per-restaurant rollup
+    # (or the live per-restaurant counts, with names looked up for the top five, or the order cube; with
+    # filters set, from the matching orders)
     def get_popular_restaurants(self):
+        if self.backend == "cube" and self.cube_filters() is not None:
+            return self.cube.top_restaurants(5, self.cube_filters())
+        if self.filtered:
+            conditions, params = self.order_filter()
+            query = f"""
+                SELECT r.name, COUNT(*) AS total_orders
+                FROM orders o
+                JOIN restaurants r ON r.restaurant_id = o.restaurant_id
+                WHERE {" AND ".join(conditions)}
+                GROUP BY r.name
+                ORDER BY total_orders DESC
+                LIMIT 5;
+            """
+            return self.fetch_cached(query, tuple(params))
+        if self.backend == "live":
+            top = self.live.top_restaurants(5)
+            if top.empty:
+                return top.rename(columns={"restaurant_id": "name"})
+            placeholders = ", ".join(["%s"] * len(top))
+            names = self.fetch_cached(f"SELECT restaurant_id, name FROM restaurants WHERE restaurant_id IN ({placeholders});", tuple(top["restaurant_id"]))
+            if names is None:
+                return None
+            top = top.merge(names, on="restaurant_id", how="left")
+            return top.groupby("name", as_index=False)["total_orders"].sum().sort_values("total_orders", ascending=False, ignore_index=True)
         query = """
-            SELECT r.name, COUNT(o.order_id) AS total_orders
-            FROM restaurants r
-            JOIN orders o ON r.restaurant_id = o.restaurant_id
+            SELECT r.name, SUM(ro.total_orders) AS total_orders
+            FROM restaurant_order_rollup ro
+            JOIN restaurants r ON r.restaurant_id = ro.restaurant_id
             GROUP BY r.name
             ORDER BY total_orders DESC
             LIMIT 5;
         """
-        return self.fetch_data(query)
+        return self.fetch_cached(query)
+
+    # Function to rank restaurants by their average delivery delay (Delivery Optimization), the top_k
+    # with at least MIN_RESTAURANT_DELIVERIES deliveries
+    def get_restaurant_delays(self, top_k=DEFAULT_TOP_K):
+        join, conditions, params = self.child_order_filter("Deliveries", "d")
+        query = f"""
+            SELECT r.name, AVG(d.delay_minutes) AS avg_delay, COUNT(*) AS deliveries
+            FROM deliveries d
+            JOIN orders o ON {join}
+            JOIN restaurants r ON r.restaurant_id = o.restaurant_id
+            WHERE {" AND ".join(["d.delay_minutes IS NOT NULL"] + conditions)}
+            GROUP BY r.name
+            HAVING COUNT(*) >= %s
+            ORDER BY avg_delay DESC
+            LIMIT %s;
+        """
+        return self.fetch_cached(query, tuple(params) + (MIN_RESTAURANT_DELIVERIES, int(top_k)))
+
+    # Function to rank items by the distinct customers ordering them (Customer Analytics), the top_k.
+    # The customer-item source holds one row per customer and item, so counting its rows counts customers.
+    def get_item_reach(self, top_k=DEFAULT_TOP_K):
+        source, params = self.customer_items_source()
+        query = f"""
+            SELECT cir.dish_name AS item_name, COUNT(*) AS customers
+            FROM {source} cir
+            GROUP BY cir.dish_name
+            ORDER BY customers DESC
+            LIMIT %s;
+        """
+        return self.fetch_cached(query, tuple(params) + (int(top_k),))
+
+    # Function to read one key block for an approximate scan. It runs on a scan thread, so errors are
+    # raised (the view shows them from scan.error) instead of drawn with st.error.
+    def fetch_block(self, query, params):
+        started = time.perf_counter()
+        frame = None
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor(buffered=False)
+                cursor.execute(query, params)
+                frame = read_frame(cursor)
+                cursor.close()
+            return frame
+        finally:
+            received = estimate_size(frame) if frame is not None else 0
+            rows = len(frame) if frame is not None else 0
+            self.stats.record(query, time.perf_counter() - started, rows, received, kind="approx", ok=frame is not None)
+
+    # Function to get the scan behind an approximate insight, starting it if no session has. The scan is
+    # keyed by name and the filters; query(block) builds the (query, params) reading one key block, and
+    # read(frame) turns the block's rows into the arguments of the estimator's add().
+    def approximate_scan(self, name, estimator, query, read):
+        def fetch_block(block):
+            return read(self.fetch_block(*query(block)))
+
+        key = (name, repr(sorted(self.filters.items())))
+        return get_approximate_scans().get_or_start(key, lambda: ProgressiveScan(estimator(), fetch_block), get_approximate_executor())
+
+    # Function to estimate each restaurant's average delay from sampled blocks of deliveries; the
+    # estimator's result gives (group, n, mean, error) per restaurant name
+    def approximate_restaurant_delays(self):
+        join, conditions, params = self.child_order_filter("Deliveries", "d")
+
+        def query(block):
+            condition, block_params = key_block_condition("d.delivery_id", block)
+            return f"""
+                SELECT r.name, COUNT(*) AS n, SUM(d.delay_minutes) AS total, SUM(d.delay_minutes * d.delay_minutes) AS total_sq
+                FROM deliveries d
+                JOIN orders o ON {join}
+                JOIN restaurants r ON r.restaurant_id = o.restaurant_id
+                WHERE {" AND ".join([condition, "d.delay_minutes IS NOT NULL"] + conditions)}
+                GROUP BY r.name;
+            """, block_params + tuple(params)
+
+        def read(frame):
+            return (pd.DataFrame({"group": frame["name"].astype(object), "n": frame["n"], "total": frame["total"], "total_sq": frame["total_sq"]}),)
+
+        return self.approximate_scan("restaurant_delays", GroupMeanEstimator, query, read)
+
+    # Function to estimate each item's distinct customers from sampled blocks of customers (every
+    # customer's rows are in one block, so the customers seen scale up to all of them)
+    def approximate_item_reach(self):
+        source, params = self.customer_items_source()
+
+        def query(block):
+            condition, block_params = key_block_condition("cir.customer_id", block)
+            return f"SELECT cir.dish_name, cir.customer_id FROM {source} cir WHERE {condition};", tuple(params) + block_params
+
+        def read(frame):
+            return frame["dish_name"].astype(object).to_numpy(), frame["customer_id"].astype(object).to_numpy()
+
+        return self.approximate_scan("item_reach", DistinctCountEstimator, query, read)
+
+    # Function to estimate item frequencies across all customers from sampled blocks of order items,
+    # counted per item in the database
+    def approximate_customer_preferences(self):
+        join, conditions, params = self.child_order_filter("OrderItems", "oi")
+
+        def query(block):
+            condition, block_params = key_block_condition("oi.order_item_id", block)
+            return f"""
+                SELECT oi.dish_name, COUNT(*) AS frequency
+                FROM orderitems oi
+                JOIN orders o ON {join}
+                WHERE {" AND ".join([condition, "o.customer_id IS NOT NULL", "oi.dish_name IS NOT NULL"] + conditions)}
+                GROUP BY oi.dish_name;
+            """, block_params + tuple(params)
+
+        def read(frame):
+            return frame["dish_name"].astype(object).to_numpy(), frame["frequency"].to_numpy()
+
+        return self.approximate_scan("customer_preferences", FrequencyEstimator, query, read)
+
+    # Function to estimate the delay histogram from a reservoir of delays read off sampled blocks of deliveries
+    def approximate_delay_histogram(self):
+        source, conditions, params = self.delivery_scope()
+
+        def query(block):
+            condition, block_params = key_block_condition("d.delivery_id", block)
+            return f"SELECT d.delay_minutes FROM {source} WHERE {' AND '.join([condition, 'd.delay_minutes IS NOT NULL'] + conditions)};", block_params + tuple(params)
+
+        def read(frame):
+            return (frame["delay_minutes"].to_numpy(dtype=float),)
+
+        return self.approximate_scan("delay_histogram", HistogramEstimator, query, read)
+
+    # Function to show a scan's current estimate with render(result, coverage), redrawn every
+    # APPROXIMATE_REFRESH_SECONDS until the scan has read every block. *args go to the estimator's result().
+    @staticmethod
+    def render_approximate(scan, render, *args):
+        polling = not scan.done
+
+        def show():
+            if polling and scan.done:
+                # Redraw the view once more with the final estimate, without the timer
+                st.rerun()
+            if scan.error is not None:
+                st.error(f"Error: {scan.error}")
+            result, coverage = scan.result(*args)
+            if result.empty:
+                st.caption("Sampling..." if not scan.done else "No data available.")
+                return
+            state = "complete" if scan.done and scan.error is None else f"{time.monotonic() - scan.started_at:.0f}s in, refining"
+            st.caption(f"Approximate: {coverage:.1%} of the rows sampled ({scan.blocks_read} of {len(scan.blocks)} key blocks, {state}). "
+                       f"± bounds are 95% confidence intervals.")
+            render(result, coverage)
+
+        st.fragment(show, run_every=None if scan.done else APPROXIMATE_REFRESH_SECONDS)()
+
+    # Function to get the newest trained delay model (None if there is none, or it cannot be loaded)
+    def delay_model(self):
+        path = latest_model_path(MODEL_DIR)
+        if path is None:
+            return None
+        try:
+            return get_delay_model(path)
+        except (OSError, ValueError, KeyError) as e:
+            st.error(f"Could not load the delay model {path}: {e}")
+            return None
+
+    # Function to train a delay model on the delivered deliveries and save it as a new artifact
+    def train_delay_model(self):
+        started = time.perf_counter()
+        model = None
+        try:
+            with self.pool.connection() as connection:
+                training = load_training_frame(connection)
+            model = DelayModel.train(training)
+            model.save(MODEL_DIR)
+            return model
+        except (Error, ValueError, OSError) as e:
+            st.error(f"Error: {e}")
+            return None
+        finally:
+            rows = model.metadata["rows"] if model is not None else 0
+            self.stats.record("-- train delay model", time.perf_counter() - started, rows, kind="model", ok=model is not None)
+
+    # Function to predict the delay of every pending delivery of the filtered orders with the delay model,
+    # in one batch pass, cached per model version, threshold and filters (Delivery Optimization)
+    def get_predicted_late_deliveries(self, threshold=DEFAULT_LATE_THRESHOLD):
+        model = self.delay_model()
+        if model is None:
+            return None
+        # Cached under the features query, so writes to any table it reads drop the scores
+        cache_query = FEATURES_QUERY
+        cache_params = (model.version, threshold, repr(sorted(self.filters.items())))
+        hit, frame = self.cache.get(cache_query, cache_params)
+        if hit:
+            return frame
+        conditions, params = self.order_filter()
+        started = time.perf_counter()
+        frame = None
+        try:
+            with self.pool.connection() as connection:
+                frame = score_pending(connection, model, threshold, conditions, params)
+            self.cache.put(cache_query, cache_params, frame)
+            return frame
+        except Error as e:
+            self.cache.abandon(cache_query, cache_params)
+            st.error(f"Error: {e}")
+            return None
+        finally:
+            received = estimate_size(frame) if frame is not None else 0
+            rows = len(frame) if frame is not None else 0
+            self.stats.record(cache_query, time.perf_counter() - started, rows, received, kind="model", ok=frame is not None)
+
+    # Chart builders shared by the single insight views and the overview. They go through charts.py,
+    # which caps categories, points and payload size so large results stay light in the browser.
+    @staticmethod
+    def peak_order_times_figure(df):
+        return bar_chart(df, "order_hour", "total_orders", "Peak Order Times", {"order_hour": "Hour of Day", "total_orders": "Number of Orders"})
+
+    @staticmethod
+    def orders_over_time_figure(df):
+        return line_chart(df, "order_time", "total_orders", "Orders Over Time", {"order_time": "Order Date", "total_orders": "Number of Orders"})
+
+    @staticmethod
+    def top_customers_figure(df):
+        return bar_chart(df, "name", "total_orders", "Top Customers by Total Orders", {"name": "Customer Name", "total_orders": "Total Orders"})
+
+    @staticmethod
+    def popular_restaurants_figure(df):
+        return bar_chart(df, "name", "total_orders", "Most Popular Restaurants", {"name": "Restaurant", "total_orders": "Total Orders"})
+
+    @staticmethod
+    def items_figure(df, title):
+        return bar_chart(df, "item_name", "frequency", title, {"item_name": "Item", "frequency": "Frequency"})
+
+    @staticmethod
+    def delay_histogram_figure(bins, percentiles, bin_width):
+        return histogram_chart(bins, bin_width, percentiles, "Delivery Time Delays", {"bin_center": "Delay in Minutes", "count": "Deliveries"})
+
+    @staticmethod
+    def late_by_restaurant_figure(df):
+        counts = df.groupby("restaurant_name", as_index=False).size().rename(columns={"size": "late_deliveries"})
+        return bar_chart(counts, "restaurant_name", "late_deliveries", "Predicted Late Deliveries by Restaurant",
+                         {"restaurant_name": "Restaurant", "late_deliveries": "Pending Deliveries Predicted Late"})
+
+    @staticmethod
+    def restaurant_delays_figure(df, top_k, error=None):
+        return ranked_bar_chart(df, "name", "avg_delay", "Average Delay by Restaurant", {"name": "Restaurant", "avg_delay": "Average Delay (minutes)"}, error, top_k)
+
+    @staticmethod
+    def item_reach_figure(df, top_k, error=None):
+        return ranked_bar_chart(df, "item_name", "customers", "Distinct Customers per Item", {"item_name": "Item", "customers": "Customers"}, error, top_k)
+
+    # Function to show every insight on one page. All queries are submitted at once to the shared
+    # thread pool and each panel is drawn as soon as its own query finishes, so the page takes as
+    # long as the slowest query rather than the sum of them. Workers only query; all st.* calls
+    # stay on the script thread.
+    def render_overview(self):
+        st.write("### Operations Overview")
+
+        def chart(build):
+            return lambda placeholder, data: placeholder.plotly_chart(build(data))
+
+        def histogram(placeholder, data):
+            placeholder.plotly_chart(self.delay_histogram_figure(*data))
+
+        def table(placeholder, data):
+            placeholder.dataframe(data, hide_index=True)
+
+        panels = [
+            ("Peak Ordering Times", self.get_peak_order_times, chart(self.peak_order_times_figure)),
+            ("Most Popular Restaurants", self.get_popular_restaurants, chart(self.popular_restaurants_figure)),
+            ("Top Customers", self.get_top_customers, chart(self.top_customers_figure)),
+            ("Delay Distribution", self.get_delivery_delay_histogram, histogram),
+            (f"Most Delayed Deliveries (top {OVERVIEW_DELAYED_ROWS})", lambda: self.get_delayed_deliveries(OVERVIEW_DELAYED_ROWS), table)
+        ]
+
+        grid = st.columns(2)
+        placeholders = {}
+        for i, (title, _, _) in enumerate(panels):
+            cell = grid[i % 2].container()
+            cell.write(f"#### {title}")
+            placeholders[title] = cell.empty()
+            placeholders[title].caption("Loading...")
+
+        started = time.perf_counter()
+        executor = get_overview_executor()
+        futures = {executor.submit(self.load_on_worker, load): (title, render) for title, load, render in panels}
+        for future in as_completed(futures):
+            title, render = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                placeholders[title].error(f"Error: {e}")
+                continue
+            empty = data is None or (data[0].empty if isinstance(data, tuple) else data.empty)
+            if empty:
+                placeholders[title].info("No data available.")
+            else:
+                render(placeholders[title], data)
+        st.caption(f"Overview loaded in {time.perf_counter() - started:.2f}s")
+
+    # Function to pick queries from the catalog and run them in parallel, each panel drawn as its query
+    # finishes (on the script thread) with its own timing and whether the result cache answered it
+    def render_query_catalog(self):
+        catalog = self.query_catalog
+        if catalog is None:
+            st.info("The query catalog is unavailable.")
+            return
+        for name, message in (catalog.errors or {}).items():
+            st.error(f"{catalog.queries[name]['number']}. {catalog.queries[name]['title']} ({name}) does not match the schema: {message}")
+        titles = {name: f"{catalog.queries[name]['number']}. {catalog.queries[name]['title']}" for name in catalog.valid}
+        names = st.multiselect("Queries to run:", list(titles), format_func=titles.get)
+        needed = dict.fromkeys(param for name in names for param in catalog.queries[name]["params"])
+        params = {param: st.text_input(f"Value for {param}:") or None for param in needed}
+        st.caption(f"Queries without a LIMIT return at most {catalog.max_rows:,} rows.")
+        if not names or not st.button("Run queries"):
+            return
+
+        placeholders = {}
+        for name in names:
+            st.write(f"#### {titles[name]}")
+            placeholders[name] = st.empty()
+            placeholders[name].caption("Running...")
+
+        def show(name, result):
+            placeholder = placeholders[name].container()
+            if result["error"]:
+                placeholder.error(f"Error: {result['error']}")
+                return
+            source = "from the result cache" if result["cached"] else f"in {result['seconds'] * 1000:.1f} ms"
+            truncated = f" (first {catalog.max_rows:,})" if result["truncated"] else ""
+            placeholder.caption(f"{result['rows']:,} rows{truncated} {source}")
+            placeholder.dataframe(result["frame"], hide_index=True)
+
+        started = time.perf_counter()
+        results = catalog.run(self.pool, names, params, get_overview_executor(), show)
+        total = sum(result["seconds"] for result in results.values())
+        st.caption(f"Ran {len(names)} queries in {time.perf_counter() - started:.2f}s ({total:.2f}s one after another)")
+
+    # Function to let the user run the insights on MySQL or on the DuckDB replica, and refresh the replica
+    def render_backend_switch(self):
+        options = ["MySQL", "Live aggregates (in memory)", "Order cube (in memory)"]
+        if self.replica is not None:
+            options.append("Analytics replica (DuckDB)")
+        choice = st.sidebar.radio("Run insights on:", options)
+        self.backend = "mysql"
+        if choice == "MySQL":
+            return
+        if choice.startswith("Live"):
+            if self.sync_live_aggregates() is None:
+                st.sidebar.warning("Live aggregates are unavailable. Showing MySQL results.")
+                return
+            st.sidebar.caption(f"Live aggregates at change {self.live.mark:,} ({self.live.changes_applied:,} changes applied since load)")
+            self.backend = "live"
+            return
+        if choice.startswith("Order cube"):
+            if self.sync_order_cube() is None:
+                if self.cube.too_large is not None:
+                    st.sidebar.info(f"The data is too large for the order cube ({self.cube.too_large}). Showing MySQL results.")
+                else:
+                    st.sidebar.warning("The order cube is unavailable. Showing MySQL results.")
+                return
+            cube = self.cube.stats()
+            st.sidebar.caption(f"Order cube at change {self.cube.mark:,}: {cube['cells']:,} cells, {cube['bytes'] / 1e6:.1f} MB")
+            self.backend = "cube"
+            return
+        full = st.sidebar.checkbox("Full re-copy")
+        if st.sidebar.button("Refresh replica"):
+            with st.spinner("Copying tables into the replica..."):
+                counts = self.refresh_replica(full)
+            if counts is not None:
+                st.sidebar.success(f"Copied {sum(counts.values()):,} rows.")
+        refreshed_at = self.replica.last_refreshed()
+        if refreshed_at is None:
+            st.sidebar.warning("The replica is empty; refresh it to use it. Showing MySQL results.")
+            return
+        st.sidebar.caption(f"Replica snapshot from {refreshed_at:%Y-%m-%d %H:%M:%S}")
+        self.backend = "replica"
+
+    # Function to show the filter bar and set the filters every insight query applies. The values are
+    # bound parameters, so each filter combination is cached separately; dates are whole days, so a
+    # period's cache key stays the same for the rest of the day.
+    def render_filter_bar(self):
+        st.sidebar.write("#### Filters")
+        today = datetime.date.today()
+        choice = st.sidebar.selectbox("Order period:", list(ORDER_PERIODS) + ["Custom range"])
+        period = None
+        if choice == "Custom range":
+            dates = st.sidebar.date_input("Order dates:", value=(today - datetime.timedelta(days=7), today))
+            if len(dates) == 2:
+                period = (dates[0], dates[1] + datetime.timedelta(days=1))
+        elif ORDER_PERIODS[choice] is not None:
+            period = (today - datetime.timedelta(days=ORDER_PERIODS[choice]), today + datetime.timedelta(days=1))
+
+        def choose(label, frame, column, labels=None):
+            values = [] if frame is None else [python_value(value) for value in frame[column]]
+            names = dict(zip(values, labels)) if labels is not None else {}
+            return st.sidebar.selectbox(label, [None] + values, format_func=lambda value: "Any" if value is None else str(names.get(value, value)))
+
+        restaurants = self.get_restaurant_choices()
+        self.filters = {
+            "period": period,
+            "restaurant_id": choose("Restaurant:", restaurants, "restaurant_id", None if restaurants is None else restaurants["name"]),
+            "cuisine": choose("Cuisine:", self.get_restaurant_cuisine_choices(), "cuisine_type"),
+            "payment_mode": choose("Payment mode:", self.get_order_choices("payment_mode"), "payment_mode"),
+            "status": choose("Status:", self.get_order_choices("status"), "status")
+        }
+        if self.filtered and self.backend == "live":
+            st.sidebar.caption("Filtered insights are read from MySQL; the live aggregates cover all orders.")
+
+    # Function to show per-statement latency percentiles, cache and pool usage in the sidebar
+    def render_diagnostics(self):
+        with st.sidebar.expander("Query diagnostics", expanded=True):
+            summary = self.stats.summary()
+            if summary.empty:
+                st.caption("No queries recorded yet.")
+            else:
+                st.dataframe(summary.round({"p50_ms": 1, "p95_ms": 1, "max_ms": 1, "avg_rows": 1}), hide_index=True)
+            cache = self.cache.stats()
+            st.caption(f"Result cache: {cache['entries']} entries, {cache['bytes'] / 1e6:.1f} MB, {cache['hits']} hits / {cache['misses']} misses")
+            if self.pool is not None:
+                pool = self.pool.stats()
+                st.caption(f"Connection pool: {pool['open']} open, {pool['idle']} idle, size {pool['size']}")
+                st.caption(f"Prepared statements: {pool['prepared']} cached, {pool['prepared_hits']} reused / {pool['prepared_misses']} prepared")
+            st.caption(f"Statements over {self.stats.slow_threshold_ms} ms are logged to {SLOW_QUERY_LOG}")
+            if st.button("Reset timings"):
+                self.stats.reset()
+
+    # Function to show in the sidebar how current the dashboard rollups are, from the refresher's last run
+    def render_rollup_status(self):
+        if self.refresher is None:
+            return
+        status = self.refresher.status()
+        if status["error"] is not None:
+            st.sidebar.warning(f"Rollup refresh failed: {status['error']}")
+        if status["refreshed_at"] is None:
+            st.sidebar.caption("Rollups: not refreshed yet since the app started.")
+            return
+        age = time.time() - status["refreshed_at"]
+        pending = sum(status["pending"].values())
+        message = f"Rollups refreshed {age:.0f}s ago"
+        if pending:
+            message += f", {pending} writes waiting for a rebuild"
+        if age > ROLLUP_STALE_SECONDS:
+            st.sidebar.warning(message + "; dashboard totals may be stale.")
+        else:
+            st.sidebar.caption(message)
 
     def main(self):
         st.title("Zomato Management and Insights Tool")
 
         # Database connection
-        self.create_connection()
-        if not self.connection:
+        if not self.create_connection():
             st.stop()
+        if self.replica is None:
+            self.replica = get_analytics_replica()
+        if self.live is None:
+            self.live = get_live_aggregates()
+        if self.cube is None:
+            self.cube = get_order_cube()
+        if self.refresher is None:
+            self.refresher = get_rollup_refresher()
+        self.load_query_catalog()
 
         # Sidebar options
         action = st.sidebar.selectbox(
             "Select an action:",
-            ["Add Record", "Update Record", "Delete Record", "Create Table", "Add Column", "View Records", "Data Insights"]
+            ["Add Record", "Update Record", "Delete Record", "Bulk Upload", "Create Table", "Add Column", "View Records", "Data Insights"]
         )
 
+        show_diagnostics = st.sidebar.checkbox("Show query diagnostics")
+
         # Fetch table names dynamically
         table_names = self.fetch_table_names()
 
@@ -131,52 +1392,109 @@ class ZomatoApp:
         if action == "Add Record":
             table_name = st.selectbox("Select the table:", table_names)
             if table_name:
-                columns = self.fetch_table_columns(table_name)
-                form_data = {col: st.text_input(f"Enter value for {col}:") for col in columns}
+                # Generated and AUTO_INCREMENT columns are filled by the server
+                columns = [col for col in self.fetch_column_details(table_name) if not is_server_filled(col)]
+                form_data = {col["name"]: self.column_input(col, f"Enter value for {col['name']}:") for col in columns}
+                # Columns left empty are omitted, so their defaults apply
+                form_data = {col: value for col, value in form_data.items() if value is not None}
 
                 if st.button("Insert Record"):
-                    keys = ", ".join(form_data.keys())
-                    values = ", ".join(["%s"] * len(form_data))
-                    insert_query = f"INSERT INTO {table_name} ({keys}) VALUES ({values})"
-                    if self.execute_query(insert_query, tuple(form_data.values())):
-                        st.success("Record added successfully!")
+                    try:
+                        insert_query, params = build_insert(self.schema_catalog(), table_name, form_data)
+                    except InvalidIdentifierError as e:
+                        st.error(f"Error: {e}")
+                    else:
+                        if self.execute_query(insert_query, params, prepared=True):
+                            st.success("Record added successfully!")
 
         # Update Record
         elif action == "Update Record":
             table_name = st.selectbox("Select the table to update:", table_names)
             if table_name:
-                columns = self.fetch_table_columns(table_name)
+                details = {col["name"]: col for col in self.fetch_column_details(table_name)}
+                columns = list(details)
                 condition_column = st.selectbox("Select condition column:", columns)
-                condition_value = st.text_input(f"Enter value for {condition_column} (condition):")
-                update_column = st.selectbox("Select column to update:", columns)
-                new_value = st.text_input(f"Enter new value for {update_column}:")
+                condition_value = self.column_input(details[condition_column], f"Enter value for {condition_column} (condition):") if condition_column else None
+                update_column = st.selectbox("Select column to update:", [col for col in columns if not is_server_filled(details[col])])
+                new_value = self.column_input(details[update_column], f"Enter new value for {update_column}:") if update_column else None
 
-                if st.button("Update Record"):
-                    update_query = f"UPDATE {table_name} SET {update_column} = %s WHERE {condition_column} = %s"
-                    if self.execute_query(update_query, (new_value, condition_value)):
-                        st.success("Record updated successfully!")
+                # An empty typed condition is None, which the statement builders refuse, so the button waits for a value
+                if condition_value is None:
+                    st.caption("Enter a condition value to update records.")
+                if st.button("Update Record", disabled=condition_value is None):
+                    try:
+                        update_query, params = build_update(self.schema_catalog(), table_name, {update_column: new_value}, {condition_column: condition_value})
+                    except ValueError as e:
+                        st.error(f"Error: {e}")
+                    else:
+                        if self.execute_query(update_query, params, prepared=True):
+                            st.success("Record updated successfully!")
 
         # Delete Record
         elif action == "Delete Record":
             table_name = st.selectbox("Select the table to delete from:", table_names)
             if table_name:
-                columns = self.fetch_table_columns(table_name)
-                condition_column = st.selectbox("Select condition column:", columns)
-                condition_value = st.text_input(f"Enter value for {condition_column} (condition):")
+                details = {col["name"]: col for col in self.fetch_column_details(table_name)}
+                condition_column = st.selectbox("Select condition column:", list(details))
+                condition_value = self.column_input(details[condition_column], f"Enter value for {condition_column} (condition):") if condition_column else None
 
-                if st.button("Delete Record"):
-                    delete_query = f"DELETE FROM {table_name} WHERE {condition_column} = %s"
-                    if self.execute_query(delete_query, (condition_value,)):
-                        st.success("Record deleted successfully!")
+                if condition_value is None:
+                    st.caption("Enter a condition value to delete records.")
+                if st.button("Delete Record", disabled=condition_value is None):
+                    try:
+                        delete_query, params = build_delete(self.schema_catalog(), table_name, {condition_column: condition_value})
+                    except ValueError as e:
+                        st.error(f"Error: {e}")
+                    else:
+                        if self.execute_query(delete_query, params, prepared=True):
+                            st.success("Record deleted successfully!")
+
+        # Bulk Upload
+        elif action == "Bulk Upload":
+            table_name = st.selectbox("Select the table:", table_names)
+            operation = st.radio("Operation:", ["Insert or update (upsert)", "Delete"], horizontal=True)
+            operation = "delete" if operation == "Delete" else "upsert"
+            upload = st.file_uploader("Upload a CSV or Parquet file:", type=["csv", "parquet"])
+            statement_col, transaction_col = st.columns(2)
+            statement_rows = statement_col.number_input("Rows per statement:", min_value=1, value=DEFAULT_STATEMENT_ROWS, step=100)
+            transaction_rows = transaction_col.number_input("Rows per transaction:", min_value=1, value=DEFAULT_TRANSACTION_ROWS, step=1000)
+            if table_name and upload is not None:
+                try:
+                    frame = read_upload(upload, upload.name)
+                except Exception as e:
+                    st.error(f"Could not read the file: {e}")
+                    frame = None
+                if frame is not None:
+                    key_columns = self.fetch_primary_key(table_name)
+                    problems = validate_columns(list(frame.columns), self.fetch_table_columns(table_name), key_columns, operation)
+                    st.caption(f"{len(frame):,} rows, columns: {', '.join(map(str, frame.columns))}")
+                    st.dataframe(frame.head(20), hide_index=True)
+                    for problem in problems:
+                        st.error(problem)
+                    if not problems and not frame.empty and st.button("Apply upload"):
+                        progress = st.progress(0.0)
+                        result = self.bulk_apply(table_name, frame, key_columns, operation, statement_rows, transaction_rows,
+                                                 lambda done, total: progress.progress(done / total))
+                        if result is not None:
+                            st.success(f"Applied {result['applied']:,} of {result['rows']:,} rows in {result['seconds']:.1f}s "
+                                       f"({result['rows_per_sec']:,.0f} rows/sec).")
+                            if result["errors"]:
+                                st.warning(f"{len(result['errors']):,} rows were skipped:")
+                                st.dataframe(pd.DataFrame(result["errors"], columns=["row", "error"]), hide_index=True)
 
         # Create Table
         elif action == "Create Table":
             table_name = st.text_input("Enter the new table name:")
             columns = st.text_area("Define columns (e.g., id INT PRIMARY KEY, name VARCHAR(50)):")
             if st.button("Create Table"):
-                create_query = f"CREATE TABLE {table_name} ({columns})"
-                if self.execute_query(create_query):
-                    st.success(f"Table '{table_name}' created successfully!")
+                try:
+                    create_query = f"CREATE TABLE {quote_identifier(table_name)} ({columns})"
+                except InvalidIdentifierError as e:
+                    st.error(f"Error: {e}")
+                else:
+                    if self.execute_query(create_query):
+                        self.schema_catalog().invalidate()
+                        st.success(f"Table '{table_name}' created successfully!")
 
         # Add Column
         elif action == "Add Column":
@@ -185,106 +1503,329 @@ class ZomatoApp:
                 column_name = st.text_input("Enter the new column name:")
                 column_type = st.text_input("Enter the column type (e.g., VARCHAR(50), INT):")
                 if st.button("Add Column"):
-                    add_query = f"ALTER TABLE {table_name} ADD {column_name} {column_type}"
-                    if self.execute_query(add_query):
-                        st.success(f"Column '{column_name}' added successfully to table '{table_name}'!")
+                    try:
+                        add_query = f"ALTER TABLE {resolve_table(self.schema_catalog(), table_name)} ADD {quote_identifier(column_name)} {column_type}"
+                    except InvalidIdentifierError as e:
+                        st.error(f"Error: {e}")
+                    else:
+                        if self.execute_query(add_query):
+                            self.schema_catalog().invalidate()
+                            st.success(f"Column '{column_name}' added successfully to table '{table_name}'!")
 
         # View Records
         elif action == "View Records":
             table_name = st.selectbox("Select the table:", table_names)
+            page_size = st.selectbox("Rows per page:", [25, 50, 100, 500], index=[25, 50, 100, 500].index(DEFAULT_PAGE_SIZE))
             if table_name:
-                records = self.fetch_data(f"SELECT * FROM {table_name}")
-                if records:
-                    st.write(pd.DataFrame(records))
-                else:
+                # Restart from the first page whenever the table or page size changes
+                state = st.session_state.setdefault("view_records", {})
+                if state.get("table") != table_name or state.get("page_size") != page_size:
+                    state.update(table=table_name, page_size=page_size, anchor=None, backward=False, page=1)
+
+                key_columns = self.fetch_primary_key(table_name)
+                if not key_columns:
+                    st.warning(f"Table '{table_name}' has no primary key; only the first page can be shown.")
+                    state.update(anchor=None, backward=False, page=1)
+
+                page = self.fetch_page(table_name, key_columns, page_size, state["anchor"], state["backward"])
+                if page is not None and page["frame"].empty and state["page"] > 1:
+                    # Rows were deleted under us; fall back to the first page
+                    state.update(anchor=None, backward=False, page=1)
+                    page = self.fetch_page(table_name, key_columns, page_size)
+
+                if page is not None and not page["frame"].empty:
+                    total_rows = self.fetch_estimated_row_count(table_name)
+                    if total_rows is not None:
+                        st.caption(f"Page {state['page']} · about {total_rows:,} rows in total (from table statistics)")
+                    else:
+                        st.caption(f"Page {state['page']}")
+                    st.write(page["frame"])
+
+                    has_previous = state["page"] > 1
+                    has_next = page["has_more"] if not state["backward"] else True
+                    previous_col, next_col = st.columns(2)
+                    previous_col.button(
+                        "Previous page", disabled=not has_previous or not key_columns,
+                        on_click=self.move_page, args=(state, page["first_key"], True, -1)
+                    )
+                    next_col.button(
+                        "Next page", disabled=not has_next or not key_columns,
+                        on_click=self.move_page, args=(state, page["last_key"], False, 1)
+                    )
+                elif page is not None:
                     st.info("No records found in the table.")
 
         # Data Insights
         elif action == "Data Insights":
             st.subheader("Data Insights")
+            self.render_backend_switch()
+            self.render_filter_bar()
+            self.render_rollup_status()
+            self.approximate = st.sidebar.checkbox("Approximate answers", help="Estimate from sampled rows of MySQL, with error bounds that narrow as more are read in the background.")
             insight_option = st.selectbox("Select an insight to view:", [
+                "Overview",
                 "Order Management",
                 "Customer Analytics",
                 "Delivery Optimization",
-                "Restaurant Insights"
+                "Restaurant Insights",
+                "Query Catalog"
             ])
 
+            # All insights at once
+            if insight_option == "Overview":
+                self.render_overview()
+
             # Order Management Insights
-            if insight_option == "Order Management":
-                order_suboption = st.selectbox("Select Order Insight:", ["Peak Ordering Times", "Delayed Deliveries"])
+            elif insight_option == "Order Management":
+                order_suboption = st.selectbox("Select Order Insight:", ["Peak Ordering Times", "Orders Over Time", "Order Pivot", "Delayed Deliveries"])
 
                 if order_suboption == "Peak Ordering Times":
                     data = self.get_peak_order_times()
-                    if data:
-                        df = pd.DataFrame(data)
+                    if data is not None and not data.empty:
+                        df = data
                         st.write("### Peak Ordering Times")
-                        fig = px.bar(df, x="order_hour", y="total_orders", title="Peak Order Times", labels={"order_hour": "Hour of Day", "total_orders": "Number of Orders"})
+                        fig = self.peak_order_times_figure(df)
                         st.plotly_chart(fig)
                     else:
                         st.info("No data available for peak order times.")
 
+                elif order_suboption == "Orders Over Time":
+                    granularity = st.radio("Count orders per:", ["hour", "day"], horizontal=True)
+                    data = self.get_orders_over_time(granularity)
+                    if data is not None and not data.empty:
+                        st.write("### Orders Over Time")
+                        fig = self.orders_over_time_figure(data)
+                        st.plotly_chart(fig)
+                    else:
+                        st.info("No orders found.")
+
+                elif order_suboption == "Order Pivot":
+                    left, right, measure_column = st.columns(3)
+                    rows = left.selectbox("Rows:", CUBE_DIMENSIONS, index=CUBE_DIMENSIONS.index("weekday"))
+                    columns = right.selectbox("Columns:", [d for d in CUBE_DIMENSIONS if d != rows], index=0)
+                    measure = measure_column.selectbox("Measure:", CUBE_MEASURES)
+                    if self.filters.get("period") is not None:
+                        st.info("The order cube has no order dates, so the pivot covers all of them; the other filters apply.")
+                    filters = self.cube_filters(ignore_period=True)
+                    if self.backend == "cube" or self.sync_order_cube() is not None:
+                        started = time.perf_counter()
+                        try:
+                            pivot = self.cube.pivot(rows, columns, filters, measure)
+                        except ValueError as e:
+                            st.error(f"Error: {e}")
+                            pivot = None
+                        elapsed_ms = (time.perf_counter() - started) * 1000
+                        if pivot is not None and not pivot.empty:
+                            names = self.cube.restaurant_names()
+                            labels = {"weekday": lambda value: WEEKDAY_NAMES[value], "restaurant": lambda value: names.get(value, value)}
+                            if rows in labels:
+                                pivot.index = [labels[rows](value) for value in pivot.index]
+                            if columns in labels:
+                                pivot.columns = [labels[columns](value) for value in pivot.columns]
+                            st.write(f"### {measure.title()} by {rows} and {columns}")
+                            st.dataframe(pivot)
+                            st.caption(f"Sliced from the in-memory order cube in {elapsed_ms:.2f} ms")
+                        elif pivot is not None:
+                            st.info("No orders match these filters.")
+                    elif self.cube.too_large is not None:
+                        st.info(f"The order pivot is sliced from the order cube, and the data is too large for it ({self.cube.too_large}).")
+
                 elif order_suboption == "Delayed Deliveries":
                     data = self.get_delayed_deliveries()
-                    if data:
+                    if data is not None and not data.empty:
                         st.write("### Delayed Deliveries")
-                        st.dataframe(pd.DataFrame(data))
+                        st.dataframe(data)
                     else:
                         st.info("No delayed deliveries found.")
 
             # Customer Analytics Insights
             elif insight_option == "Customer Analytics":
-                customer_suboption = st.selectbox("Select Customer Insight:", ["Top Customers", "Customer Preferences"])
+                customer_suboption = st.selectbox("Select Customer Insight:", ["Top Customers", "Customer Preferences", "Item Reach"])
 
                 if customer_suboption == "Top Customers":
                     data = self.get_top_customers()
-                    if data:
-                        df = pd.DataFrame(data)
+                    if data is not None and not data.empty:
+                        df = data
                         st.write("### Top Customers")
-                        fig = px.bar(df, x="name", y="total_orders", title="Top Customers by Total Orders", labels={"name": "Customer Name", "total_orders": "Total Orders"})
+                        fig = self.top_customers_figure(df)
                         st.plotly_chart(fig)
                     else:
                         st.info("No data available for top customers.")
 
                 elif customer_suboption == "Customer Preferences":
-                    data = self.get_customer_preferences()
-                    if data:
-                        df = pd.DataFrame(data)
-                        st.write("### Customer Preferences (Most Ordered Items)")
-                        fig = px.bar(df, x="item_name", y="frequency", title="Most Ordered Items by Customers", labels={"item_name": "Item", "frequency": "Frequency"})
-                        st.plotly_chart(fig)
+                    scope = st.radio("Show preferences for:", ["All customers", "One customer", "Segment"], horizontal=True)
+                    top_k = st.slider("Number of items:", min_value=3, max_value=50, value=DEFAULT_TOP_K)
+
+                    if scope == "All customers" and self.approximate:
+                        def render(result, coverage):
+                            df = result.rename(columns={"value": "item_name", "estimate": "frequency"})
+                            st.write("### Customer Preferences (Most Ordered Items)")
+                            fig = ranked_bar_chart(df, "item_name", "frequency", "Most Ordered Items by Customers", {"item_name": "Item", "frequency": "Frequency"}, "error", top_k)
+                            st.plotly_chart(fig)
+
+                        self.render_approximate(self.approximate_customer_preferences(), render, top_k)
+
+                    elif scope == "All customers":
+                        data = self.get_customer_preferences(top_k)
+                        if data is not None and not data.empty:
+                            df = data
+                            st.write("### Customer Preferences (Most Ordered Items)")
+                            fig = self.items_figure(df, "Most Ordered Items by Customers")
+                            st.plotly_chart(fig)
+                        else:
+                            st.info("No data available for customer preferences.")
+
+                    elif scope == "One customer":
+                        choices = self.get_customer_choices()
+                        if choices is not None and not choices.empty:
+                            labels = {str(customer_id): f"{name} ({str(customer_id)[:8]})" for customer_id, name in zip(choices["customer_id"], choices["name"])}
+                            customer_id = st.selectbox("Select customer:", list(labels), format_func=labels.get)
+                            data = self.get_customer_top_items(top_k, customer_id=customer_id)
+                            if data is not None and not data.empty:
+                                df = data
+                                st.write(f"### Most Ordered Items: {labels[customer_id]}")
+                                fig = self.items_figure(df, "Most Ordered Items")
+                                st.plotly_chart(fig)
+                            else:
+                                st.info("No orders found for this customer.")
+                        else:
+                            st.info("No customers found.")
+
                     else:
-                        st.info("No data available for customer preferences.")
+                        cuisines = self.get_cuisine_choices()
+                        cuisine_options = ["Any"] + ([str(c) for c in cuisines["preferred_cuisine"]] if cuisines is not None else [])
+                        cuisine = st.selectbox("Preferred cuisine:", cuisine_options)
+                        premium = st.selectbox("Membership:", ["Any", "Premium", "Regular"])
+                        segment = {}
+                        if cuisine != "Any":
+                            segment["preferred_cuisine"] = cuisine
+                        if premium != "Any":
+                            segment["is_premium"] = premium == "Premium"
+                        data = self.get_customer_preferences(top_k, segment)
+                        if data is not None and not data.empty:
+                            df = data
+                            st.write("### Customer Preferences (Most Ordered Items in Segment)")
+                            fig = self.items_figure(df, "Most Ordered Items in Segment")
+                            st.plotly_chart(fig)
+                            top_items = self.get_customer_top_items(DEFAULT_TOP_N, segment=segment)
+                            if top_items is not None and not top_items.empty:
+                                st.write(f"Top {DEFAULT_TOP_N} items per customer (heaviest {MAX_DRILLDOWN_ROWS:,} rows)")
+                                st.dataframe(top_items, hide_index=True)
+                        else:
+                            st.info("No data available for this segment.")
+
+                elif customer_suboption == "Item Reach":
+                    top_k = st.slider("Number of items:", min_value=3, max_value=50, value=DEFAULT_TOP_K)
+                    if self.approximate:
+                        def render(result, coverage):
+                            df = result.rename(columns={"group": "item_name", "estimate": "customers"})
+                            st.write("### Item Reach (Distinct Customers)")
+                            st.plotly_chart(self.item_reach_figure(df, top_k, "error"))
+
+                        self.render_approximate(self.approximate_item_reach(), render)
+                    else:
+                        data = self.get_item_reach(top_k)
+                        if data is not None and not data.empty:
+                            st.write("### Item Reach (Distinct Customers)")
+                            st.plotly_chart(self.item_reach_figure(data, top_k))
+                        else:
+                            st.info("No data available for item reach.")
 
             # Delivery Optimization Insights
             elif insight_option == "Delivery Optimization":
-                delivery_suboption = st.selectbox("Select Delivery Insight:", ["Delivery Times and Delays"])
+                delivery_suboption = st.selectbox("Select Delivery Insight:", ["Delivery Times and Delays", "Average Delay by Restaurant", "Predicted Late Deliveries"])
+
+                if delivery_suboption == "Delivery Times and Delays" and self.approximate:
+                    bin_width = st.number_input("Bin width in minutes (0 = automatic):", min_value=0, value=0, step=1)
+
+                    def render(bins, coverage):
+                        width = float(bins.at[0, "bin_end"] - bins.at[0, "bin_start"])
+                        st.write("### Delivery Times and Delays")
+                        fig = self.delay_histogram_figure(bins, percentiles_from_bins(bins), width)
+                        st.plotly_chart(fig)
 
-                if delivery_suboption == "Delivery Times and Delays":
-                    data = self.get_delivery_times()
-                    if data:
-                        df = pd.DataFrame(data)
+                    self.render_approximate(self.approximate_delay_histogram(), render, bin_width or None)
+
+                elif delivery_suboption == "Delivery Times and Delays":
+                    bin_width = st.number_input("Bin width in minutes (0 = automatic):", min_value=0, value=0, step=1)
+                    binning = st.radio("Binning:", ["In database", "Streamed (NumPy)"], horizontal=True)
+                    data = self.get_delivery_delay_histogram(bin_width or None, "sql" if binning == "In database" else "stream")
+                    if data is not None and not data[0].empty:
                         st.write("### Delivery Times and Delays")
-                        fig = px.histogram(df, x="delay", title="Delivery Time Delays", labels={"delay": "Delay in Minutes"})
+                        fig = self.delay_histogram_figure(*data)
                         st.plotly_chart(fig)
                     else:
                         st.info("No data available for delivery delays.")
 
+                elif delivery_suboption == "Average Delay by Restaurant":
+                    top_k = st.slider("Number of restaurants:", min_value=3, max_value=50, value=DEFAULT_TOP_K)
+                    st.caption(f"Restaurants with at least {MIN_RESTAURANT_DELIVERIES} deliveries")
+                    if self.approximate:
+                        def render(result, coverage):
+                            # n counts the sampled deliveries; scaled up, it has to clear the same minimum
+                            ranked = result[result["n"] >= MIN_RESTAURANT_DELIVERIES * coverage]
+                            df = ranked.rename(columns={"group": "name", "mean": "avg_delay"})
+                            st.write("### Average Delay by Restaurant")
+                            st.plotly_chart(self.restaurant_delays_figure(df, top_k, "error"))
+
+                        self.render_approximate(self.approximate_restaurant_delays(), render)
+                    else:
+                        data = self.get_restaurant_delays(top_k)
+                        if data is not None and not data.empty:
+                            st.write("### Average Delay by Restaurant")
+                            st.plotly_chart(self.restaurant_delays_figure(data, top_k))
+                        else:
+                            st.info("No data available for restaurant delays.")
+
+                elif delivery_suboption == "Predicted Late Deliveries":
+                    if st.button("Train a new model"):
+                        with st.spinner("Training the delay model..."):
+                            trained = self.train_delay_model()
+                        if trained is not None:
+                            st.success(f"Saved model {trained.version}.")
+                    model = self.delay_model()
+                    if model is None:
+                        st.info(f"No delay model has been trained yet. Train one here or with `python delay_model.py` (saved to {MODEL_DIR}/).")
+                    else:
+                        info = model.metadata
+                        st.caption(f"Model {model.version}, trained {info['trained_at']} on {info['rows']:,} deliveries. Holdout error "
+                                   f"{info['holdout_mae']:.1f} min on average (always predicting the mean: {info['baseline_mae']:.1f} min).")
+                        threshold = st.number_input("Late if the predicted delay is over (minutes):", min_value=0, value=DEFAULT_LATE_THRESHOLD, step=1)
+                        started = time.perf_counter()
+                        data = self.get_predicted_late_deliveries(threshold)
+                        if data is not None and not data.empty:
+                            late = data[data["late"]]
+                            st.write("### Predicted Late Deliveries")
+                            st.caption(f"{len(late):,} of {len(data):,} pending deliveries predicted late (scored in {time.perf_counter() - started:.2f}s)")
+                            if not late.empty:
+                                st.plotly_chart(self.late_by_restaurant_figure(late))
+                                st.dataframe(late.drop(columns="late").head(MAX_DRILLDOWN_ROWS).round({"predicted_delay": 1}), hide_index=True)
+                            with st.expander("Feature weights"):
+                                st.dataframe(model.importances().round({"weight": 3}), hide_index=True)
+                        elif data is not None:
+                            st.info("No pending deliveries to score.")
+
             # Restaurant Insights
             elif insight_option == "Restaurant Insights":
                 restaurant_suboption = st.selectbox("Select Restaurant Insight:", ["Most Popular Restaurants"])
 
                 if restaurant_suboption == "Most Popular Restaurants":
                     data = self.get_popular_restaurants()
-                    if data:
-                        df = pd.DataFrame(data)
+                    if data is not None and not data.empty:
+                        df = data
                         st.write("### Most Popular Restaurants")
-                        fig = px.bar(df, x="name", y="total_orders", title="Most Popular Restaurants", labels={"name": "Restaurant", "total_orders": "Total Orders"})
+                        fig = self.popular_restaurants_figure(df)
                         st.plotly_chart(fig)
                     else:
                         st.info("No data available for popular restaurants.")
 
-        # Close connection
-        self.connection.close()
+            # Named queries from zomatosqlqueries.txt
+            elif insight_option == "Query Catalog":
+                self.render_query_catalog()
+
+        # Rendered last so the panel includes this run's queries
+        if show_diagnostics:
+            self.render_diagnostics()
 
 if __name__ == "__main__":
     app = ZomatoApp()
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+# Upper bound on bins when the width is picked automatically
+DEFAULT_MAX_BINS = 60
+# Percentile lines drawn over the delay histogram
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+
+# Function to pick a bin width from the value range and count (Sturges' rule, capped at max_bins).
+# Integer data gets an integer width so every bin covers the same number of distinct values.
+def auto_bin_width(low, high, count, max_bins=DEFAULT_MAX_BINS, integer=True):
+    if count <= 0 or low is None or high is None:
+        return 1
+    bins = min(max_bins, math.ceil(math.log2(count)) + 1)
+    width = (high - low) / max(bins, 1)
+    if integer:
+        return max(1, math.ceil(width))
+    return width if width > 0 else 1.0
+
+
+# Function to normalise bin counts into a frame with bin_start, bin_end and count columns
+def bins_frame(bin_starts, counts, width):
+    bin_starts = np.asarray(bin_starts, dtype=float)
+    counts = np.asarray(counts, dtype=np.int64)
+    order = np.argsort(bin_starts)
+    return pd.DataFrame({
+        "bin_start": bin_starts[order],
+        "bin_end": bin_starts[order] + width,
+        "count": counts[order]
+    })
+
+
+# Function to estimate percentiles from bin counts, interpolating linearly inside the bin that holds each rank.
+# The error is at most one bin width.
+def percentiles_from_bins(bins, percentiles=DEFAULT_PERCENTILES):
+    total = int(bins["count"].sum()) if not bins.empty else 0
+    if total == 0:
+        return {}
+    cumulative = np.cumsum(bins["count"].to_numpy())
+    starts = bins["bin_start"].to_numpy()
+    ends = bins["bin_end"].to_numpy()
+    counts = bins["count"].to_numpy()
+    result = {}
+    for percentile in percentiles:
+        rank = percentile / 100 * total
+        i = min(int(np.searchsorted(cumulative, rank, side="left")), len(cumulative) - 1)
+        below = cumulative[i] - counts[i]
+        fraction = (rank - below) / counts[i] if counts[i] else 0.0
+        result[percentile] = float(starts[i] + fraction * (ends[i] - starts[i]))
+    return result
+
+
+# Function to build a histogram from a streamed single-column cursor, one fetchmany() batch at a time.
+# Only the per-bin counts are kept, so memory does not grow with the table.
+def stream_histogram(cursor, width, batch_size=50000):
+    totals = {}
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        values = np.array([row[0] for row in batch], dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            continue
+        bin_ids, counts = np.unique(np.floor(values / width).astype(np.int64), return_counts=True)
+        for bin_id, count in zip(bin_ids.tolist(), counts.tolist()):
+            totals[bin_id] = totals.get(bin_id, 0) + count
+    bin_ids = np.fromiter(totals.keys(), dtype=np.int64, count=len(totals))
+    counts = np.fromiter(totals.values(), dtype=np.int64, count=len(totals))
+    return bins_frame(bin_ids * width, counts, width)
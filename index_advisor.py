@@ -0,0 +1,104 @@
+import argparse
+import sys
+
+import pandas as pd
+from mysql.connector import Error
+
+from db_pool import DB_CONFIG, ConnectionPool
+from encapsulated_streamlit_app import ZomatoApp
+from query_cache import QueryCache
+
+# EXPLAIN access types that read a whole table or a whole index
+FULL_SCAN_TYPES = {"ALL": "full table scan", "index": "full index scan"}
+# EXPLAIN Extra notes that mean extra work beyond the index
+EXTRA_WARNINGS = {"Using filesort": "filesort", "Using temporary": "temporary table"}
+
+
+# Stand-in results for queries whose rows an insight method reads before issuing its next query, keyed by
+# a fragment of the query: the delay histogram needs bounds to go on to its binning query. Every other
+# query gets an empty frame.
+STUB_RESULTS = {
+    "AS low,": lambda: pd.DataFrame({"low": [0.0], "high": [1.0], "total": [1]}),
+    "AS bin_start,": lambda: pd.DataFrame({"bin_start": [], "total": []})
+}
+
+
+# ZomatoApp that records the SQL its insight methods would send instead of running it
+class CapturingApp(ZomatoApp):
+    def __init__(self, pool):
+        super().__init__(pool=pool, cache=QueryCache())
+        self.captured = []
+
+    def fetch_frame(self, query, params=None):
+        self.captured.append((query, params))
+        for fragment, result in STUB_RESULTS.items():
+            if fragment in query:
+                return result()
+        return pd.DataFrame()
+
+
+# Function to collect (method, query, params) for every query the insight methods issue
+def collect_insight_queries(app):
+    queries = []
+    for method_name in app.INSIGHT_METHODS:
+        app.captured = []
+        getattr(app, method_name)()
+        queries.extend((method_name, query, params) for query, params in app.captured)
+    return queries
+
+
+# Function to EXPLAIN one query and list the problems in its plan
+def explain_query(connection, query, params=None):
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("EXPLAIN " + query.strip().rstrip(";"), params)
+    plan = cursor.fetchall()
+    cursor.close()
+    findings = []
+    for step in plan:
+        table = step.get("table") or "-"
+        access = step.get("type")
+        if access in FULL_SCAN_TYPES:
+            findings.append(f"{FULL_SCAN_TYPES[access]} on {table} (~{step.get('rows')} rows)")
+        extra = step.get("Extra") or ""
+        for note, label in EXTRA_WARNINGS.items():
+            if note in extra:
+                findings.append(f"{label} on {table}")
+    return plan, findings
+
+
+# Function to run the advisor over every insight query and print a report; returns the number flagged
+def run_advisor(pool, verbose=False):
+    app = CapturingApp(pool)
+    flagged = 0
+    with pool.connection() as connection:
+        for method_name, query, params in collect_insight_queries(app):
+            try:
+                plan, findings = explain_query(connection, query, params)
+            except Error as e:
+                print(f"[ERROR] {method_name}: {e}")
+                flagged += 1
+                continue
+            status = "WARN" if findings else "OK"
+            print(f"[{status}] {method_name}")
+            for finding in findings:
+                print(f"    - {finding}")
+            if verbose:
+                print("    " + " ".join(query.split()))
+                for step in plan:
+                    print(f"    {step.get('table')}: type={step.get('type')} key={step.get('key')} rows={step.get('rows')} extra={step.get('Extra')}")
+            flagged += bool(findings)
+    return flagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN every ZomatoApp insight query and flag slow plans.")
+    parser.add_argument("--database", default=DB_CONFIG["database"])
+    parser.add_argument("--verbose", action="store_true", help="print the SQL and full plan for each query")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 when any query is flagged")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(size=1, **dict(DB_CONFIG, database=args.database))
+    flagged = run_advisor(pool, args.verbose)
+    pool.close_all()
+    print(f"{flagged} insight quer{'y' if flagged == 1 else 'ies'} flagged.")
+    sys.exit(1 if flagged and args.strict else 0)
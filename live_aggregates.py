@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from change_capture import ChangeGaps, fetch_changes, latest_change, visible_changes
+from histograms import bins_frame
+
+
+# Function to read an hour of day from a datetime, or from the string form change_log stores it in
+def _hour(value):
+    if value is None:
+        return None
+    return pd.Timestamp(value).hour
+
+
+# Function to compute a delivery's delay in minutes (None when either time is missing)
+def _delay(row):
+    if row.get("delivery_time") is None or row.get("estimated_time") is None:
+        return None
+    return int(row["delivery_time"]) - int(row["estimated_time"])
+
+
+# Dashboard aggregates held in process memory and kept current from the change log. load() builds them
+# once with GROUP BY queries; refresh() then applies only the rows changed since the last mark, so a
+# refresh costs in proportion to the change rate rather than the table sizes. Change numbers the mark
+# passes while their transactions are still open are fetched once they commit (see ChangeGaps). Rows bulk
+# loaded with change capture skipped are not seen until the next load().
+class LiveAggregates:
+    def __init__(self, min_interval=2.0):
+        self.min_interval = min_interval
+        self.mark = None
+        self.refreshed_at = 0.0
+        self.changes_applied = 0
+        self._gaps = ChangeGaps()
+        self._orders_by_hour = np.zeros(24, dtype=np.int64)
+        self._orders_by_restaurant = Counter()
+        self._item_counts = Counter()
+        self._delay_counts = Counter()
+        self._lock = threading.Lock()
+        # Serialises refreshes, so two sessions never apply the same changes twice
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.mark is not None
+
+    # Function to build every aggregate from the tables, in one consistent snapshot with the change mark
+    def load(self, connection):
+        cursor = connection.cursor()
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        try:
+            mark = latest_change(connection)
+            gaps = ChangeGaps.at_load(connection, mark)
+            cursor.execute("SELECT HOUR(order_date), COUNT(*) FROM orders WHERE order_date IS NOT NULL GROUP BY HOUR(order_date)")
+            by_hour = np.zeros(24, dtype=np.int64)
+            for hour, count in cursor.fetchall():
+                by_hour[hour] = count
+            cursor.execute("SELECT restaurant_id, COUNT(*) FROM orders WHERE restaurant_id IS NOT NULL GROUP BY restaurant_id")
+            by_restaurant = Counter(dict(cursor.fetchall()))
+            cursor.execute("SELECT dish_name, COUNT(*) FROM orderitems WHERE dish_name IS NOT NULL GROUP BY dish_name")
+            items = Counter(dict(cursor.fetchall()))
+            cursor.execute("SELECT delay_minutes, COUNT(*) FROM deliveries WHERE delay_minutes IS NOT NULL GROUP BY delay_minutes")
+            delays = Counter(dict(cursor.fetchall()))
+        finally:
+            connection.rollback()
+            cursor.close()
+        with self._lock:
+            self._orders_by_hour = by_hour
+            self._orders_by_restaurant = by_restaurant
+            self._item_counts = items
+            self._delay_counts = delays
+            self._gaps = gaps
+            self.mark = mark
+            self.refreshed_at = time.monotonic()
+            self.changes_applied = 0
+
+    # Function to apply the rows changed since the last mark; returns how many rows changed.
+    # Calls within min_interval of the previous refresh return 0 without querying.
+    def refresh(self, connection):
+        with self._refresh_lock:
+            if not self.loaded:
+                self.load(connection)
+                return 0
+            if time.monotonic() - self.refreshed_at < self.min_interval:
+                return 0
+            cursor = connection.cursor()
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            try:
+                latest = latest_change(connection)
+                gaps = self._gaps.pending()
+                changes = {}
+                seen = []
+                if latest > self.mark or gaps:
+                    changes = fetch_changes(connection, self.mark, latest, gaps=gaps)
+                    seen = visible_changes(connection, self.mark, latest, gaps)
+            finally:
+                connection.rollback()
+                cursor.close()
+            changed = 0
+            with self._lock:
+                for table, rows in changes.items():
+                    for old_values, new_row in rows.values():
+                        if old_values is not None:
+                            self._apply(table, old_values, -1)
+                        if new_row is not None:
+                            self._apply(table, new_row, 1)
+                    changed += len(rows)
+                self._gaps.update(self.mark, latest, seen)
+                self.mark = max(self.mark, latest)
+                self.refreshed_at = time.monotonic()
+                self.changes_applied += changed
+            return changed
+
+    # Function to add (sign=1) or remove (sign=-1) one row's contribution to the aggregates
+    def _apply(self, table, row, sign):
+        if table == "Orders":
+            hour = _hour(row.get("order_date"))
+            if hour is not None:
+                self._orders_by_hour[hour] += sign
+            if row.get("restaurant_id") is not None:
+                self._orders_by_restaurant[row["restaurant_id"]] += sign
+        elif table == "OrderItems":
+            if row.get("dish_name") is not None:
+                self._item_counts[row["dish_name"]] += sign
+        elif table == "Deliveries":
+            delay = _delay(row)
+            if delay is not None:
+                self._delay_counts[delay] += sign
+
+    # Function to get orders per hour of day, shaped like the peak order times query
+    def peak_order_times(self):
+        with self._lock:
+            hours = np.flatnonzero(self._orders_by_hour > 0)
+            return pd.DataFrame({"order_hour": hours, "total_orders": self._orders_by_hour[hours]})
+
+    # Function to get the busiest restaurant ids and their order counts
+    def top_restaurants(self, limit):
+        with self._lock:
+            rows = [(restaurant_id, count) for restaurant_id, count in self._orders_by_restaurant.most_common(limit) if count > 0]
+        return pd.DataFrame(rows, columns=["restaurant_id", "total_orders"])
+
+    # Function to get the most ordered items, shaped like the customer preferences query
+    def top_items(self, limit):
+        with self._lock:
+            rows = [(item, count) for item, count in self._item_counts.most_common(limit) if count > 0]
+        return pd.DataFrame(rows, columns=["item_name", "frequency"])
+
+    # Function to get (low, high, count) of the delivery delays
+    def delay_bounds(self):
+        with self._lock:
+            delays = [delay for delay, count in self._delay_counts.items() if count > 0]
+            total = sum(count for count in self._delay_counts.values() if count > 0)
+        if not delays:
+            return None, None, 0
+        return min(delays), max(delays), total
+
+    # Function to bin the delivery delays into bins of the given width
+    def delay_bins(self, width):
+        with self._lock:
+            items = [(delay, count) for delay, count in self._delay_counts.items() if count > 0]
+        if not items:
+            return bins_frame([], [], width)
+        delays = np.array([delay for delay, _ in items], dtype=float)
+        counts = np.array([count for _, count in items], dtype=np.int64)
+        bin_ids, inverse = np.unique(np.floor(delays / width).astype(np.int64), return_inverse=True)
+        return bins_frame(bin_ids * width, np.bincount(inverse, weights=counts).astype(np.int64), width)
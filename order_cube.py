@@ -0,0 +1,348 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from change_capture import ChangeGaps, fetch_changes, latest_change, visible_changes
+
+# Axes of the cube, in array order. Cuisine is not an axis: it is looked up from the restaurant.
+AXES = ("restaurant", "hour", "weekday", "payment_mode", "status")
+# Dimensions a slice can group or filter by
+DIMENSIONS = AXES + ("cuisine",)
+# Measures kept per cell
+MEASURES = ("orders", "revenue")
+# WEEKDAY() numbering, Monday first
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# Default upper bound on cells (restaurants x 24 x 7 x payment modes x statuses); the two measures take
+# 16 bytes a cell, so 256 MB at this size, about 10k restaurants with 3 payment modes and 3 statuses.
+# Pass max_cells to allow more. A dataset past the bound marks the cube unavailable, and is left to SQL.
+MAX_CUBE_CELLS = 16_000_000
+# Order columns holding each dictionary-encoded axis
+_AXIS_COLUMNS = {"restaurant": "restaurant_id", "payment_mode": "payment_mode", "status": "status"}
+
+# Order counts and revenue per cell, aggregated by the database for the initial load
+CUBE_QUERY = """
+    SELECT restaurant_id, HOUR(order_date), WEEKDAY(order_date), payment_mode, status, COUNT(*), SUM(total_amount)
+    FROM orders
+    WHERE order_date IS NOT NULL
+    GROUP BY restaurant_id, HOUR(order_date), WEEKDAY(order_date), payment_mode, status
+"""
+
+
+class CubeTooLargeError(ValueError):
+    pass
+
+
+# Order counts and revenue held as dense NumPy arrays over dictionary-encoded dimensions: restaurant,
+# hour of day, weekday, payment mode and status (cuisine comes from the restaurant). load() builds it
+# with one GROUP BY; refresh() then applies the orders changed since (from the change log), so any
+# slice is an array reduction rather than a database query. Change numbers the mark passes while their
+# transactions are still open are fetched once they commit (see ChangeGaps). Orders without an
+# order_date are left out, and restaurant names and cuisines are read at load (or when a new restaurant
+# first appears).
+class OrderCube:
+    def __init__(self, min_interval=2.0, max_cells=MAX_CUBE_CELLS):
+        self.min_interval = min_interval
+        self.max_cells = max_cells
+        self.mark = None
+        self.refreshed_at = 0.0
+        self.changes_applied = 0
+        # Why the cube cannot be built within max_cells (None while it can); set, load and refresh raise it
+        # at once instead of querying again
+        self.too_large = None
+        self._gaps = ChangeGaps()
+        self._members = {axis: [] for axis in ("restaurant", "payment_mode", "status")}
+        self._codes = {axis: {} for axis in self._members}
+        self._cuisines = []
+        self._cuisine_codes = {}
+        # Cuisine code of each restaurant code, and restaurant names by id
+        self._cuisine_of = np.zeros(0, dtype=np.int64)
+        self._names = {}
+        self._orders = np.zeros((0, 24, 7, 0, 0), dtype=np.int64)
+        self._revenue = np.zeros((0, 24, 7, 0, 0), dtype=np.float64)
+        self._lock = threading.Lock()
+        # Serialises refreshes, so two sessions never apply the same changes twice
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.mark is not None
+
+    # Function to report the cube's shape and memory use
+    def stats(self):
+        with self._lock:
+            return {"shape": self._orders.shape, "cells": self._orders.size, "bytes": self._orders.nbytes + self._revenue.nbytes}
+
+    # Function to get the code of a dimension value, adding it (and growing the arrays) if it is new
+    def _code(self, axis, value):
+        codes = self._codes[axis]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._members[axis])
+            self._members[axis].append(value)
+            self._grow(AXES.index(axis), code + 1)
+            if axis == "restaurant":
+                self._cuisine_of = np.append(self._cuisine_of, self._cuisine_code(None))
+        return code
+
+    # Function to get the code of a cuisine, adding it if it is new
+    def _cuisine_code(self, cuisine):
+        code = self._cuisine_codes.get(cuisine)
+        if code is None:
+            code = self._cuisine_codes[cuisine] = len(self._cuisines)
+            self._cuisines.append(cuisine)
+        return code
+
+    # Function to raise CubeTooLargeError for a shape past max_cells
+    def _check_cells(self, shape):
+        if int(np.prod(shape)) > self.max_cells:
+            raise CubeTooLargeError(f"The order cube would need {int(np.prod(shape)):,} cells (limit {self.max_cells:,})")
+
+    # Function to check, before any change is applied, that the values new to the axes still fit in max_cells
+    def _check_growth(self, rows):
+        shape = list(self._orders.shape)
+        for axis, column in _AXIS_COLUMNS.items():
+            values = {row.get(column) for row in rows if row.get("order_date") is not None}
+            shape[AXES.index(axis)] = max(shape[AXES.index(axis)], len(self._members[axis]) + len(values - set(self._codes[axis])))
+        self._check_cells(shape)
+
+    # Function to give up on the cube after CubeTooLargeError: the arrays are freed, and load and refresh
+    # raise the error again without querying
+    def _give_up(self, error):
+        with self._lock:
+            self.too_large = str(error)
+            self.mark = None
+            self._orders = np.zeros((0, 24, 7, 0, 0), dtype=np.int64)
+            self._revenue = np.zeros((0, 24, 7, 0, 0), dtype=np.float64)
+
+    # Function to extend the arrays along an axis with empty cells
+    def _grow(self, axis, size):
+        if self._orders.shape[axis] >= size:
+            return
+        shape = list(self._orders.shape)
+        shape[axis] = size
+        self._check_cells(shape)
+        pad = [(0, 0)] * len(shape)
+        pad[axis] = (0, size - self._orders.shape[axis])
+        self._orders = np.pad(self._orders, pad)
+        self._revenue = np.pad(self._revenue, pad)
+
+    # Function to record restaurants' names and cuisines from (restaurant_id, name, cuisine_type) rows
+    def _describe_restaurants(self, rows):
+        for restaurant_id, name, cuisine in rows:
+            code = self._code("restaurant", restaurant_id)
+            self._cuisine_of[code] = self._cuisine_code(cuisine)
+            self._names[restaurant_id] = name
+
+    # Function to build the cube from the tables, in one consistent snapshot with the change mark
+    def load(self, connection):
+        if self.too_large is not None:
+            raise CubeTooLargeError(self.too_large)
+        cursor = connection.cursor()
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        try:
+            mark = latest_change(connection)
+            gaps = ChangeGaps.at_load(connection, mark)
+            cursor.execute("SELECT restaurant_id, name, cuisine_type FROM restaurants")
+            restaurants = cursor.fetchall()
+            cursor.execute(CUBE_QUERY)
+            cells = cursor.fetchall()
+        finally:
+            connection.rollback()
+            cursor.close()
+
+        cube = OrderCube(self.min_interval, self.max_cells)
+        # Size the axes up front, so the arrays are allocated once rather than grown value by value
+        for axis, position in (("payment_mode", 3), ("status", 4)):
+            for value in sorted({cell[position] for cell in cells}, key=str):
+                cube._members[axis].append(value)
+                cube._codes[axis][value] = len(cube._members[axis]) - 1
+        restaurant_ids = [row[0] for row in restaurants] + sorted({cell[0] for cell in cells} - {row[0] for row in restaurants}, key=str)
+        for restaurant_id in restaurant_ids:
+            cube._members["restaurant"].append(restaurant_id)
+            cube._codes["restaurant"][restaurant_id] = len(cube._members["restaurant"]) - 1
+        cube._cuisine_of = np.full(len(restaurant_ids), cube._cuisine_code(None), dtype=np.int64)
+        shape = (len(restaurant_ids), 24, 7, len(cube._members["payment_mode"]), len(cube._members["status"]))
+        try:
+            self._check_cells(shape)
+        except CubeTooLargeError as e:
+            self._give_up(e)
+            raise
+        cube._orders = np.zeros(shape, dtype=np.int64)
+        cube._revenue = np.zeros(shape, dtype=np.float64)
+        cube._describe_restaurants(restaurants)
+        if cells:
+            index = tuple(
+                np.array([cube._codes[axis][cell[position]] for cell in cells], dtype=np.int64) if axis in cube._codes
+                else np.array([cell[position] for cell in cells], dtype=np.int64)
+                for position, axis in enumerate(AXES)
+            )
+            np.add.at(cube._orders, index, np.array([cell[5] for cell in cells], dtype=np.int64))
+            np.add.at(cube._revenue, index, np.array([float(cell[6] or 0) for cell in cells]))
+
+        with self._lock:
+            self._members, self._codes = cube._members, cube._codes
+            self._cuisines, self._cuisine_codes = cube._cuisines, cube._cuisine_codes
+            self._cuisine_of, self._names = cube._cuisine_of, cube._names
+            self._orders, self._revenue = cube._orders, cube._revenue
+            self._gaps = gaps
+            self.mark = mark
+            self.refreshed_at = time.monotonic()
+            self.changes_applied = 0
+
+    # Function to apply the orders changed since the last mark; returns how many changed.
+    # Calls within min_interval of the previous refresh return 0 without querying. The changes are
+    # checked against max_cells before any is applied, so a refresh that would not fit changes nothing.
+    def refresh(self, connection):
+        with self._refresh_lock:
+            if self.too_large is not None:
+                raise CubeTooLargeError(self.too_large)
+            if not self.loaded:
+                self.load(connection)
+                return 0
+            if time.monotonic() - self.refreshed_at < self.min_interval:
+                return 0
+            cursor = connection.cursor()
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            try:
+                latest = latest_change(connection)
+                gaps = self._gaps.pending()
+                changes = {}
+                seen = []
+                if latest > self.mark or gaps:
+                    changes = fetch_changes(connection, self.mark, latest, tables=["Orders"], gaps=gaps).get("Orders", {})
+                    seen = visible_changes(connection, self.mark, latest, gaps)
+                new_ids = {row["restaurant_id"] for _, row in changes.values() if row is not None} - set(self._codes["restaurant"])
+                restaurants = []
+                if new_ids:
+                    cursor.execute(f"SELECT restaurant_id, name, cuisine_type FROM restaurants WHERE restaurant_id IN ({', '.join(['%s'] * len(new_ids))})", tuple(new_ids))
+                    restaurants = cursor.fetchall()
+            finally:
+                connection.rollback()
+                cursor.close()
+            try:
+                self._check_growth([row for pair in changes.values() for row in pair if row is not None])
+            except CubeTooLargeError as e:
+                self._give_up(e)
+                raise
+            with self._lock:
+                self._describe_restaurants(restaurants)
+                for old_values, new_row in changes.values():
+                    if old_values is not None:
+                        self._apply(old_values, -1)
+                    if new_row is not None:
+                        self._apply(new_row, 1)
+                self._gaps.update(self.mark, latest, seen)
+                self.mark = max(self.mark, latest)
+                self.refreshed_at = time.monotonic()
+                self.changes_applied += len(changes)
+            return len(changes)
+
+    # Function to add (sign=1) or remove (sign=-1) one order's contribution
+    def _apply(self, row, sign):
+        if row.get("order_date") is None:
+            return
+        order_date = pd.Timestamp(row["order_date"])
+        cell = (
+            self._code("restaurant", row.get("restaurant_id")),
+            order_date.hour,
+            order_date.weekday(),
+            self._code("payment_mode", row.get("payment_mode")),
+            self._code("status", row.get("status"))
+        )
+        self._orders[cell] += sign
+        self._revenue[cell] += sign * float(row.get("total_amount") or 0)
+
+    # Function to turn {dimension: value or list of values} into the kept positions along each axis
+    def _selection(self, filters):
+        selected = {}
+        for dimension, value in (filters or {}).items():
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown cube dimension: {dimension}")
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if dimension == "cuisine":
+                codes = [self._cuisine_codes[v] for v in values if v in self._cuisine_codes]
+                positions = np.flatnonzero(np.isin(self._cuisine_of, codes))
+                dimension = "restaurant"
+            elif dimension in self._codes:
+                positions = np.array(sorted(self._codes[dimension][v] for v in values if v in self._codes[dimension]), dtype=np.int64)
+            else:
+                positions = np.array(sorted(int(v) for v in values), dtype=np.int64)
+            if dimension in selected:
+                positions = np.intersect1d(selected[dimension], positions)
+            selected[dimension] = positions
+        return selected
+
+    # Function to sum a measure over the filtered cells, grouped by the given dimensions. Returns a
+    # frame with one column per dimension (restaurant ids, hours, weekday numbers, ...) and the measure,
+    # leaving out empty groups.
+    def slice(self, by=(), filters=None, measure="orders"):
+        by = list(by)
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown measure: {measure}")
+        if "restaurant" in by and "cuisine" in by:
+            raise ValueError("Group by restaurant or by cuisine, not both")
+        for dimension in by:
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown cube dimension: {dimension}")
+        with self._lock:
+            array = self._orders if measure == "orders" else self._revenue
+            labels = {
+                "restaurant": np.array(self._members["restaurant"], dtype=object),
+                "hour": np.arange(24),
+                "weekday": np.arange(7),
+                "payment_mode": np.array(self._members["payment_mode"], dtype=object),
+                "status": np.array(self._members["status"], dtype=object)
+            }
+            cuisine_of = self._cuisine_of
+            for axis, positions in self._selection(filters).items():
+                array = np.take(array, positions, axis=AXES.index(axis))
+                labels[axis] = labels[axis][positions]
+                if axis == "restaurant":
+                    cuisine_of = cuisine_of[positions]
+            cuisines = np.array(self._cuisines, dtype=object)
+
+        kept = [axis for axis in AXES if axis in by or (axis == "restaurant" and "cuisine" in by)]
+        array = array.sum(axis=tuple(AXES.index(axis) for axis in AXES if axis not in kept))
+        if "cuisine" in by:
+            # Fold the restaurant axis into cuisines
+            folded = np.zeros((len(cuisines),) + array.shape[1:], dtype=array.dtype)
+            np.add.at(folded, cuisine_of, array)
+            array = folded
+            kept[0] = "cuisine"
+            labels["cuisine"] = cuisines
+        if not kept:
+            return pd.DataFrame({measure: [array.item()]})
+
+        grids = np.meshgrid(*[np.arange(size) for size in array.shape], indexing="ij")
+        values = array.ravel()
+        nonzero = values != 0
+        frame = pd.DataFrame({axis: labels[axis][grid.ravel()[nonzero]] for axis, grid in zip(kept, grids)})
+        frame[measure] = values[nonzero]
+        return frame[by + [measure]]
+
+    # Function to pivot a measure by one dimension down and another across
+    def pivot(self, rows, columns, filters=None, measure="orders"):
+        frame = self.slice([rows, columns], filters, measure)
+        if frame.empty:
+            return pd.DataFrame()
+        return frame.pivot_table(index=rows, columns=columns, values=measure, aggfunc="sum", fill_value=0)
+
+    # Function to get orders per hour of day, shaped like the peak order times query
+    def peak_order_times(self, filters=None):
+        frame = self.slice(["hour"], filters).sort_values("hour", ignore_index=True)
+        return frame.rename(columns={"hour": "order_hour", "orders": "total_orders"})
+
+    # Function to get the busiest restaurants, shaped like the popular restaurants query (by name)
+    def top_restaurants(self, limit, filters=None):
+        frame = self.slice(["restaurant"], filters)
+        with self._lock:
+            frame["name"] = [self._names.get(restaurant_id, restaurant_id) for restaurant_id in frame["restaurant"]]
+        frame = frame.groupby("name", as_index=False, dropna=False)["orders"].sum()
+        return frame.nlargest(limit, "orders").rename(columns={"orders": "total_orders"}).reset_index(drop=True)
+
+    # Function to get restaurant names by id
+    def restaurant_names(self):
+        with self._lock:
+            return dict(self._names)
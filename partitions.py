@@ -0,0 +1,151 @@
+import argparse
+import datetime
+
+import mysql.connector
+
+from db_pool import DB_CONFIG
+from rollups import rebuild_rollups
+
+# Tables range-partitioned by month of order_date when created with `python dbsetup3.py --partition`.
+# OrderItems and Deliveries carry their order's order_date, so a month of all three drops together.
+PARTITIONED_TABLES = ["OrderItems", "Deliveries", "Orders"]
+# Months of empty partitions kept ready ahead of the current one
+PARTITION_MONTHS_AHEAD = 3
+# Months of order history kept; older partitions are dropped or archived by the maintenance command
+PARTITION_RETENTION_MONTHS = 24
+# Catch-all for dates past the newest month, so inserts never fail; new months are split off it
+OVERFLOW_PARTITION = "pmax"
+
+
+# Function to get the first day of a date's month, moved by a number of months
+def month_start(day, months=0):
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+# Function to name the partition holding a month
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+
+# Function to build the definitions of the monthly partitions from first_month to last_month, each
+# holding order dates before the first of the following month (the first one also holds everything older)
+def _month_definitions(first_month, last_month):
+    definitions = []
+    month = first_month
+    while month <= last_month:
+        definitions.append(f"PARTITION {partition_name(month)} VALUES LESS THAN ('{month_start(month, 1):%Y-%m-%d}')")
+        month = month_start(month, 1)
+    return definitions
+
+
+# Function to build the PARTITION BY clause for a new fact table: a month per partition from
+# months_back months ago to months_ahead months from now, plus the overflow partition
+def partition_clause(months_back=PARTITION_RETENTION_MONTHS, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    current = month_start(today or datetime.date.today())
+    definitions = _month_definitions(month_start(current, -months_back), month_start(current, months_ahead))
+    definitions.append(f"PARTITION {OVERFLOW_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return "PARTITION BY RANGE COLUMNS(order_date) (\n        " + ",\n        ".join(definitions) + "\n    )"
+
+
+# Function to build a date range condition MySQL can prune partitions with: the bare column compared
+# with constants, end exclusive (a function of the column, like DATE(order_date), scans every partition)
+def date_range_condition(column, start, end):
+    return f"{column} >= %s AND {column} < %s", (start, end)
+
+
+# Function to list a table's partitions in order as (name, upper bound, estimated rows); the overflow
+# partition's bound is None. An empty list means the table is not partitioned.
+def list_partitions(connection, table):
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    partitions = []
+    for name, description, rows in cursor.fetchall():
+        bound = None if description == "MAXVALUE" else datetime.date.fromisoformat(description.strip("'")[:10])
+        partitions.append((name, bound, rows))
+    cursor.close()
+    return partitions
+
+
+# Function to split partitions for the coming months off the overflow partition, up to months_ahead
+# months from now. The overflow partition is normally empty, so this only changes metadata.
+# Returns {table: [partitions added]}.
+def add_future_partitions(connection, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    last_month = month_start(month_start(today or datetime.date.today()), months_ahead)
+    added = {}
+    cursor = connection.cursor()
+    for table in PARTITIONED_TABLES:
+        bounds = [bound for _, bound, _ in list_partitions(connection, table) if bound is not None]
+        if not bounds:
+            continue
+        definitions = _month_definitions(max(bounds), last_month)
+        if not definitions:
+            continue
+        cursor.execute(f"""
+            ALTER TABLE {table} REORGANIZE PARTITION {OVERFLOW_PARTITION} INTO (
+                {", ".join(definitions)},
+                PARTITION {OVERFLOW_PARTITION} VALUES LESS THAN (MAXVALUE)
+            )
+        """)
+        added[table] = [definition.split()[1] for definition in definitions]
+    cursor.close()
+    return added
+
+
+# Function to remove the partitions whose months are all older than retention_months. Dropping a
+# partition is instant, unlike a DELETE of the same rows. With archive, each partition's rows are
+# first swapped out (EXCHANGE PARTITION) into a plain table named {table}_archive_{partition}.
+# No triggers fire, so the change log does not see the removed rows. Returns {table: [partitions removed]}.
+def expire_partitions(connection, retention_months=PARTITION_RETENTION_MONTHS, archive=False, today=None):
+    cutoff = month_start(month_start(today or datetime.date.today()), -retention_months)
+    expired = {}
+    cursor = connection.cursor()
+    for table in PARTITIONED_TABLES:
+        names = [name for name, bound, _ in list_partitions(connection, table) if bound is not None and bound <= cutoff]
+        for name in names:
+            if archive:
+                archive_table = f"{table.lower()}_archive_{name}"
+                cursor.execute(f"CREATE TABLE {archive_table} LIKE {table}")
+                cursor.execute(f"ALTER TABLE {archive_table} REMOVE PARTITIONING")
+                cursor.execute(f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {archive_table}")
+            cursor.execute(f"ALTER TABLE {table} DROP PARTITION {name}")
+        if names:
+            expired[table] = names
+    cursor.close()
+    return expired
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the monthly order_date partitions.")
+    parser.add_argument("--ahead", type=int, default=PARTITION_MONTHS_AHEAD, help="months of partitions to keep ready")
+    parser.add_argument("--retention-months", type=int, default=PARTITION_RETENTION_MONTHS)
+    expiry = parser.add_mutually_exclusive_group()
+    expiry.add_argument("--drop-expired", action="store_true", help="drop partitions older than --retention-months")
+    expiry.add_argument("--archive-expired", action="store_true", help="move them into archive tables, then drop them")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        for table, names in add_future_partitions(conn, args.ahead).items():
+            print(f"Added {', '.join(names)} to {table}")
+        if args.drop_expired or args.archive_expired:
+            expired = expire_partitions(conn, args.retention_months, archive=args.archive_expired)
+            for table, names in expired.items():
+                print(f"{'Archived' if args.archive_expired else 'Dropped'} {', '.join(names)} from {table}")
+            if expired:
+                # The rollups count every order ever loaded; the replica and live aggregates need a full refresh too
+                print("Rebuilding rollup tables...")
+                rebuild_rollups(conn)
+        for table in PARTITIONED_TABLES:
+            partitions = list_partitions(conn, table)
+            if not partitions:
+                print(f"{table} is not partitioned")
+                continue
+            print(f"{table}: {len(partitions)} partitions, {partitions[0][0]} to {partitions[-1][0]}, ~{sum(rows or 0 for _, _, rows in partitions):,} rows")
+    finally:
+        conn.close()
@@ -0,0 +1,170 @@
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Tables a query reads from (FROM / JOIN targets)
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+
+# Table a statement writes to (data changes and schema changes)
+_WRITE_TABLE = re.compile(
+    r"^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE(?:\s+IGNORE)?|DELETE\s+FROM"
+    r"|ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|TRUNCATE(?:\s+TABLE)?"
+    r"|CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?|LOAD\s+DATA\s+(?:LOCAL\s+)?INFILE\s+'[^']*'\s+(?:REPLACE\s+|IGNORE\s+)?INTO\s+TABLE)"
+    r"\s+`?(\w+)`?",
+    re.IGNORECASE
+)
+
+# Misses each thread keeps waiting for their put; past this the oldest are forgotten (their put is then
+# accepted without the invalidation check), so misses that are never put cannot pile up on long-lived threads
+MAX_PENDING_MISSES = 256
+
+
+# Function to find the tables a SELECT depends on (lower-cased, MySQL names are case-insensitive here)
+def read_tables(query):
+    return {name.lower() for name in _READ_TABLES.findall(query)}
+
+
+# Function to find the table a write statement changes, or None for reads
+def write_table(query):
+    match = _WRITE_TABLE.match(query)
+    return match.group(1).lower() if match else None
+
+
+# Function to roughly size a cached result so the cache can stay under its memory bound
+def estimate_size(value):
+    if hasattr(value, "memory_usage"):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, list):
+        size = sys.getsizeof(value)
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, dict):
+                size += sum(sys.getsizeof(v) for v in row.values())
+        return size
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    def __init__(self, ttl=300, max_bytes=256 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Invalidation generation per table (and of clear()); a miss records those of the tables its
+        # query reads, per thread, so a result read across a write is not put back after the write
+        self._generations = {}
+        self._epoch = 0
+        self._misses_seen = threading.local()
+
+    # Cache key: SQL text with whitespace collapsed plus the bound parameters
+    @staticmethod
+    def make_key(query, params=None):
+        return " ".join(query.split()), repr(params)
+
+    # Caller must hold the lock
+    def _generation(self, tables):
+        return self._epoch, tuple(self._generations.get(table, 0) for table in sorted(tables))
+
+    # Function to note a miss, with the generations the result has to be put back under
+    def _record_miss(self, key, query):
+        self.misses += 1
+        if not hasattr(self._misses_seen, "keys"):
+            self._misses_seen.keys = OrderedDict()
+        pending = self._misses_seen.keys
+        pending.pop(key, None)
+        pending[key] = self._generation(read_tables(query))
+        while len(pending) > MAX_PENDING_MISSES:
+            pending.popitem(last=False)
+
+    # Function to look up a result; returns (hit, value)
+    def get(self, query, params=None):
+        key = self.make_key(query, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._record_miss(key, query)
+                return False, None
+            value, expires_at, _, _ = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                self._record_miss(key, query)
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    # Function to store a result, evicting least recently used entries past the memory bound. A result
+    # whose tables were invalidated since this thread's miss on it is dropped: it may predate the write.
+    def put(self, query, params, value):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        key = self.make_key(query, params)
+        tables = read_tables(query)
+        seen = getattr(self._misses_seen, "keys", {}).pop(key, None)
+        with self._lock:
+            if seen is not None and seen != self._generation(tables):
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, size, tables)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    # Function to forget this thread's miss on a result that will not be put (its fetch failed)
+    def abandon(self, query, params=None):
+        getattr(self._misses_seen, "keys", {}).pop(self.make_key(query, params), None)
+
+    # Function to drop every entry that reads from the given tables
+    def invalidate_tables(self, tables):
+        dropped = 0
+        with self._lock:
+            for table in tables:
+                self._generations[table.lower()] = self._generations.get(table.lower(), 0) + 1
+                for key in list(self._by_table.get(table.lower(), ())):
+                    self._drop(key)
+                    dropped += 1
+        return dropped
+
+    # Function to drop the entries a write statement makes stale
+    def invalidate_for_write(self, query):
+        table = write_table(query)
+        if table is None:
+            return 0
+        return self.invalidate_tables([table])
+
+    # Function to empty the whole cache
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    # Function to report cache usage
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    # Caller must hold the lock
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, _, size, tables = entry
+        self._bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
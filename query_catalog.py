@@ -0,0 +1,235 @@
+import argparse
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from mysql.connector import Error
+
+from columnar import read_frame
+from db_pool import DB_CONFIG, ConnectionPool
+from query_cache import estimate_size
+
+# Named analytical queries: a numbered title line, a "-- name: <name>" line, then the SQL up to a blank line
+QUERY_FILE = "zomatosqlqueries.txt"
+# Rows a catalog query returns at most; queries without a LIMIT of their own get this one
+MAX_CATALOG_ROWS = 10_000
+# Catalog queries run concurrently on at most this many threads (each borrows its own pooled connection)
+CATALOG_WORKERS = 4
+
+_TITLE = re.compile(r"^(\d+)\.\s+(.*?):?\s*$")
+_NAME = re.compile(r"^--\s*name:\s*(\w+)\s*$")
+_PARAMETER = re.compile(r"%\((\w+)\)s")
+_LIMIT = re.compile(r"\bLIMIT\s+\d+\s*$", re.IGNORECASE)
+
+
+class QueryCatalogError(ValueError):
+    pass
+
+
+# Function to parse the query file into {name: {"number", "title", "sql", "params"}}, in file order.
+# params lists the %(name)s parameters a query needs, besides the row limit.
+def parse_queries(text):
+    queries = {}
+    entry = None
+
+    def finish():
+        if entry is None:
+            return
+        if not entry["name"] or not entry["lines"]:
+            raise QueryCatalogError(f"Query {entry['number']} ({entry['title']}) needs a '-- name:' line and SQL")
+        if entry["name"] in queries:
+            raise QueryCatalogError(f"Query name {entry['name']!r} is used twice")
+        sql = "\n".join(entry["lines"]).strip().rstrip(";").strip()
+        queries[entry["name"]] = {
+            "number": entry["number"],
+            "title": entry["title"],
+            "sql": sql,
+            "params": list(dict.fromkeys(_PARAMETER.findall(sql)))
+        }
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        title = _TITLE.match(stripped)
+        if title and not line[:1].isspace():
+            finish()
+            entry = {"number": int(title.group(1)), "title": title.group(2), "name": None, "lines": []}
+            continue
+        if entry is None or not stripped:
+            continue
+        name = _NAME.match(stripped)
+        if name and entry["name"] is None and not entry["lines"]:
+            entry["name"] = name.group(1)
+        else:
+            entry["lines"].append(stripped)
+    finish()
+    return queries
+
+
+# Function to read and parse the query file
+def load_queries(path=QUERY_FILE):
+    with open(path, encoding="utf-8") as handle:
+        return parse_queries(handle.read())
+
+
+# Function to cap a query at max_rows with a bound LIMIT, unless it has a LIMIT of its own;
+# returns (sql, limited)
+def bounded_sql(sql, max_rows=MAX_CATALOG_ROWS):
+    if _LIMIT.search(sql):
+        return sql, False
+    return f"{sql}\nLIMIT %(row_limit)s", True
+
+
+# Function to bind a query's parameters: the ones it needs from params (missing ones are None) and the row limit
+def bind_params(query, params=None, max_rows=MAX_CATALOG_ROWS):
+    bound = {name: (params or {}).get(name) for name in query["params"]}
+    bound["row_limit"] = int(max_rows)
+    return bound
+
+
+# The named queries of the query file, checked against the live schema once (validate() runs EXPLAIN on
+# each, so a renamed column or table shows up at startup instead of when someone opens the query) and
+# run in parallel through a result cache, each with its own timing
+class QueryCatalog:
+    def __init__(self, queries, cache=None, stats=None, max_rows=MAX_CATALOG_ROWS):
+        self.queries = queries
+        self.cache = cache
+        self.stats = stats
+        self.max_rows = max_rows
+        # {name: error message} from the last validate(); None until it has run
+        self.errors = None
+        self.validated_at = None
+
+    @classmethod
+    def load(cls, path=QUERY_FILE, **kwargs):
+        return cls(load_queries(path), **kwargs)
+
+    # Function to list the queries that passed validation (all of them before validate() has run)
+    @property
+    def valid(self):
+        return [name for name in self.queries if not self.errors or name not in self.errors]
+
+    # Function to EXPLAIN every query on one pooled connection (parameters bound as NULL) and record
+    # which ones the server rejects. Returns {name: error message}.
+    def validate(self, pool):
+        errors = {}
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            for name, query in self.queries.items():
+                sql, _ = bounded_sql(query["sql"], self.max_rows)
+                try:
+                    cursor.execute("EXPLAIN " + sql, bind_params(query, max_rows=1))
+                    cursor.fetchall()
+                except Error as e:
+                    errors[name] = e.msg if getattr(e, "msg", None) else str(e)
+            cursor.close()
+        self.errors = errors
+        self.validated_at = time.time()
+        return errors
+
+    # Function to run one query through the result cache; returns {"frame", "rows", "seconds", "cached",
+    # "truncated", "error"}. Meant for worker threads: errors are returned, not shown.
+    def run_one(self, pool, name, params=None):
+        query = self.queries[name]
+        sql, limited = bounded_sql(query["sql"], self.max_rows)
+        bound = bind_params(query, params, self.max_rows)
+        cache_params = tuple(sorted(bound.items()))
+        started = time.perf_counter()
+        if self.cache is not None:
+            hit, frame = self.cache.get(sql, cache_params)
+            if hit:
+                return {"frame": frame, "rows": len(frame), "seconds": time.perf_counter() - started, "cached": True,
+                        "truncated": limited and len(frame) >= self.max_rows, "error": None}
+        frame = None
+        error = None
+        try:
+            with pool.connection() as connection:
+                cursor = connection.cursor(buffered=False)
+                cursor.execute(sql, bound)
+                frame = read_frame(cursor)
+                cursor.close()
+            if self.cache is not None:
+                self.cache.put(sql, cache_params, frame)
+        except Error as e:
+            error = str(e)
+            if self.cache is not None:
+                self.cache.abandon(sql, cache_params)
+        seconds = time.perf_counter() - started
+        rows = len(frame) if frame is not None else 0
+        if self.stats is not None:
+            received = estimate_size(frame) if frame is not None else 0
+            self.stats.record(sql, seconds, rows, received, kind="catalog", ok=error is None)
+        return {"frame": frame, "rows": rows, "seconds": seconds, "cached": False,
+                "truncated": limited and rows >= self.max_rows, "error": error}
+
+    # Function to run the named queries concurrently on executor (or a pool of CATALOG_WORKERS threads),
+    # calling on_result(name, result) as each finishes. Queries that failed validation are not sent to the
+    # server. Returns {name: result} in the order asked for.
+    def run(self, pool, names, params=None, executor=None, on_result=None):
+        unknown = [name for name in names if name not in self.queries]
+        if unknown:
+            raise QueryCatalogError(f"Unknown catalog queries: {', '.join(unknown)}")
+        results = {}
+        pending = []
+        for name in names:
+            if self.errors and name in self.errors:
+                results[name] = {"frame": None, "rows": 0, "seconds": 0.0, "cached": False, "truncated": False,
+                                 "error": f"Failed validation: {self.errors[name]}"}
+                if on_result is not None:
+                    on_result(name, results[name])
+            else:
+                pending.append(name)
+        own_executor = executor is None and len(pending) > 1
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=CATALOG_WORKERS, thread_name_prefix="catalog")
+        try:
+            if executor is None:
+                futures = {}
+                for name in pending:
+                    results[name] = self.run_one(pool, name, params)
+                    if on_result is not None:
+                        on_result(name, results[name])
+            else:
+                futures = {executor.submit(self.run_one, pool, name, params): name for name in pending}
+            for future in as_completed(futures):
+                name = futures[future]
+                results[name] = future.result()
+                if on_result is not None:
+                    on_result(name, results[name])
+        finally:
+            if own_executor:
+                executor.shutdown(wait=False)
+        return {name: results[name] for name in names}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate the query catalog against the database, and optionally run queries.")
+    parser.add_argument("names", nargs="*", help="queries to run after validating (default: validate only)")
+    parser.add_argument("--path", default=QUERY_FILE)
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE", help="query parameter, e.g. customer_id=...")
+    parser.add_argument("--list", action="store_true", help="list the queries and their parameters")
+    args = parser.parse_args()
+
+    catalog = QueryCatalog.load(args.path)
+    if args.list:
+        for name, query in catalog.queries.items():
+            needs = f" (needs {', '.join(query['params'])})" if query["params"] else ""
+            print(f"{query['number']:>3}. {name}: {query['title']}{needs}")
+        sys.exit(0)
+
+    pool = ConnectionPool(size=CATALOG_WORKERS, **DB_CONFIG)
+    try:
+        errors = catalog.validate(pool)
+        print(f"{len(catalog.queries) - len(errors)} of {len(catalog.queries)} queries are valid against the schema")
+        for name, message in errors.items():
+            print(f"  {name}: {message}")
+        if args.names:
+            params = dict(item.split("=", 1) for item in args.param)
+            started = time.perf_counter()
+            for name, result in catalog.run(pool, args.names, params).items():
+                status = result["error"] or f"{result['rows']:,} rows{' (truncated)' if result['truncated'] else ''}"
+                print(f"{name}: {status} in {result['seconds'] * 1000:.1f} ms")
+            print(f"Ran {len(args.names)} queries in {time.perf_counter() - started:.2f}s")
+    finally:
+        pool.close_all()
+    sys.exit(1 if errors else 0)
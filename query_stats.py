@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# String and number literals, replaced by ? so the same statement shape groups together
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+# Runs of placeholders, e.g. a multi-row VALUES list or an IN (...) list
+_PLACEHOLDER_RUNS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)(?:\s*,\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\))*")
+
+
+# Function to reduce a statement to its shape: literals and placeholder lists collapsed, whitespace normalised
+def query_shape(query):
+    shape = _LITERALS.sub("?", " ".join(query.split()).rstrip(";"))
+    return _PLACEHOLDER_RUNS.sub("(...)", shape)
+
+
+class QueryStats:
+    def __init__(self, slow_threshold_ms=500, slow_log_path="slow_queries.log", window=1000):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.slow_log = self._open_slow_log(slow_log_path)
+
+    # One JSON object per line; the logger is shared, so only attach the file handler once
+    @staticmethod
+    def _open_slow_log(path):
+        logger = logging.getLogger("zomato.slow_queries")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        path = os.path.abspath(path)
+        if not any(isinstance(h, logging.FileHandler) and h.baseFilename == path for h in logger.handlers):
+            handler = logging.FileHandler(path, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+        return logger
+
+    # Function to record one statement's timing, rows returned/affected and approximate bytes moved
+    def record(self, query, seconds, rows=0, nbytes=0, kind="read", ok=True):
+        shape = query_shape(query)
+        elapsed_ms = seconds * 1000
+        with self._lock:
+            samples = self._samples.setdefault((shape, kind), {"kind": kind, "calls": 0, "errors": 0, "rows": 0, "bytes": 0,
+                                                               "latencies": deque(maxlen=self.window)})
+            samples["calls"] += 1
+            samples["errors"] += 0 if ok else 1
+            samples["rows"] += rows
+            samples["bytes"] += nbytes
+            samples["latencies"].append(elapsed_ms)
+        if elapsed_ms >= self.slow_threshold_ms:
+            self.slow_log.info(json.dumps({
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "kind": kind,
+                "shape": shape,
+                "elapsed_ms": round(elapsed_ms, 2),
+                "rows": rows,
+                "bytes": nbytes,
+                "ok": ok,
+                "threshold_ms": self.slow_threshold_ms
+            }))
+
+    # Function to summarise latency percentiles per statement shape, slowest p95 first
+    def summary(self):
+        with self._lock:
+            rows = []
+            for (shape, _), samples in self._samples.items():
+                latencies = np.fromiter(samples["latencies"], dtype=float)
+                rows.append({
+                    "shape": shape,
+                    "kind": samples["kind"],
+                    "calls": samples["calls"],
+                    "errors": samples["errors"],
+                    "p50_ms": float(np.percentile(latencies, 50)),
+                    "p95_ms": float(np.percentile(latencies, 95)),
+                    "max_ms": float(latencies.max()),
+                    "avg_rows": samples["rows"] / samples["calls"],
+                    "total_bytes": samples["bytes"]
+                })
+        frame = pd.DataFrame(rows, columns=["shape", "kind", "calls", "errors", "p50_ms", "p95_ms", "max_ms", "avg_rows", "total_bytes"])
+        return frame.sort_values("p95_ms", ascending=False, ignore_index=True)
+
+    # Function to forget every recorded sample
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
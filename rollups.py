@@ -0,0 +1,279 @@
+import argparse
+import re
+import threading
+import time
+
+import mysql.connector
+
+from change_capture import IN_FLIGHT_TIMEOUT_SECONDS, sequence_step
+from db_pool import DB_CONFIG
+from query_cache import write_table
+
+# Summary tables behind the dashboard aggregates. Each one is fed by new rows of its source
+# table: rows with ingest_seq above the rollup's high-water mark are folded in with an upsert.
+# "reads" lists every table whose updates or deletes can change the rollup.
+ROLLUPS = {
+    "order_hour_rollup": {
+        "source": "orders",
+        "reads": ["orders"],
+        "delta": """
+            INSERT INTO order_hour_rollup (order_hour, total_orders)
+            SELECT HOUR(order_date), COUNT(*)
+            FROM orders
+            WHERE ingest_seq > %s AND ingest_seq <= %s AND order_date IS NOT NULL
+            GROUP BY HOUR(order_date)
+            ON DUPLICATE KEY UPDATE total_orders = total_orders + VALUES(total_orders)
+        """
+    },
+    "restaurant_order_rollup": {
+        "source": "orders",
+        "reads": ["orders"],
+        "delta": """
+            INSERT INTO restaurant_order_rollup (restaurant_id, total_orders)
+            SELECT restaurant_id, COUNT(*)
+            FROM orders
+            WHERE ingest_seq > %s AND ingest_seq <= %s AND restaurant_id IS NOT NULL
+            GROUP BY restaurant_id
+            ON DUPLICATE KEY UPDATE total_orders = total_orders + VALUES(total_orders)
+        """
+    },
+    "customer_item_rollup": {
+        "source": "orderitems",
+        "reads": ["orderitems", "orders"],
+        "delta": """
+            INSERT INTO customer_item_rollup (customer_id, dish_name, frequency)
+            SELECT o.customer_id, oi.dish_name, COUNT(*)
+            FROM orderitems oi
+            JOIN orders o ON o.order_id = oi.order_id
+            WHERE oi.ingest_seq > %s AND oi.ingest_seq <= %s
+              AND o.customer_id IS NOT NULL AND oi.dish_name IS NOT NULL
+            GROUP BY o.customer_id, oi.dish_name
+            ON DUPLICATE KEY UPDATE frequency = frequency + VALUES(frequency)
+        """
+    }
+}
+
+# Statements that add rows; anything else on a table a rollup reads (and the update half of an upsert)
+# marks the rollup dirty for the background refresher to rebuild
+_APPEND_ONLY_PREFIXES = ("INSERT", "LOAD")
+_UPSERT = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+
+
+# Function to list the rollups fed by new rows of a table
+def rollups_for_table(table):
+    table = table.lower()
+    return [name for name, rollup in ROLLUPS.items() if rollup["source"] == table]
+
+
+# Function to list the rollups an update or delete on a table can change
+def rollups_reading_table(table):
+    table = table.lower()
+    return [name for name, rollup in ROLLUPS.items() if table in rollup["reads"]]
+
+
+# Function to find the highest ingest_seq at or below latest that no row still in flight can fall under.
+# ingest_seq is handed out when a row is inserted but the row only becomes visible when its transaction
+# commits, so a number missing after mark may still show up (concurrent inserts, bulk uploads, interleaved
+# auto-increment). The mark stops before the first missing number that is followed by a row written within
+# the in-flight timeout; one missing for longer is taken for a rolled-back insert.
+def _committed_seq(connection, source, mark, latest, timeout=IN_FLIGHT_TIMEOUT_SECONDS):
+    step = sequence_step(connection)
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        SELECT MIN(previous_seq)
+        FROM (
+            SELECT ingest_seq, updated_at, LAG(ingest_seq, 1, %s) OVER (ORDER BY ingest_seq) AS previous_seq
+            FROM {source}
+            WHERE ingest_seq > %s AND ingest_seq <= %s
+        ) AS arrivals
+        WHERE ingest_seq > previous_seq + %s AND updated_at >= NOW(6) - INTERVAL %s SECOND
+    """, (mark, mark, latest, step, timeout))
+    safe = cursor.fetchone()[0]
+    cursor.close()
+    return latest if safe is None else safe
+
+
+# Function to fold one batch of source rows into a rollup; the watermark row lock serialises refreshers.
+# The batch ends below rows that may still be in flight (see _committed_seq), so a row that commits after
+# a refresh is folded in by a later one instead of being passed over.
+def _advance(connection, name, rebuild=False):
+    rollup = ROLLUPS[name]
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT high_water_mark FROM rollup_watermarks WHERE rollup_name = %s FOR UPDATE", (name,))
+        row = cursor.fetchone()
+        mark = 0 if rebuild or row is None else row[0]
+        cursor.execute(f"SELECT COALESCE(MAX(ingest_seq), 0) FROM {rollup['source']}")
+        latest = _committed_seq(connection, rollup["source"], mark, cursor.fetchone()[0])
+        if rebuild:
+            cursor.execute(f"DELETE FROM {name}")
+        if latest > mark or rebuild:
+            cursor.execute(rollup["delta"], (mark, latest))
+            cursor.execute("""
+                INSERT INTO rollup_watermarks (rollup_name, high_water_mark) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE high_water_mark = VALUES(high_water_mark)
+            """, (name, latest))
+        connection.commit()
+        return latest - mark
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# Function to fold rows added since the last refresh into the rollups; returns how far each watermark moved
+def refresh_rollups(connection, names=None):
+    return {name: _advance(connection, name) for name in (names or ROLLUPS)}
+
+
+# Function to read how many writes have marked each rollup dirty since its last rebuild
+def _pending_writes(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT rollup_name, pending_writes FROM rollup_dirty WHERE pending_writes > 0")
+        pending = dict(cursor.fetchall())
+        connection.commit()
+        return pending
+    finally:
+        cursor.close()
+
+
+# Function to recompute rollups from scratch. The dirty marks read before the rebuild are taken off
+# afterwards, so a write that marks a rollup while it is being rebuilt keeps it dirty for the next run.
+def rebuild_rollups(connection, names=None):
+    pending = _pending_writes(connection)
+    counts = {}
+    cursor = connection.cursor()
+    try:
+        for name in (names or ROLLUPS):
+            counts[name] = _advance(connection, name, rebuild=True)
+            if pending.get(name):
+                cursor.execute("UPDATE rollup_dirty SET pending_writes = pending_writes - %s WHERE rollup_name = %s",
+                               (pending[name], name))
+                connection.commit()
+    finally:
+        cursor.close()
+    return counts
+
+
+# Function to rebuild only the rollups an update or delete has marked dirty
+def rebuild_dirty_rollups(connection):
+    names = [name for name in _pending_writes(connection) if name in ROLLUPS]
+    return rebuild_rollups(connection, names) if names else {}
+
+
+# Function to flag rollups as changed by an update or delete: a single-row upsert per rollup, cheap
+# enough for the request thread. The background refresher (RollupRefresher in the app, or
+# python rollups.py --interval N) rebuilds them.
+def mark_rollups_dirty(connection, names):
+    if not names:
+        return
+    cursor = connection.cursor()
+    try:
+        cursor.executemany("""
+            INSERT INTO rollup_dirty (rollup_name, pending_writes) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE pending_writes = pending_writes + 1
+        """, [(name,) for name in names])
+        connection.commit()
+    except mysql.connector.Error:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# Function to keep rollups current after a write: appends are folded in incrementally, while updates
+# and deletes (and the update half of an upsert) only mark the rollups reading the table dirty, so no
+# rebuild runs on the request thread. Returns the rollups changed now.
+def sync_after_write(connection, query):
+    table = write_table(query)
+    if table is None:
+        return []
+    names = []
+    if query.lstrip().upper().startswith(_APPEND_ONLY_PREFIXES):
+        names = rollups_for_table(table)
+        refresh_rollups(connection, names)
+        if not _UPSERT.search(query):
+            return names
+    mark_rollups_dirty(connection, rollups_reading_table(table))
+    return names
+
+
+# Background refresher run inside the app: every interval seconds it folds new rows into the rollups and
+# rebuilds the ones marked dirty, on a connection borrowed from the pool, then calls on_change with the
+# rollups it changed (the app drops the cached results read from them). status() reports how stale they are.
+class RollupRefresher:
+    def __init__(self, pool, interval=30.0, on_change=None):
+        self.pool = pool
+        self.interval = interval
+        self.on_change = on_change
+        self.refreshed_at = None
+        self.pending = {}
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Function to start the refresher thread (once)
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rollup-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    # Function to stop the refresher thread after its current run
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    # Function to refresh and rebuild the rollups once; returns the rollups that changed
+    def run_once(self):
+        try:
+            with self.pool.connection() as connection:
+                counts = refresh_rollups(connection)
+                rebuilt = rebuild_dirty_rollups(connection)
+                # Marks left are writes that came in during the rebuild; the next run takes them
+                self.pending = _pending_writes(connection)
+        except mysql.connector.Error as e:
+            self.error = str(e)
+            return []
+        changed = sorted({name for name, rows in counts.items() if rows} | set(rebuilt))
+        self.refreshed_at = time.time()
+        self.error = None
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+        return changed
+
+    # Function to report the last successful run (epoch seconds or None), the dirty marks it left, and the
+    # last error (None if that run succeeded)
+    def status(self):
+        return {"refreshed_at": self.refreshed_at, "pending": dict(self.pending), "error": self.error}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the dashboard rollup tables from new rows, and rebuild the ones updates or deletes marked dirty.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every rollup from scratch")
+    parser.add_argument("--interval", type=float, default=0, help="keep refreshing every N seconds")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    try:
+        while True:
+            started = time.perf_counter()
+            if args.rebuild:
+                counts = rebuild_rollups(conn)
+            else:
+                counts = refresh_rollups(conn)
+                for name in rebuild_dirty_rollups(conn):
+                    print(f"Rebuilt {name} after updates or deletes")
+            elapsed = time.perf_counter() - started
+            print(", ".join(f"{name}: +{rows:,}" for name, rows in counts.items()) + f" ({elapsed:.2f}s)")
+            if not args.interval or args.rebuild:
+                break
+            time.sleep(args.interval)
+    finally:
+        conn.close()
@@ -0,0 +1,138 @@
+import re
+import threading
+import time
+
+# Every column of every table in the current database, with the indexes each column belongs to
+# (one row per column and index it is in), so the whole catalog loads in a single round trip
+CATALOG_QUERY = """
+    SELECT c.TABLE_NAME AS table_name, c.COLUMN_NAME AS column_name, c.ORDINAL_POSITION AS position,
+           c.DATA_TYPE AS data_type, c.COLUMN_TYPE AS column_type, c.IS_NULLABLE AS is_nullable,
+           c.COLUMN_DEFAULT AS column_default, c.EXTRA AS extra,
+           s.INDEX_NAME AS index_name, s.SEQ_IN_INDEX AS seq_in_index, s.NON_UNIQUE AS non_unique
+    FROM information_schema.COLUMNS c
+    LEFT JOIN information_schema.STATISTICS s
+      ON s.TABLE_SCHEMA = c.TABLE_SCHEMA AND s.TABLE_NAME = c.TABLE_NAME AND s.COLUMN_NAME = c.COLUMN_NAME
+    WHERE c.TABLE_SCHEMA = DATABASE()
+    ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION, s.INDEX_NAME, s.SEQ_IN_INDEX
+"""
+
+# Form input kinds by MySQL DATA_TYPE
+_INPUT_KINDS = {
+    "int": "int", "integer": "int", "smallint": "int", "mediumint": "int", "bigint": "int", "year": "int",
+    "float": "float", "double": "float", "decimal": "float", "real": "float",
+    "date": "date",
+    "datetime": "datetime", "timestamp": "datetime",
+    "enum": "choice"
+}
+_ENUM_VALUES = re.compile(r"'((?:[^']|'')*)'")
+
+
+# Function to pick the form input for a column: "int", "float", "bool", "date", "datetime", "choice" or "text".
+# BOOLEAN columns are stored as TINYINT(1).
+def input_kind(column):
+    if column["column_type"].lower().startswith("tinyint(1)"):
+        return "bool"
+    if column["data_type"] == "tinyint":
+        return "int"
+    return _INPUT_KINDS.get(column["data_type"], "text")
+
+
+# Function to list the allowed values of an ENUM column
+def enum_values(column):
+    return [value.replace("''", "'") for value in _ENUM_VALUES.findall(column["column_type"])]
+
+
+# Function to tell whether the server fills a column itself (generated or AUTO_INCREMENT), so forms skip it
+def is_server_filled(column):
+    extra = (column["extra"] or "").upper()
+    return "GENERATED" in extra or "AUTO_INCREMENT" in extra
+
+
+class SchemaCatalog:
+    def __init__(self, pool, ttl=600, stats=None):
+        self.pool = pool
+        self.ttl = ttl
+        self.stats = stats
+        self._tables = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    # Function to forget the loaded schema; the next lookup reloads it
+    def invalidate(self):
+        with self._lock:
+            self._tables = None
+
+    # Function to load the schema with one information_schema query (raises mysql.connector.Error)
+    def _load(self):
+        started = time.perf_counter()
+        rows = []
+        ok = False
+        try:
+            with self.pool.connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(CATALOG_QUERY)
+                rows = cursor.fetchall()
+                cursor.close()
+            ok = True
+        finally:
+            if self.stats is not None:
+                self.stats.record(CATALOG_QUERY, time.perf_counter() - started, len(rows), ok=ok)
+
+        tables = {}
+        for row in rows:
+            table = tables.setdefault(row["table_name"], {"columns": {}, "indexes": {}})
+            if row["column_name"] not in table["columns"]:
+                table["columns"][row["column_name"]] = {
+                    "name": row["column_name"],
+                    "data_type": row["data_type"].lower(),
+                    "column_type": row["column_type"],
+                    "nullable": row["is_nullable"] == "YES",
+                    "default": row["column_default"],
+                    "extra": row["extra"]
+                }
+            if row["index_name"] is not None:
+                index = table["indexes"].setdefault(row["index_name"], {"unique": not row["non_unique"], "columns": []})
+                index["columns"].append((row["seq_in_index"], row["column_name"]))
+        for table in tables.values():
+            for index in table["indexes"].values():
+                index["columns"] = [column for _, column in sorted(index["columns"])]
+        return tables
+
+    # Function to get the loaded schema, reloading it once the TTL has passed
+    def _schema(self):
+        with self._lock:
+            if self._tables is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._tables = self._load()
+                self._loaded_at = time.monotonic()
+            return self._tables
+
+    # Function to find a table's entry, matching the name case-insensitively as a fallback
+    def _table(self, table_name):
+        tables = self._schema()
+        if table_name in tables:
+            return tables[table_name]
+        for name, table in tables.items():
+            if name.lower() == str(table_name).lower():
+                return table
+        return None
+
+    # Function to list the table names
+    def tables(self):
+        return sorted(self._schema())
+
+    # Function to list a table's columns (name, data_type, column_type, nullable, default, extra), in order
+    def columns(self, table_name):
+        table = self._table(table_name)
+        return list(table["columns"].values()) if table else []
+
+    # Function to list a table's primary key columns, in index order
+    def primary_key(self, table_name):
+        table = self._table(table_name)
+        if not table or "PRIMARY" not in table["indexes"]:
+            return []
+        return list(table["indexes"]["PRIMARY"]["columns"])
+
+    # Function to map a table's index names to {"unique": bool, "columns": [...]}
+    def indexes(self, table_name):
+        table = self._table(table_name)
+        return dict(table["indexes"]) if table else {}
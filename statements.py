@@ -0,0 +1,139 @@
+import re
+import threading
+from collections import OrderedDict
+
+import mysql.connector
+
+# Prepared statements kept open per pooled connection
+DEFAULT_STATEMENT_CACHE_SIZE = 32
+# Names accepted for new tables and columns (existing ones are checked against the schema catalog)
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{0,63}")
+
+
+class InvalidIdentifierError(ValueError):
+    pass
+
+
+# Function to check a new table or column name and quote it
+def quote_identifier(name):
+    if not isinstance(name, str) or not _IDENTIFIER.fullmatch(name):
+        raise InvalidIdentifierError(f"Invalid name: {name!r} (use letters, digits and underscores)")
+    return f"`{name}`"
+
+
+# Function to resolve a table name against the schema catalog; returns it quoted, in the catalog's spelling
+def resolve_table(catalog, table_name):
+    for name in catalog.tables():
+        if name == table_name:
+            return f"`{name}`"
+    raise InvalidIdentifierError(f"Unknown table: {table_name!r}")
+
+
+# Function to resolve column names against a table in the schema catalog; returns them quoted
+def resolve_columns(catalog, table_name, columns):
+    known = {column["name"] for column in catalog.columns(table_name)}
+    unknown = [column for column in columns if column not in known]
+    if unknown:
+        raise InvalidIdentifierError(f"Unknown column(s) in {table_name}: {', '.join(map(repr, unknown))}")
+    return [f"`{column}`" for column in columns]
+
+
+# Function to build a WHERE clause from {column: value}; returns (clause, params). Every condition needs a
+# value: None is refused rather than matched as NULL, so an empty form field cannot update or delete every
+# row where the column is NULL.
+def _where(catalog, table_name, conditions):
+    if not conditions:
+        raise ValueError("A condition is required")
+    missing = [column for column, value in conditions.items() if value is None]
+    if missing:
+        raise ValueError(f"A condition value is required for {', '.join(missing)}")
+    quoted = resolve_columns(catalog, table_name, list(conditions))
+    return " AND ".join(f"{column} = %s" for column in quoted), list(conditions.values())
+
+
+# Function to build an INSERT for {column: value}; returns (statement, params)
+def build_insert(catalog, table_name, values):
+    table = resolve_table(catalog, table_name)
+    columns = resolve_columns(catalog, table_name, list(values))
+    statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    return statement, list(values.values())
+
+
+# Function to build an UPDATE setting {column: value} on the rows matching {column: value}; returns (statement, params)
+def build_update(catalog, table_name, values, conditions):
+    table = resolve_table(catalog, table_name)
+    columns = resolve_columns(catalog, table_name, list(values))
+    where, where_params = _where(catalog, table_name, conditions)
+    statement = f"UPDATE {table} SET {', '.join(f'{column} = %s' for column in columns)} WHERE {where}"
+    return statement, list(values.values()) + where_params
+
+
+# Function to build a DELETE of the rows matching {column: value}; returns (statement, params)
+def build_delete(catalog, table_name, conditions):
+    table = resolve_table(catalog, table_name)
+    where, params = _where(catalog, table_name, conditions)
+    return f"DELETE FROM {table} WHERE {where}", params
+
+
+# Server-side prepared statements for one connection, least recently used evicted first. Statements
+# run through the binary protocol, and a shape seen before is executed without being parsed again.
+class PreparedStatementCache:
+    def __init__(self, connection, size=DEFAULT_STATEMENT_CACHE_SIZE):
+        self.connection = connection
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Function to get the prepared cursor for a statement, preparing it on first use. Returns the cursor and
+    # the cached copy of the SQL text: the driver only skips re-preparing when handed that same string object.
+    def _cursor(self, statement):
+        with self._lock:
+            entry = self._cursors.get(statement)
+            if entry is not None:
+                self._cursors.move_to_end(statement)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            entry = (self.connection.cursor(prepared=True), statement)
+            self._cursors[statement] = entry
+            while len(self._cursors) > self.size:
+                _, (evicted, _) = self._cursors.popitem(last=False)
+                try:
+                    evicted.close()
+                except mysql.connector.Error:
+                    pass
+            return entry
+
+    # Function to run one statement; returns the rows affected
+    def execute(self, statement, params=()):
+        cursor, statement = self._cursor(statement)
+        cursor.execute(statement, tuple(params))
+        if cursor.with_rows:
+            cursor.fetchall()
+        return max(cursor.rowcount, 0)
+
+    # Function to run one prepared statement once per parameter set; returns the total rows affected
+    def execute_batch(self, statement, param_sets):
+        cursor, statement = self._cursor(statement)
+        affected = 0
+        for params in param_sets:
+            cursor.execute(statement, tuple(params))
+            affected += max(cursor.rowcount, 0)
+        return affected
+
+    # Function to deallocate every statement
+    def close(self):
+        with self._lock:
+            for cursor, _ in self._cursors.values():
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
+            self._cursors.clear()
+
+    # Function to report cache size and hit counts
+    def stats(self):
+        with self._lock:
+            return {"statements": len(self._cursors), "hits": self.hits, "misses": self.misses}
@@ -3,18 +3,24 @@ import mysql.connector
 from mysql.connector import Error
 import pandas as pd
 import plotly.express as px
+from db_pool import DB_CONFIG, ConnectionPool
 
-# Function to connect to the MySQL database
+# Upper bound on MySQL connections held by this process across all sessions
+POOL_SIZE = 10
+
+# One pool per process, shared by every Streamlit session and rerun
+@st.cache_resource
+def get_connection_pool():
+    return ConnectionPool(size=POOL_SIZE, **DB_CONFIG)
+
+# Function to attach to the shared MySQL connection pool
 def create_connection():
     try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="mysql",
-            database="zomato1"
-        )
-        if conn.is_connected():
-            return conn
+        pool = get_connection_pool()
+        # Borrowing once runs the pool's health check against the server
+        with pool.connection():
+            pass
+        return pool
     except Error as e:
         st.error(f"Error: {e}")
         return None
@@ -22,12 +28,14 @@ def create_connection():
 # Function to execute a query
 def execute_query(connection, query, params=None):
     try:
-        cursor = connection.cursor()
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        connection.commit()
+        with connection.connection() as conn:
+            cursor = conn.cursor()
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            conn.commit()
+            cursor.close()
         return True
     except Error as e:
         st.error(f"Error: {e}")
@@ -36,9 +44,12 @@ def execute_query(connection, query, params=None):
 # Function to fetch data from the database
 def fetch_data(connection, query):
     try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query)
-        return cursor.fetchall()
+        with connection.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query)
+            records = cursor.fetchall()
+            cursor.close()
+        return records
     except Error as e:
         st.error(f"Error: {e}")
         return None
@@ -61,7 +72,7 @@ def fetch_table_columns(connection, table_name):
 
 # Function to generate peak order times
 def get_peak_order_times(connection):
-    query = "SELECT HOUR(order_time) AS order_hour, COUNT(*) AS total_orders FROM orders GROUP BY order_hour ORDER BY order_hour;"
+    query = "SELECT HOUR(order_date) AS order_hour, COUNT(*) AS total_orders FROM orders WHERE order_date IS NOT NULL GROUP BY order_hour ORDER BY order_hour;"
     return fetch_data(connection, query)
 
 # Function to fetch delayed deliveries
@@ -77,10 +88,10 @@ def get_top_customers(connection):
 # Function to get customer preferences (Customer Analytics)
 def get_customer_preferences(connection):
     query = """
-        SELECT customer_id, item_name, COUNT(*) AS frequency
+        SELECT orders.customer_id, orderitems.dish_name AS item_name, COUNT(*) AS frequency
         FROM orders
-        JOIN order_items ON orders.order_id = order_items.order_id
-        GROUP BY customer_id, item_name
+        JOIN orderitems ON orders.order_id = orderitems.order_id
+        GROUP BY orders.customer_id, orderitems.dish_name
         ORDER BY frequency DESC;
     """
     return fetch_data(connection, query)
@@ -286,8 +297,5 @@ def main():
                 else:
                     st.info("No data available for popular restaurants.")
 
-    # Close connection
-    connection.close()
-
 if __name__ == "__main__":
     main()
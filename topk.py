@@ -0,0 +1,27 @@
+import heapq
+import itertools
+from operator import itemgetter
+
+
+# Function to yield rows from an unbuffered cursor one fetchmany() batch at a time
+def stream_rows(cursor, batch_size=10000):
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+# Function to keep the top n (group, item, weight) rows per group, for servers without window functions.
+# Rows must arrive sorted by group; each group holds an n-sized heap, and a limit-sized heap bounds the
+# output, so memory stays O(n + limit) however many rows stream past. Returns rows as
+# (group, item, weight, rank), heaviest first.
+def top_n_per_group(rows, n, limit=None):
+    ranked = (
+        (group, item, weight, rank)
+        for group, members in itertools.groupby(rows, key=itemgetter(0))
+        for rank, (_, item, weight) in enumerate(heapq.nlargest(n, members, key=itemgetter(2)), start=1)
+    )
+    if limit is None:
+        return sorted(ranked, key=itemgetter(2), reverse=True)
+    return heapq.nlargest(limit, ranked, key=itemgetter(2))